@@ -1,10 +1,15 @@
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
+from app.core.deps import get_plant_scope
 from app.db.deps import get_db
+from app.models.dimension import Customer, Part
 from app.models.order import Order
+from app.services.analytics_sample import analytics_sample, approximation_headers
 
 router = APIRouter(
     prefix="/analytics",
@@ -28,24 +33,45 @@ def parse_financial_year(fy: str) -> tuple[date, date]:
     return start, end
 
 
+def delivery_rows(query, start: date, end: date, plant_id: Optional[int]):
+    """
+    DELIVERY rows with delivery_date in [start, end], limited to one plant
+    when plant_id is set.
+    """
+    if plant_id is not None:
+        query = query.filter(Order.plant_id == plant_id)
+    return (
+        query.filter(Order.source_type == "DELIVERY")
+        .filter(Order.delivery_date >= start)
+        .filter(Order.delivery_date <= end)
+    )
+
+
 
 # 1. Financial Year Sales Totals
 
 @router.get("/financial-year")
 def financial_year_summary(
     financial_year: str = Query(..., example="2024-2025"),
+    approximate: bool = Query(
+        False, description="Estimate from the delivery sample; adds 95% error bounds"
+    ),
+    plant_id: Optional[int] = Depends(get_plant_scope),
     db: Session = Depends(get_db),
 ):
     start, end = parse_financial_year(financial_year)
+    if approximate:
+        # the exact fields, plus error_bounds, distinct counts and sample metadata
+        return {"financial_year": financial_year, **analytics_sample.totals(start, end, plant_id)}
 
-    q = (
+    q = delivery_rows(
         db.query(
             func.coalesce(func.sum(Order.amount), 0).label("total_sales_amount"),
             func.coalesce(func.sum(Order.quantity), 0).label("total_quantity"),
-        )
-        .filter(Order.source_type == "DELIVERY")
-        .filter(Order.delivery_date >= start)
-        .filter(Order.delivery_date <= end)
+        ),
+        start,
+        end,
+        plant_id,
     )
 
     row = q.one()
@@ -58,21 +84,39 @@ def financial_year_summary(
 # 2. Product-wise Sales Breakdown
 @router.get("/product-wise")
 def product_wise_sales(
+    response: Response,
     financial_year: str = Query(..., example="2024-2025"),
+    approximate: bool = Query(
+        False, description="Estimate from the delivery sample; adds error_bound per row"
+    ),
+    plant_id: Optional[int] = Depends(get_plant_scope),
     db: Session = Depends(get_db),
 ):
     start, end = parse_financial_year(financial_year)
-
-    q = (
-        db.query(
-            Order.part_number.label("part_number"),
-            func.coalesce(func.sum(Order.amount), 0).label("total_amount"),
+    if approximate:
+        items, meta = analytics_sample.breakdown("part", start, end, plant_id)
+        response.headers.update(approximation_headers(meta))
+        return items
+
+    # aggregate on the integer key, then attach the canonical part number
+    totals = (
+        delivery_rows(
+            db.query(
+                Order.part_id.label("part_id"),
+                func.coalesce(func.sum(Order.amount), 0).label("total_amount"),
+            ),
+            start,
+            end,
+            plant_id,
         )
-        .filter(Order.source_type == "DELIVERY")
-        .filter(Order.delivery_date >= start)
-        .filter(Order.delivery_date <= end)
-        .group_by(Order.part_number)
-        .order_by(func.sum(Order.amount).desc())
+        .group_by(Order.part_id)
+        .subquery()
+    )
+    q = (
+        db.query(Part.name.label("part_number"), totals.c.total_amount)
+        .select_from(totals)
+        .outerjoin(Part, Part.id == totals.c.part_id)
+        .order_by(totals.c.total_amount.desc())
     )
 
     return [
@@ -88,21 +132,38 @@ def product_wise_sales(
 # 3. Customer-wise Sales Analysis
 @router.get("/customer-wise")
 def customer_wise_sales(
+    response: Response,
     financial_year: str = Query(..., example="2024-2025"),
+    approximate: bool = Query(
+        False, description="Estimate from the delivery sample; adds error_bound per row"
+    ),
+    plant_id: Optional[int] = Depends(get_plant_scope),
     db: Session = Depends(get_db),
 ):
     start, end = parse_financial_year(financial_year)
-
-    q = (
-        db.query(
-            Order.customer_name.label("customer_name"),
-            func.coalesce(func.sum(Order.amount), 0).label("total_amount"),
+    if approximate:
+        items, meta = analytics_sample.breakdown("customer", start, end, plant_id)
+        response.headers.update(approximation_headers(meta))
+        return items
+
+    totals = (
+        delivery_rows(
+            db.query(
+                Order.customer_id.label("customer_id"),
+                func.coalesce(func.sum(Order.amount), 0).label("total_amount"),
+            ),
+            start,
+            end,
+            plant_id,
         )
-        .filter(Order.source_type == "DELIVERY")
-        .filter(Order.delivery_date >= start)
-        .filter(Order.delivery_date <= end)
-        .group_by(Order.customer_name)
-        .order_by(func.sum(Order.amount).desc())
+        .group_by(Order.customer_id)
+        .subquery()
+    )
+    q = (
+        db.query(Customer.name.label("customer_name"), totals.c.total_amount)
+        .select_from(totals)
+        .outerjoin(Customer, Customer.id == totals.c.customer_id)
+        .order_by(totals.c.total_amount.desc())
     )
 
     return [
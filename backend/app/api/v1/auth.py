@@ -34,6 +34,9 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         full_name=user.full_name,
         hashed_password=hashed,
         role=role,
+        # self-registered users start on the default plant; an admin can
+        # move them (only the first, admin, account sees every plant)
+        plant_id=None if role == "admin" else settings.DEFAULT_PLANT_ID,
     )
 
     db.add(new_user)
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.deps import get_plant_scope
+from app.core.events import broker, hub
+
+router = APIRouter(tags=["events"])
+
+HEARTBEAT_SECONDS = 15
+
+
+@router.get("/events")
+async def ingest_events(request: Request, plant_id: Optional[int] = Depends(get_plant_scope)):
+    """
+    Server-sent events stream of ingest notices.
+
+    Each committed ingest sends one `event: ingest` message with the affected
+    financial years, source types and row count, so dashboards can refetch
+    only when data actually changed. A comment line every 15 seconds keeps
+    proxies from closing idle connections. Notices about other plants are
+    not forwarded to plant-scoped clients.
+    """
+    broker.ensure_started()
+    queue = hub.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    notice = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                plant_ids = notice.get("plant_ids")
+                if plant_id is not None and plant_ids is not None and plant_id not in plant_ids:
+                    continue
+                yield f"event: {notice.get('type', 'ingest')}\ndata: {json.dumps(notice)}\n\n"
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
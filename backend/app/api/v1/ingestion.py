@@ -1,15 +1,19 @@
+import json
 import os
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from typing import Optional
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
-import pandas as pd
-from datetime import datetime
 
 from app.db.deps import get_db
-from app.models.order import Order
 from app.core.config import settings
 from app.core.deps import get_current_admin
+from app.models.plant import Plant
+from app.models.quarantine import QuarantinedRow
+from app.services.ingest_profiler import IngestProfiler, NULL_PROFILER, cprofile_to_disk
 
-
+# NOTE: app.services.ingestion (pandas) is imported inside the handlers so that
+# importing this router - and app.main - stays cheap.
 
 
 router = APIRouter(
@@ -20,348 +24,234 @@ router = APIRouter(
 BASE_DATA_PATH = settings.DATA_FOLDER  # e.g. "data"
 
 
-def upsert_order(db: Session, data: dict) -> Order:
+def ingest_plant(db: Session, plant_id: Optional[int], admin) -> int:
     """
-    Insert or update an Order row based on a natural key.
-    This makes daily re-uploads idempotent.
+    Plant an ingest writes to: ?plant_id=, else the admin's own plant, else
+    DEFAULT_PLANT_ID. Admins bound to a plant can only load that plant.
     """
-
-    natural_filter = {
-        "source_type": data.get("source_type"),
-        "so_number": data.get("so_number"),
-        "order_no": data.get("order_no"),
-        "po_serial": data.get("po_serial"),
-        "part_number": data.get("part_number"),
-        "delivery_date": data.get("delivery_date"),
-    }
-
-    query = db.query(Order).filter_by(**natural_filter)
-    existing = query.first()
-
-    if existing:
-        # update existing fields (but don’t override id)
-        for key, value in data.items():
-            if key == "id":
-                continue
-            setattr(existing, key, value)
-        existing.last_updated_at = datetime.utcnow()
-        db.add(existing)
-        return existing
-
-    new_obj = Order(**data)
-    db.add(new_obj)
-    return new_obj
-
-
-def detect_financial_year(date_value: datetime | None) -> str | None:
+    if admin.plant_id is not None:
+        if plant_id is not None and plant_id != admin.plant_id:
+            raise HTTPException(status_code=403, detail="No access to that plant")
+        plant_id = admin.plant_id
+    if plant_id is None:
+        plant_id = settings.DEFAULT_PLANT_ID
+    if db.get(Plant, plant_id) is None:
+        raise HTTPException(status_code=404, detail="Plant not found")
+    return plant_id
+
+
+def ingest_upload(
+    db: Session, file: UploadFile, report_type: str, profile: bool, plant_id: int, snapshot: bool = False
+) -> dict:
     """
-    Given a date, return financial year like '2024-2025'.
-    Assuming FY starts in April (month 4).
+    Shared body of the upload endpoints, optionally profiled. Accepts CSV
+    (plain, .gz or .zst), Parquet and Arrow IPC files.
     """
-    if not date_value:
-        return None
-    year = date_value.year
-    if date_value.month >= 4:
-        return f"{year}-{year + 1}"
-    else:
-        return f"{year - 1}-{year}"
-
+    from app.services.ingestion import ingest_dataframe, read_upload, report_format
+    from app.services.snapshot import OutstandingSnapshot
 
-def parse_date_safe(value):
-    """
-    Try to parse a date from various formats.
-    Return datetime.date or None if failed.
-    """
-    if pd.isna(value) or value is None or str(value).strip() == "":
-        return None
+    if report_format(file.filename) not in ("csv", "parquet", "arrow"):
+        raise HTTPException(status_code=400, detail="Please upload a CSV, Parquet or Arrow file")
 
-    # If it's already a Timestamp or datetime
-    if isinstance(value, (pd.Timestamp, datetime)):
-        return value.date()
+    profiler = IngestProfiler() if profile else NULL_PROFILER
+    dump_dir = settings.INGEST_PROFILE_DIR if profile else None
 
-    text = str(value).strip()
-    # Try common formats
-    for fmt in ("%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%d-%m-%y", "%d/%m/%y"):
+    with cprofile_to_disk(dump_dir, report_type) as dump_path:
         try:
-            return datetime.strptime(text, fmt).date()
-        except ValueError:
-            continue
-
-    # Last try: pandas to_datetime
-    try:
-        return pd.to_datetime(text).date()
-    except Exception:
-        return None
-
-
-def process_outstanding_row(db: Session, row) -> None:
-    """
-    Map one 'Sales Order Outstanding' row into Order and upsert.
-    """
-    def get(col_name):
-        return row.get(col_name, None)
-
-    so_date = parse_date_safe(get("S/O Date"))
-    order_date = parse_date_safe(get("Order Date"))
-    delivery_date = parse_date_safe(get("Delivery Date"))
-    commitment_date = parse_date_safe(get("Commitment Dt"))
-    packslip_date = parse_date_safe(get("Pack Slip Dt"))
-
-    fy = detect_financial_year(order_date or so_date or delivery_date)
-
-    data = {
-        "source_type": "OUTSTANDING",
-        "status": "PENDING",
-
-        "so_number": str(get("S/O No")) if not pd.isna(get("S/O No")) else None,
-        "so_date": so_date,
-        "order_no": str(get("Order No")) if not pd.isna(get("Order No")) else None,
-        "order_date": order_date,
-        "po_serial": str(get("PO Srl")) if not pd.isna(get("PO Srl")) else None,
-
-        "customer_name": get("Buyer Name"),
-        "customer_code": str(get("Cust Code")) if not pd.isna(get("Cust Code")) else None,
-
-        "style_no": str(get("Style No")) if not pd.isna(get("Style No")) else None,
-        "item_code": str(get("Item Code")) if not pd.isna(get("Item Code")) else None,
-        "drawing_no": str(get("Drg.No")) if not pd.isna(get("Drg.No")) else None,
-        "size": str(get("Size")) if not pd.isna(get("Size")) else None,
-
-        # For now, we treat Item Code as the main part number
-        "part_number": str(get("Item Code")) if not pd.isna(get("Item Code")) else None,
-
-        "order_qty": int(get("Order Qty")) if not pd.isna(get("Order Qty")) else None,
-        "pack_qty": int(get("Pack Qty")) if not pd.isna(get("Pack Qty")) else None,
-        "sale_qty": int(get("Sale Qty")) if not pd.isna(get("Sale Qty")) else None,
-        "cancel_qty": int(get("Cncl.Qty")) if not pd.isna(get("Cncl.Qty")) else None,
-        "os_order_qty": int(get("O/S Ord.Qty")) if not pd.isna(get("O/S Ord.Qty")) else None,
-
-        "unit": str(get("Unit")) if not pd.isna(get("Unit")) else None,
-
-        "rate": float(get("Rate")) if not pd.isna(get("Rate")) else None,
-        "gross_value": float(get("Gross Value")) if not pd.isna(get("Gross Value")) else None,
-        "currency": str(get("Currency")) if not pd.isna(get("Currency")) else None,
-        "currency_value": float(get("Currency Value")) if not pd.isna(get("Currency Value")) else None,
-
-        "delivery_date": delivery_date,
-        "commitment_date": commitment_date,
-
-        "packslip_no": str(get("Pack Slip No")) if not pd.isna(get("Pack Slip No")) else None,
-        "packslip_date": packslip_date,
-
-        "department": str(get("Department")) if not pd.isna(get("Department")) else None,
-        "department_remark": str(get("Dept.Remark")) if not pd.isna(get("Dept.Remark")) else None,
-
-        "payment_term": str(get("Payment Term")) if not pd.isna(get("Payment Term")) else None,
-        "so_comment": str(get("S.O Comment")) if not pd.isna(get("S.O Comment")) else None,
-        "so_special_remark": str(get("SO SPL.Remark")) if not pd.isna(get("SO SPL.Remark")) else None,
-        "die_indent": str(get("DIE Indend")) if not pd.isna(get("DIE Indend")) else None,
-
-        "item_description": str(get("Item Description")) if not pd.isna(get("Item Description")) else None,
+            df = read_upload(file.file, file.filename, profiler)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error reading {file.filename}: {e}")
 
-        "financial_year": fy,
-    }
-
-    upsert_order(db, data)
-
-
-def process_delivery_row(db: Session, row) -> None:
-    """
-    Map one 'Delivery Report' row into Order and upsert.
-    """
-    def get(col_name):
-        return row.get(col_name, None)
-
-    so_date = parse_date_safe(get("S.O Date"))
-    order_date = parse_date_safe(get("Order Dt."))
-    delivery_date = parse_date_safe(get("Delv Date"))
-    invoice_date = parse_date_safe(get("Date"))
-    docket_date = parse_date_safe(get("Docket Dt"))
-    packslip_date = parse_date_safe(get("Pack Slip Dt"))
-
-    fy = detect_financial_year(order_date or so_date or delivery_date or invoice_date)
-
-    packslip_no = None
-    if not pd.isna(get("Packslip No & Date")):
-        text = str(get("Packslip No & Date"))
-        packslip_no = text  # you can later split by space or '/' if format is consistent
-
-    data = {
-        "source_type": "DELIVERY",
-        "status": "DISPATCHED",
-
-        "so_number": str(get("S.O No")) if not pd.isna(get("S.O No")) else None,
-        "so_date": so_date,
-        "order_no": str(get("Order No")) if not pd.isna(get("Order No")) else None,
-        "order_date": order_date,
-        "po_serial": str(get("P Srl")) if not pd.isna(get("P Srl")) else None,
-
-        "customer_name": get("Party Name"),
-        "customer_code": str(get("Cust Code")) if not pd.isna(get("Cust Code")) else None,
-
-        "met_code": str(get("Met Code")) if not pd.isna(get("Met Code")) else None,
-        "product_code": str(get("Produce Code")) if not pd.isna(get("Produce Code")) else None,
-        "drawing_no": str(get("Drg.No")) if not pd.isna(get("Drg.No")) else None,
-        "size": str(get("Size")) if not pd.isna(get("Size")) else None,
-
-        # For delivery, we treat Produce Code as main part number
-        "part_number": str(get("Produce Code")) if not pd.isna(get("Produce Code")) else None,
-
-        "quantity": int(get("Quantity")) if not pd.isna(get("Quantity")) else None,
-        "unit": str(get("Unit")) if not pd.isna(get("Unit")) else None,
-        "net_kg": float(get("Net (Kg)")) if not pd.isna(get("Net (Kg)")) else None,
-        "part_full": str(get("Part/Full")) if not pd.isna(get("Part/Full")) else None,
-
-        "rate": float(get("Rate")) if not pd.isna(get("Rate")) else None,
-        "amount": float(get("Amount")) if not pd.isna(get("Amount")) else None,
-        "freight_amount": float(get("Frt.Amount")) if not pd.isna(get("Frt.Amount")) else None,
-
-        "packslip_no": packslip_no,
-        "packslip_date": packslip_date,
-
-        "invoice_no": str(get("Invoice No")) if not pd.isna(get("Invoice No")) else None,
-        "invoice_date": invoice_date,
-
-        "transporter": str(get("Transporter")) if not pd.isna(get("Transporter")) else None,
-        "docket_no": str(get("Docket No")) if not pd.isna(get("Docket No")) else None,
-        "docket_date": docket_date,
-
-        "freight_mode": str(get("Frt.Mode")) if not pd.isna(get("Frt.Mode")) else None,
-        "from_station": str(get("From Station")) if not pd.isna(get("From Station")) else None,
-        "to_station": str(get("To Station")) if not pd.isna(get("To Station")) else None,
-        "package_details": str(get("Package Details")) if not pd.isna(get("Package Details")) else None,
-        "gross_weight": float(get("Gross Wt")) if not pd.isna(get("Gross Wt")) else None,
-        "charge_weight": float(get("Charge Wt.")) if not pd.isna(get("Charge Wt.")) else None,
-        "insurance_mode": str(get("Insurance Mode")) if not pd.isna(get("Insurance Mode")) else None,
-
-        "delivery_date": delivery_date,
-        "department": str(get("Department")) if not pd.isna(get("Department")) else None,
-        "state_code": str(get("State Code")) if not pd.isna(get("State Code")) else None,
-
-        "sub_head": str(get("Sub Head")) if not pd.isna(get("Sub Head")) else None,
-        "item_description": str(get("Description")) if not pd.isna(get("Description")) else None,
-
-        "financial_year": fy,
+        outstanding_snapshot = OutstandingSnapshot(db, plant_id) if snapshot else None
+        try:
+            ingested = ingest_dataframe(
+                db, df, report_type, profiler, plant_id,
+                source_file=os.path.basename(file.filename), snapshot=outstanding_snapshot,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        rows_closed = outstanding_snapshot.close_vanished() if snapshot else 0
+
+        with profiler.stage("commit"):
+            db.commit()
+
+    result = {
+        "status": "success",
+        "rows_processed": ingested.rows,
+        "rows_quarantined": ingested.quarantined,
+        "rejects": ingested.rejects,
+        "plant_id": plant_id,
     }
-
-    upsert_order(db, data)
+    if snapshot:
+        result["rows_closed"] = rows_closed
+    if profile:
+        result["profile"] = profiler.report()
+        if dump_path:
+            result["profile"]["cprofile_dump"] = dump_path
+    return result
 
 
 @router.post("/outstanding-csv")
 async def ingest_outstanding_csv(
     file: UploadFile = File(...),
+    profile: bool = False,
+    plant_id: Optional[int] = None,
+    snapshot: Optional[bool] = None,
     db: Session = Depends(get_db),
     admin = Depends(get_current_admin),
 ):
     """
-    Ingest 'Sales Order Outstanding' CSV uploaded by client.
-    """
-    if not file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Please upload a CSV file")
-
-    try:
-        # Read CSV into DataFrame
-        df = pd.read_csv(file.file)
-
-        # Normalize column names: strip spaces
-        df.columns = [col.strip() for col in df.columns]
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading CSV: {e}")
+    Ingest a 'Sales Order Outstanding' report uploaded by client (CSV,
+    optionally gzip/zstd-compressed, Parquet or Arrow IPC).
 
-    rows_processed = 0
+    ?plant_id= picks the plant (default: the admin's plant, else
+    DEFAULT_PLANT_ID). With ?profile=true the response includes a
+    per-stage / per-column timing breakdown.
 
-    for _, row in df.iterrows():
-        process_outstanding_row(db, row)
-        rows_processed += 1
-
-    db.commit()
-
-    return {"status": "success", "rows_processed": rows_processed}
+    ?snapshot=true (default: OUTSTANDING_SNAPSHOT) treats the file as the
+    complete list of open lines and closes the plant's PENDING Outstanding
+    orders it doesn't list; the response then includes rows_closed.
+    """
+    if snapshot is None:
+        snapshot = settings.OUTSTANDING_SNAPSHOT
+    return ingest_upload(
+        db, file, "outstanding", profile, ingest_plant(db, plant_id, admin), snapshot
+    )
 
 
 @router.post("/delivery-csv")
 async def ingest_delivery_csv(
     file: UploadFile = File(...),
+    profile: bool = False,
+    plant_id: Optional[int] = None,
     db: Session = Depends(get_db),
     admin = Depends(get_current_admin),
 ):
     """
-    Ingest 'Delivery Report' CSV uploaded by client.
-    """
+    Ingest a 'Delivery Report' uploaded by client (CSV, optionally
+    gzip/zstd-compressed, Parquet or Arrow IPC).
 
-    if not file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Please upload a CSV file")
-
-    try:
-        df = pd.read_csv(file.file)
-        df.columns = [col.strip() for col in df.columns]
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading CSV: {e}")
-
-    rows_processed = 0
-
-    for _, row in df.iterrows():
-        process_delivery_row(db, row)
-        rows_processed += 1
-
-    db.commit()
-
-    return {"status": "success", "rows_processed": rows_processed}
+    ?plant_id= picks the plant (default: the admin's plant, else
+    DEFAULT_PLANT_ID). With ?profile=true the response includes a
+    per-stage / per-column timing breakdown.
+    """
+    return ingest_upload(db, file, "delivery", profile, ingest_plant(db, plant_id, admin))
 
 
 @router.post("/from-folder")
-def ingest_from_folder(db: Session = Depends(get_db)):
+def ingest_from_folder(
+    profile: bool = False,
+    plant_id: Optional[int] = None,
+    snapshot: Optional[bool] = None,
+    db: Session = Depends(get_db),
     admin = Depends(get_current_admin),
+):
     """
-    Ingest Outstanding + Delivery data from local folder structure.
+    Ingest Outstanding + Delivery data from local folder structure into one
+    plant (?plant_id=, same default as the uploads).
+    With ?profile=true the response includes a timing breakdown per report type.
+    With ?snapshot=true (default: OUTSTANDING_SNAPSHOT) the Outstanding files
+    together are taken as the complete list of open lines; PENDING
+    Outstanding orders none of them lists are closed.
 
     Expects:
-      <BASE_DATA_PATH>/outstanding/*.xlsx or *.csv
-      <BASE_DATA_PATH>/delivery/*.xlsx or *.csv
+      <BASE_DATA_PATH>/outstanding/*.xlsx, *.csv[.gz|.zst], *.parquet or *.arrow
+      <BASE_DATA_PATH>/delivery/  (same formats)
 
     Example:
       data/outstanding/sales_outstanding.xlsx
       data/delivery/delivery_report.xlsx
     """
-    outstanding_dir = os.path.join(BASE_DATA_PATH, "outstanding")
-    delivery_dir = os.path.join(BASE_DATA_PATH, "delivery")
+    from app.services.ingestion import ingest_file, list_report_files
+    from app.services.snapshot import OutstandingSnapshot
 
+    if snapshot is None:
+        snapshot = settings.OUTSTANDING_SNAPSHOT
+    plant_id = ingest_plant(db, plant_id, admin)
     processed = {"outstanding": 0, "delivery": 0}
+    rows_closed = 0
+    quarantined = {"outstanding": 0, "delivery": 0}
+    profilers = {
+        "outstanding": IngestProfiler() if profile else NULL_PROFILER,
+        "delivery": IngestProfiler() if profile else NULL_PROFILER,
+    }
 
-    # Ensure base dirs exist (won't crash if missing; just skip)
-    os.makedirs(outstanding_dir, exist_ok=True)
-    os.makedirs(delivery_dir, exist_ok=True)
-
-    def read_table(path: str) -> pd.DataFrame:
-        if path.lower().endswith(".csv"):
-            df_local = pd.read_csv(path)
-        else:
-            # assume Excel
-            df_local = pd.read_excel(path)
-        df_local.columns = [col.strip() for col in df_local.columns]
-        return df_local
-
-    # Outstanding files
-    for file_name in os.listdir(outstanding_dir):
-        if not (file_name.lower().endswith(".csv") or file_name.lower().endswith(".xlsx") or file_name.lower().endswith(".xls")):
-            continue
-        file_path = os.path.join(outstanding_dir, file_name)
-        df = read_table(file_path)
-        for _, row in df.iterrows():
-            process_outstanding_row(db, row)
-            processed["outstanding"] += 1
-
-    # Delivery files
-    for file_name in os.listdir(delivery_dir):
-        if not (file_name.lower().endswith(".csv") or file_name.lower().endswith(".xlsx") or file_name.lower().endswith(".xls")):
-            continue
-        file_path = os.path.join(delivery_dir, file_name)
-        df = read_table(file_path)
-        for _, row in df.iterrows():
-            process_delivery_row(db, row)
-            processed["delivery"] += 1
-
-    db.commit()
-
-    return {"status": "success", "processed": processed, "base_path": BASE_DATA_PATH}
+    dump_dir = settings.INGEST_PROFILE_DIR if profile else None
+    with cprofile_to_disk(dump_dir, "from_folder") as dump_path:
+        # Outstanding files, then Delivery files
+        # (missing folders are created, so an empty setup just processes nothing)
+        for report_type in ("outstanding", "delivery"):
+            file_paths = list_report_files(os.path.join(BASE_DATA_PATH, report_type))
+            outstanding_snapshot = None
+            if report_type == "outstanding" and snapshot and file_paths:
+                outstanding_snapshot = OutstandingSnapshot(db, plant_id)
+
+            for file_path in file_paths:
+                try:
+                    ingested = ingest_file(
+                        db, file_path, report_type, profilers[report_type], plant_id, outstanding_snapshot
+                    )
+                except ValueError as e:
+                    db.rollback()
+                    raise HTTPException(status_code=400, detail=f"{os.path.basename(file_path)}: {e}")
+                processed[report_type] += ingested.rows
+                quarantined[report_type] += ingested.quarantined
+
+            if outstanding_snapshot is not None:
+                rows_closed = outstanding_snapshot.close_vanished()
+
+        # one commit covers both report types; charge it to the outstanding profile
+        with profilers["outstanding"].stage("commit"):
+            db.commit()
+
+    result = {
+        "status": "success",
+        "processed": processed,
+        "quarantined": quarantined,
+        "base_path": BASE_DATA_PATH,
+        "plant_id": plant_id,
+    }
+    if snapshot:
+        result["rows_closed"] = rows_closed
+    if profile:
+        result["profile"] = {name: p.report() for name, p in profilers.items()}
+        if dump_path:
+            result["profile"]["cprofile_dump"] = dump_path
+    return result
+
+
+@router.get("/quarantine")
+def list_quarantined_rows(
+    plant_id: Optional[int] = None,
+    source_type: Optional[str] = None,
+    source_file: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    admin = Depends(get_current_admin),
+):
+    """
+    Rows rejected by ingest validation, newest first, with the reasons and
+    the raw report values. Each re-ingest of a file replaces its rows here.
+    """
+    query = db.query(QuarantinedRow)
+    if admin.plant_id is not None or plant_id is not None:
+        query = query.filter(QuarantinedRow.plant_id == ingest_plant(db, plant_id, admin))
+    if source_type:
+        query = query.filter(QuarantinedRow.source_type == source_type.upper())
+    if source_file:
+        query = query.filter(QuarantinedRow.source_file == source_file)
+
+    rows = query.order_by(QuarantinedRow.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": row.id,
+            "created_at": row.created_at,
+            "plant_id": row.plant_id,
+            "source_type": row.source_type,
+            "source_file": row.source_file,
+            "row_number": row.row_number,
+            "reasons": json.loads(row.reasons),
+            "values": json.loads(row.payload),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,39 @@
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.deps import get_current_admin, get_current_user, optional_oauth2_scheme
+from app.core.metrics import render_prometheus
+from app.db.deps import get_db
+
+router = APIRouter(tags=["metrics"])
+
+
+def require_metrics_access(token: str | None = Depends(optional_oauth2_scheme), db=Depends(get_db)) -> None:
+    """
+    Bearer METRICS_TOKEN (for the scraper) or an admin's access token: the
+    slow-query log includes SQL text.
+    """
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if settings.METRICS_TOKEN and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return
+    get_current_admin(get_current_user(token, db))
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+def metrics():
+    """
+    Prometheus text exposition: per-route latency histograms, SQL
+    statement counts/time per request and recent slow queries.
+    """
+    return PlainTextResponse(
+        render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
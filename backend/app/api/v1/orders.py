@@ -1,13 +1,19 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import case, func, or_
 
+from app.core.deps import get_plant_scope
 from app.db.deps import get_db
+from app.db.partitioning import financial_year_filter
 from app.models.order import Order
-from app.schemas.order import OrderSummary
+from app.schemas.order import OrderChanges, OrderLookup, OrderLookupResult, OrderSummary, Suggestion
+from app.services.change_feed import changes_since
+from app.services.dispatch_board import dispatch_board
+from app.services.order_lookup import lookup_orders
+from app.services.suggest import MAX_SUGGESTIONS, suggest_index
 
 router = APIRouter(
     prefix="/orders",
@@ -15,30 +21,23 @@ router = APIRouter(
 )
 
 
-@router.get("/search", response_model=List[OrderSummary])
-def search_orders(
-    po_number: Optional[str] = None,        # PO / Order No
-    serial_number: Optional[str] = None,    # PO Srl / P Srl
-    part_number: Optional[str] = None,      # Item Code / Produce Code
+def apply_search_filters(
+    query,
+    po_number: Optional[str] = None,
+    serial_number: Optional[str] = None,
+    part_number: Optional[str] = None,
     customer_name: Optional[str] = None,
-    status: Optional[str] = None,           # PENDING / DISPATCHED
-    source_type: Optional[str] = None,      # OUTSTANDING / DELIVERY
+    status: Optional[str] = None,
+    source_type: Optional[str] = None,
     financial_year: Optional[str] = None,
-    limit: int = 50,
-    skip: int = 0,
-    db: Session = Depends(get_db),
+    plant_id: Optional[int] = None,
 ):
     """
-    Main search endpoint.
-
-    - Search by PO number (order_no or so_number)
-    - Serial number (po_serial)
-    - Part number (unified part_number)
-    - Customer name (contains, case-insensitive)
-    - Filter by status, source_type, financial_year
+    Apply the /orders/search filters to any query over Order
+    (row listing or aggregate).
     """
-
-    query = db.query(Order)
+    if plant_id is not None:
+        query = query.filter(Order.plant_id == plant_id)
 
     if po_number:
         like_value = f"%{po_number}%"
@@ -68,7 +67,46 @@ def search_orders(
         query = query.filter(Order.source_type == source_type.upper())
 
     if financial_year:
-        query = query.filter(Order.financial_year == financial_year)
+        query = query.filter(financial_year_filter(query.session, financial_year))
+
+    return query
+
+
+@router.get("/search", response_model=List[OrderSummary])
+def search_orders(
+    po_number: Optional[str] = None,        # PO / Order No
+    serial_number: Optional[str] = None,    # PO Srl / P Srl
+    part_number: Optional[str] = None,      # Item Code / Produce Code
+    customer_name: Optional[str] = None,
+    status: Optional[str] = None,           # PENDING / DISPATCHED / CLOSED
+    source_type: Optional[str] = None,      # OUTSTANDING / DELIVERY
+    financial_year: Optional[str] = None,
+    limit: int = 50,
+    skip: int = 0,
+    plant_id: Optional[int] = Depends(get_plant_scope),
+    db: Session = Depends(get_db),
+):
+    """
+    Main search endpoint.
+
+    - Search by PO number (order_no or so_number)
+    - Serial number (po_serial)
+    - Part number (unified part_number)
+    - Customer name (contains, case-insensitive)
+    - Filter by status, source_type, financial_year
+    """
+
+    query = apply_search_filters(
+        db.query(Order),
+        po_number=po_number,
+        serial_number=serial_number,
+        part_number=part_number,
+        customer_name=customer_name,
+        status=status,
+        source_type=source_type,
+        financial_year=financial_year,
+        plant_id=plant_id,
+    )
 
     results = (
         query.order_by(Order.id.desc())
@@ -80,6 +118,51 @@ def search_orders(
     return results
 
 
+@router.post("/lookup", response_model=OrderLookupResult)
+def lookup(
+    body: OrderLookup,
+    plant_id: Optional[int] = Depends(get_plant_scope),
+    db: Session = Depends(get_db),
+):
+    """
+    Batch lookup for pasted lists of Order Nos, S/O Nos, PO serials and part
+    numbers: one indexed IN query per field instead of a /orders/search call
+    per value. Results are grouped by field and input value.
+    """
+    try:
+        return lookup_orders(
+            db,
+            {field: getattr(body, field) for field in ("order_no", "so_number", "po_serial", "part_number")},
+            body.limit_per_key,
+            plant_id=plant_id,
+            status=body.status,
+            source_type=body.source_type,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/suggest", response_model=List[Suggestion])
+def suggest_values(
+    field: Literal["customer_name", "part_number", "order_no"],
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS),
+    plant_id: Optional[int] = Depends(get_plant_scope),
+):
+    """
+    Typeahead for the search box.
+
+    Distinct values of `field` starting with `q` (case-insensitive), most
+    frequent first. Served from an in-memory index kept current in the
+    background; never queries the database (empty until the index is built
+    after startup).
+    """
+    return [
+        {"value": value, "count": count}
+        for value, count in suggest_index.suggest(field, q, limit, plant_id)
+    ]
+
+
 @router.get("/open", response_model=List[OrderSummary])
 def open_orders(
     today_only: bool = False,
@@ -87,17 +170,22 @@ def open_orders(
     customer_name: Optional[str] = None,
     limit: int = 100,
     skip: int = 0,
+    plant_id: Optional[int] = Depends(get_plant_scope),
     db: Session = Depends(get_db),
 ):
     """
     Open Orders View:
 
     - All PENDING orders (status = PENDING)
-    - Optional: only today's delivery_date
+    - Optional: only today's delivery_date (floor screens: use
+      /orders/dispatch-board, which is precomputed)
     - Optional: filter by part_number and/or customer_name
     """
     query = db.query(Order).filter(Order.status == "PENDING")
 
+    if plant_id is not None:
+        query = query.filter(Order.plant_id == plant_id)
+
     if today_only:
         query = query.filter(Order.delivery_date == date.today())
 
@@ -117,3 +205,114 @@ def open_orders(
     )
 
     return results
+
+
+@router.get("/dispatch-board")
+def dispatch_board_view(plant_id: Optional[int] = Depends(get_plant_scope)):
+    """
+    Today's dispatch board: PENDING orders overdue, due today and due in the
+    next 7 days, grouped by customer and part with open qty / value and the
+    order lines. Precomputed after each ingest and at midnight and served
+    from memory; poll it freely.
+    """
+    return Response(content=dispatch_board.board(plant_id), media_type="application/json")
+
+
+@router.get("/summary")
+def orders_summary(
+    po_number: Optional[str] = None,
+    serial_number: Optional[str] = None,
+    part_number: Optional[str] = None,
+    customer_name: Optional[str] = None,
+    status: Optional[str] = None,
+    source_type: Optional[str] = None,
+    financial_year: Optional[str] = None,
+    plant_id: Optional[int] = Depends(get_plant_scope),
+    db: Session = Depends(get_db),
+):
+    """
+    Dashboard header badges.
+
+    Counts plus open quantity / open value grouped by status, source_type and
+    financial_year, computed in a single GROUP BY over the same filters as
+    /orders/search. Only PENDING orders count towards open quantity / value,
+    as in /orders/open. Totals are rolled up from the groups in Python.
+    """
+    pending = Order.status == "PENDING"
+    open_qty = func.coalesce(func.sum(case((pending, Order.os_order_qty), else_=0)), 0)
+    open_value = func.coalesce(func.sum(case((pending, Order.os_order_qty * Order.rate), else_=0)), 0)
+
+    query = apply_search_filters(
+        db.query(
+            Order.status.label("status"),
+            Order.source_type.label("source_type"),
+            Order.financial_year.label("financial_year"),
+            func.count(Order.id).label("orders"),
+            open_qty.label("open_qty"),
+            open_value.label("open_value"),
+        ),
+        po_number=po_number,
+        serial_number=serial_number,
+        part_number=part_number,
+        customer_name=customer_name,
+        status=status,
+        source_type=source_type,
+        financial_year=financial_year,
+        plant_id=plant_id,
+    ).group_by(Order.status, Order.source_type, Order.financial_year)
+
+    groups = []
+    totals = {"total_orders": 0, "open_qty": 0, "open_value": 0.0}
+    by_status: dict[str, int] = {}
+    by_source_type: dict[str, int] = {}
+    by_financial_year: dict[str, int] = {}
+
+    for row in query.all():
+        group = {
+            "status": row.status,
+            "source_type": row.source_type,
+            "financial_year": row.financial_year,
+            "orders": int(row.orders),
+            "open_qty": int(row.open_qty or 0),
+            "open_value": float(row.open_value or 0),
+        }
+        groups.append(group)
+
+        totals["total_orders"] += group["orders"]
+        totals["open_qty"] += group["open_qty"]
+        totals["open_value"] += group["open_value"]
+        for bucket, key in (
+            (by_status, row.status),
+            (by_source_type, row.source_type),
+            (by_financial_year, row.financial_year),
+        ):
+            bucket[key or "UNKNOWN"] = bucket.get(key or "UNKNOWN", 0) + group["orders"]
+
+    return {
+        **totals,
+        "by_status": by_status,
+        "by_source_type": by_source_type,
+        "by_financial_year": by_financial_year,
+        "groups": groups,
+    }
+
+
+@router.get("/changes", response_model=OrderChanges)
+def order_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    plant_id: Optional[int] = Depends(get_plant_scope),
+    db: Session = Depends(get_db),
+):
+    """
+    Delta sync for clients that cache orders.
+
+    - First call without `since` returns everything (paged by `limit`).
+    - Afterwards pass the returned `next_token` as `since` to get only rows
+      inserted/updated since then, plus ids of deleted rows.
+    - `has_more` means the page was cut at `limit`; call again immediately.
+    """
+    try:
+        return changes_since(db, since, limit, plant_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
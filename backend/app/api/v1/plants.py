@@ -0,0 +1,78 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.deps import get_current_admin, get_current_user, user_plant_id
+from app.db.deps import get_db
+from app.models.plant import Plant
+from app.models.user import User
+from app.schemas.plant import PlantCreate, PlantOut, UserPlant
+from app.schemas.user import UserOut
+
+router = APIRouter(
+    prefix="/plants",
+    tags=["plants"],
+)
+
+
+@router.get("", response_model=List[PlantOut])
+def list_plants(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Plants visible to the caller: all of them, or just their own.
+    """
+    query = db.query(Plant)
+    plant_id = user_plant_id(current_user)
+    if plant_id is not None:
+        query = query.filter(Plant.id == plant_id)
+    return query.order_by(Plant.id).all()
+
+
+@router.post("", response_model=PlantOut)
+def create_plant(
+    plant: PlantCreate,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin),
+):
+    if admin.plant_id is not None:
+        raise HTTPException(status_code=403, detail="Only an all-plants admin can add plants")
+
+    code = plant.code.strip().upper()
+    if db.query(Plant).filter(Plant.code == code).first():
+        raise HTTPException(status_code=400, detail="Plant code already exists")
+
+    new_plant = Plant(code=code, name=plant.name)
+    db.add(new_plant)
+    db.commit()
+    db.refresh(new_plant)
+    return new_plant
+
+
+@router.put("/users/{user_id}", response_model=UserOut)
+def set_user_plant(
+    user_id: int,
+    body: UserPlant,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_current_admin),
+):
+    """
+    Bind a user to one plant (their orders / analytics are then scoped to
+    it), or pass plant_id=null to let an admin see every plant (other users
+    without a plant see DEFAULT_PLANT_ID).
+    """
+    if admin.plant_id is not None:
+        raise HTTPException(status_code=403, detail="Only an all-plants admin can assign plants")
+
+    user = db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if body.plant_id is not None and db.get(Plant, body.plant_id) is None:
+        raise HTTPException(status_code=404, detail="Plant not found")
+
+    user.plant_id = body.plant_id
+    db.commit()
+    db.refresh(user)
+    return user
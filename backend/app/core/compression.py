@@ -0,0 +1,271 @@
+"""
+Response compression and conditional GETs.
+
+- CompressionMiddleware compresses complete JSON / text bodies of at least
+  COMPRESSION_MIN_BYTES with brotli (when the package is installed and the
+  client asks for it) or gzip. Streaming responses - /events in particular -
+  are passed through untouched, since holding back their chunks would break
+  server-sent events.
+- ETagMiddleware gives GET responses under ETAG_PATH_PREFIXES a weak ETag
+  (a hash of the uncompressed body) and answers a matching If-None-Match
+  with 304 Not Modified, so a dashboard polling the same list only downloads
+  it again once the data changed. The handler still runs; what's saved is
+  the transfer and the client's JSON parsing.
+
+Both are pure ASGI middleware like MetricsMiddleware. ETagMiddleware must
+sit inside CompressionMiddleware so the tag describes the identity body and
+the gzip and brotli variants of one response share it.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+# never buffered or compressed
+STREAMING_TYPES = ("text/event-stream",)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# bodies this large are compressed off the event loop, and the result is
+# kept for the next identical body (the polled dispatch board is served from
+# memory, so it would otherwise be recompressed on every request)
+LARGE_BODY_BYTES = 256 * 1024
+COMPRESSED_CACHE_SIZE = 8
+
+
+def _header(headers: list, name: bytes) -> bytes | None:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers: list, *names: bytes) -> list:
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _add_vary(headers: list, value: bytes) -> list:
+    vary = _header(headers, b"vary")
+    if vary is None:
+        return headers + [(b"vary", value)]
+    if value.lower() in [v.strip().lower() for v in vary.split(b",")]:
+        return headers
+    return _without(headers, b"vary") + [(b"vary", vary + b", " + value)]
+
+
+def _media_type(headers: list) -> str:
+    content_type = _header(headers, b"content-type") or b""
+    return content_type.split(b";")[0].strip().decode("latin-1").lower()
+
+
+def accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """
+    Accept-Encoding -> {coding: q}; refused codings stay in with q=0, so a
+    wildcard can't accept them again.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """
+    "br" or "gzip" for an Accept-Encoding header; None for identity.
+    Prefers brotli on equal q since it is smaller for JSON.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = []
+    if brotli is not None:
+        candidates.append(("br", accepted.get("br", wildcard)))
+    candidates.append(("gzip", accepted.get("gzip", wildcard)))
+    coding, q = max(candidates, key=lambda c: c[1])
+    return coding if q > 0 else None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+_compressed_cache: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+_compressed_cache_lock = threading.Lock()
+
+
+def compress_large(body: bytes, coding: str) -> bytes:
+    key = (hashlib.blake2b(body, digest_size=16).digest(), coding)
+    with _compressed_cache_lock:
+        compressed = _compressed_cache.get(key)
+        if compressed is not None:
+            _compressed_cache.move_to_end(key)
+            return compressed
+    compressed = compress(body, coding)
+    with _compressed_cache_lock:
+        _compressed_cache[key] = compressed
+        while len(_compressed_cache) > COMPRESSED_CACHE_SIZE:
+            _compressed_cache.popitem(last=False)
+    return compressed
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        coding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        held: dict = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response_headers = list(message.get("headers", []))
+                media_type = _media_type(response_headers)
+                if (
+                    message["status"] in (204, 304)
+                    or _header(response_headers, b"content-encoding") is not None
+                    or media_type in STREAMING_TYPES
+                    or not media_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    await send(message)
+                    return
+                held["start"] = {**message, "headers": _add_vary(response_headers, b"Accept-Encoding")}
+                return
+
+            if message["type"] != "http.response.body" or "start" not in held:
+                await send(message)
+                return
+
+            start = held.pop("start")
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # streamed or too small to be worth it
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= LARGE_BODY_BYTES:
+                compressed = await run_in_threadpool(compress_large, body, coding)
+            else:
+                compressed = compress(body, coding)
+            start["headers"] = _without(start["headers"], b"content-length") + [
+                (b"content-encoding", coding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def weak_etag(body: bytes) -> bytes:
+    return b'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """
+    Weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored.
+    """
+    if if_none_match.strip() == b"*":
+        return True
+    opaque = etag.removeprefix(b"W/")
+    return any(
+        candidate.strip().removeprefix(b"W/") == opaque
+        for candidate in if_none_match.split(b",")
+    )
+
+
+class ETagMiddleware:
+    def __init__(self, app, path_prefixes: tuple[str, ...]) -> None:
+        self.app = app
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = dict(scope.get("headers") or ()).get(b"if-none-match")
+        held: dict = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response_headers = list(message.get("headers", []))
+                if (
+                    message["status"] != 200
+                    or _header(response_headers, b"etag") is not None
+                    or _media_type(response_headers) in STREAMING_TYPES
+                ):
+                    await send(message)
+                    return
+                held["start"] = message
+                return
+
+            if message["type"] != "http.response.body" or "start" not in held:
+                await send(message)
+                return
+
+            start = held.pop("start")
+            if message.get("more_body", False):
+                await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            etag = weak_etag(body)
+            headers = _without(start["headers"], b"cache-control") + [
+                (b"etag", etag),
+                # cache, but ask every time (responses depend on the user's plant)
+                (b"cache-control", b"private, no-cache"),
+            ]
+            if if_none_match is not None and etag_matches(if_none_match, etag):
+                headers = _without(headers, b"content-length", b"content-type")
+                await send({"type": "http.response.start", "status": 304, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send({**start, "headers": headers})
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
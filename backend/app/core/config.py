@@ -23,12 +23,67 @@ class Settings(BaseModel):
         "http://localhost:5173"
     )
 
-    DATA_FOLDER: str = "data"
-    IMAP_HOST: str | None = None
-    IMAP_PORT: int = 993
-    IMAP_USERNAME: str | None = None
-    IMAP_PASSWORD: str | None = None
-    IMAP_FOLDER: str = "INBOX"
+    # Read-replica / API-only workers can drop the /ingest routes entirely and
+    # skip create_all (tables are managed by the writer or migrations).
+    INGESTION_ENABLED: bool = os.getenv("INGESTION_ENABLED", "true").lower() == "true"
+    CREATE_TABLES_ON_STARTUP: bool = os.getenv("CREATE_TABLES_ON_STARTUP", "true").lower() == "true"
+
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    # Bearer token the Prometheus scraper sends to /metrics (admins can use
+    # their access token); unset: admins only
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+
+    # gzip / brotli for JSON and text bodies of at least COMPRESSION_MIN_BYTES
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    # Weak ETags / 304 Not Modified for GETs under these path prefixes
+    ETAGS_ENABLED: bool = os.getenv("ETAGS_ENABLED", "true").lower() == "true"
+    ETAG_PATH_PREFIXES: str = os.getenv("ETAG_PATH_PREFIXES", "/orders,/analytics,/plants")
+
+    # Ingest notices for /events: "memory" (single process) or "database"
+    # (ingest_events table polled by every API process)
+    EVENT_BROKER: str = os.getenv("EVENT_BROKER", "memory").lower()
+    EVENT_POLL_SECONDS: float = float(os.getenv("EVENT_POLL_SECONDS", "2"))
+
+    # Rows kept per (plant, financial year) for /analytics/*?approximate=true
+    ANALYTICS_SAMPLE_SIZE: int = int(os.getenv("ANALYTICS_SAMPLE_SIZE", "5000"))
+    # ...kept up to date per change; rebuilt this often to reset the distinct-count sketches
+    ANALYTICS_SAMPLE_REBUILD_HOURS: float = float(os.getenv("ANALYTICS_SAMPLE_REBUILD_HOURS", "24"))
+
+    DATA_FOLDER: str = os.getenv("DATA_FOLDER", "data")
+    # Plant that worker / IMAP / folder ingests (and uploads without
+    # ?plant_id=) write to
+    DEFAULT_PLANT_ID: int = int(os.getenv("DEFAULT_PLANT_ID", "1"))
+    # SQLite only: financial years taken out of orders are moved here
+    # (python -m app.db.partitioning archive)
+    ORDERS_ARCHIVE_PATH: str = os.getenv(
+        "ORDERS_ARCHIVE_PATH",
+        os.path.join(os.getenv("DATA_FOLDER", "data"), "orders_archive.db"),
+    )
+    # Treat every Outstanding export as a full snapshot: PENDING lines it no
+    # longer lists are closed (uploads / folder sweep override with ?snapshot=)
+    OUTSTANDING_SNAPSHOT: bool = os.getenv("OUTSTANDING_SNAPSHOT", "false").lower() == "true"
+    # .xlsx reports are streamed into the pipeline this many rows at a time
+    EXCEL_CHUNK_ROWS: int = int(os.getenv("EXCEL_CHUNK_ROWS", "5000"))
+    # When set, ?profile=true ingests also dump a cProfile .prof file here
+    INGEST_PROFILE_DIR: str | None = os.getenv("INGEST_PROFILE_DIR") or None
+    IMAP_HOST: str | None = os.getenv("IMAP_HOST") or None
+    IMAP_PORT: int = int(os.getenv("IMAP_PORT", "993"))
+    IMAP_SSL: bool = os.getenv("IMAP_SSL", "true").lower() == "true"
+    IMAP_USERNAME: str | None = os.getenv("IMAP_USERNAME") or None
+    IMAP_PASSWORD: str | None = os.getenv("IMAP_PASSWORD") or None
+    IMAP_FOLDER: str = os.getenv("IMAP_FOLDER", "INBOX")
+    # attachment parts downloaded in parallel (one IMAP connection each)
+    IMAP_FETCH_WORKERS: int = int(os.getenv("IMAP_FETCH_WORKERS", "4"))
+    # UIDVALIDITY / last UID bookkeeping; defaults to DATA_FOLDER/.imap_state.json
+    IMAP_STATE_FILE: str | None = os.getenv("IMAP_STATE_FILE") or None
+
+    # Ingestion worker (python -m app.worker)
+    IMAP_POLL_SECONDS: float = float(os.getenv("IMAP_POLL_SECONDS", "300"))
+    WORKER_POLL_SECONDS: float = float(os.getenv("WORKER_POLL_SECONDS", "5"))
+    WORKER_DEBOUNCE_SECONDS: float = float(os.getenv("WORKER_DEBOUNCE_SECONDS", "10"))
+    WORKER_QUEUE_SIZE: int = int(os.getenv("WORKER_QUEUE_SIZE", "4"))
 
     class Config:
         env_file = ".env"
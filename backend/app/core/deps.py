@@ -1,4 +1,6 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 
@@ -7,6 +9,8 @@ from app.db.deps import get_db
 from app.models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# same, but a missing token is not an error (read endpoints stay open)
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)) -> User:
     try:
@@ -28,3 +32,50 @@ def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
+
+
+def get_optional_user(
+    token: str | None = Depends(optional_oauth2_scheme), db=Depends(get_db)
+) -> User | None:
+    if token is None:
+        return None
+    return get_current_user(token, db)
+
+
+def user_plant_id(user: User) -> int | None:
+    """
+    Plant a signed-in user is limited to; None (every plant) only for admins
+    not bound to a plant. Other users without a plant get DEFAULT_PLANT_ID
+    until an admin assigns them one.
+    """
+    if user.plant_id is not None:
+        return user.plant_id
+    if user.role == "admin":
+        return None
+    return settings.DEFAULT_PLANT_ID
+
+
+def get_plant_scope(
+    plant_id: Optional[int] = Query(None, description="Limit to one plant"),
+    current_user: User | None = Depends(get_optional_user),
+) -> int | None:
+    """
+    Plant every orders / analytics / events query is limited to; None means
+    all plants, which only all-plants admins get. Other users always get
+    their plant (see user_plant_id); anonymous callers only ever see
+    DEFAULT_PLANT_ID, so leaving out the token can't widen the scope.
+    """
+    if current_user is None:
+        if plant_id is not None and plant_id != settings.DEFAULT_PLANT_ID:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Sign in to see other plants",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return settings.DEFAULT_PLANT_ID
+    scope = user_plant_id(current_user)
+    if scope is not None:
+        if plant_id is not None and plant_id != scope:
+            raise HTTPException(status_code=403, detail="No access to that plant")
+        return scope
+    return plant_id
@@ -0,0 +1,261 @@
+"""
+Ingest-completion notices and a small pub/sub to fan them out.
+
+Whenever a session commits changes to Order rows, a notice like
+
+    {"type": "ingest", "rows": 1824, "source_types": ["OUTSTANDING"],
+     "financial_years": ["2025-2026"], "plant_ids": [1],
+     "at": "2025-08-01T10:15:00"}
+
+is published ("plant_ids" is left out when a bulk statement touched rows of
+unknown plants). /events only forwards a notice to a plant-scoped client
+when it concerns that plant.
+
+Subscribers are:
+  - SSE clients of /events (asyncio queues, one per connection), and
+  - in-process listeners (caches that must be refreshed after an ingest).
+
+EVENT_BROKER selects how notices travel:
+  - "memory"   : in-process only (single API worker, or ingest runs inside
+                 the API process).
+  - "database" : notices are written to the ingest_events table and every
+                 API process polls it, so ingests done by another worker or
+                 by `python -m app.worker` still reach every dashboard.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.ingest_event import IngestEvent
+from app.models.order import Order
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+EVENT_RETENTION = timedelta(days=1)
+
+
+class EventHub:
+    """
+    Local fan-out: asyncio subscriber queues plus plain callbacks.
+    publish() is safe to call from any thread.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self._listeners: list[Callable[[dict], None]] = []
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = {(loop, sq) for loop, sq in self._subscribers if sq is not q}
+
+    def add_listener(self, callback: Callable[[dict], None]) -> None:
+        with self._lock:
+            self._listeners.append(callback)
+
+    def publish(self, notice: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+
+        for loop, q in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, q, notice)
+            except RuntimeError:
+                # loop closed; the connection is gone
+                self.unsubscribe(q)
+
+        for callback in listeners:
+            try:
+                callback(notice)
+            except Exception:
+                logger.exception("Ingest listener %r failed", callback)
+
+
+def _offer(q: asyncio.Queue, notice: dict) -> None:
+    if q.full():
+        # slow client: drop the oldest notice rather than block publishers
+        q.get_nowait()
+    q.put_nowait(notice)
+
+
+hub = EventHub()
+
+
+# --------------------------------------------------------------------------
+# Brokers
+# --------------------------------------------------------------------------
+
+class MemoryBroker:
+    def publish(self, notice: dict) -> None:
+        hub.publish(notice)
+
+    def ensure_started(self) -> None:
+        pass
+
+
+class DatabaseBroker:
+    """
+    Stand-in broker for multi-process setups, using the ingest_events table.
+    One daemon thread per process polls for rows newer than the last one seen
+    and hands them to the local hub.
+    """
+
+    def __init__(self, poll_seconds: float) -> None:
+        self.poll_seconds = poll_seconds
+        self._started = False
+        self._lock = threading.Lock()
+        self._last_id: int | None = None
+
+    def publish(self, notice: dict) -> None:
+        db = SessionLocal()
+        try:
+            db.add(IngestEvent(payload=json.dumps(notice)))
+            db.query(IngestEvent).filter(
+                IngestEvent.created_at < datetime.utcnow() - EVENT_RETENTION
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def ensure_started(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._poll_loop, name="ingest-events", daemon=True).start()
+
+    def _poll_loop(self) -> None:
+        while True:
+            db = SessionLocal()
+            try:
+                if self._last_id is None:
+                    # only deliver what happens from now on
+                    latest = db.query(IngestEvent.id).order_by(IngestEvent.id.desc()).limit(1).scalar()
+                    self._last_id = latest or 0
+                rows = (
+                    db.query(IngestEvent)
+                    .filter(IngestEvent.id > self._last_id)
+                    .order_by(IngestEvent.id)
+                    .all()
+                )
+                for row in rows:
+                    self._last_id = row.id
+                    hub.publish(json.loads(row.payload))
+            except Exception:
+                logger.exception("Polling ingest_events failed")
+            finally:
+                db.close()
+            time.sleep(self.poll_seconds)
+
+
+def _make_broker():
+    if settings.EVENT_BROKER == "database":
+        return DatabaseBroker(settings.EVENT_POLL_SECONDS)
+    return MemoryBroker()
+
+
+broker = _make_broker()
+
+
+def publish_ingest(rows: int, source_types, financial_years, **extra) -> None:
+    notice = {
+        "type": "ingest",
+        "rows": rows,
+        "source_types": sorted({s for s in source_types if s}),
+        "financial_years": sorted({fy for fy in financial_years if fy}),
+        "at": datetime.utcnow().isoformat(timespec="seconds"),
+        **extra,
+    }
+    try:
+        broker.publish(notice)
+    except Exception:
+        # a notice is best-effort; never fail the ingest because of it
+        logger.exception("Publishing ingest notice failed")
+
+
+def on_ingest(callback: Callable[[dict], None]) -> None:
+    """
+    Register an in-process callback for ingest notices (cache refreshes).
+    """
+    hub.add_listener(callback)
+    broker.ensure_started()
+
+
+# --------------------------------------------------------------------------
+# Change tracking on the ORM session
+# --------------------------------------------------------------------------
+
+def _changes(session: Session) -> dict:
+    return session.info.setdefault(
+        "order_changes",
+        {"rows": 0, "source_types": set(), "financial_years": set(), "plant_ids": set()},
+    )
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _collect_order_changes(session, flush_context, instances):
+    changed = [
+        obj
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, Order)
+    ]
+    if not changed:
+        return
+    changes = _changes(session)
+    changes["rows"] += len(changed)
+    for obj in changed:
+        changes["source_types"].add(obj.source_type)
+        changes["financial_years"].add(obj.financial_year)
+        changes["plant_ids"].add(obj.plant_id)
+
+
+def record_bulk_change(
+    session: Session, rows: int, source_types, financial_years, plant_ids=None
+) -> None:
+    """
+    Bulk UPDATE/DELETE statements bypass flush events; call this so their
+    rows still show up in the ingest notice of the surrounding commit.
+    Without plant_ids the notice goes to every plant.
+    """
+    changes = _changes(session)
+    changes["rows"] += rows
+    changes["source_types"].update(source_types)
+    changes["financial_years"].update(financial_years)
+    if plant_ids is None:
+        # None in the set: plants unknown
+        changes["plant_ids"].add(None)
+    else:
+        changes["plant_ids"].update(plant_ids)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_order_changes(session):
+    changes = session.info.pop("order_changes", None)
+    if changes and changes["rows"]:
+        extra = {}
+        if None not in changes["plant_ids"]:
+            extra["plant_ids"] = sorted(changes["plant_ids"])
+        publish_ingest(changes["rows"], changes["source_types"], changes["financial_years"], **extra)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_order_changes(session):
+    session.info.pop("order_changes", None)
@@ -0,0 +1,250 @@
+"""
+Per-request timing and SQL instrumentation.
+
+- MetricsMiddleware times every HTTP request and keeps per-route latency
+  histograms, plus how many SQL statements each request ran and how long
+  they took.
+- SQL is measured through SQLAlchemy before/after_cursor_execute events on
+  the engine; statements slower than SLOW_QUERY_MS are logged with the route
+  that issued them.
+- Responses get a Server-Timing header (app, db) so browser devtools show
+  where the time went.
+- render_prometheus() produces the text exposition served at /metrics.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class RequestStats:
+    """
+    SQL counters for the request currently being served.
+
+    Stored in a ContextVar; sync endpoints run in a threadpool with a copy of
+    the context, which still points at this same (mutable) object.
+    """
+
+    __slots__ = ("scope", "sql_count", "sql_seconds")
+
+    def __init__(self, scope) -> None:
+        # the router fills scope["route"] in place once it matches
+        self.scope = scope
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    def __init__(self, slow_query_log_size: int = 50) -> None:
+        self._lock = threading.Lock()
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.sql_count: dict[tuple[str, str], Histogram] = {}
+        self.sql_seconds: dict[tuple[str, str], float] = {}
+        self.responses: dict[tuple[str, str, str], int] = {}
+        self.slow_queries_total = 0
+        # (route, statement) -> last duration, oldest evicted first
+        self.slow_queries: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self.slow_query_log_size = slow_query_log_size
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.sql_count.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(stats.sql_count)
+            self.sql_seconds[key] = self.sql_seconds.get(key, 0.0) + stats.sql_seconds
+            status_key = (method, route, str(status))
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+
+    def observe_slow_query(self, route: str | None, statement: str, seconds: float) -> None:
+        with self._lock:
+            self.slow_queries_total += 1
+            key = (route or "", " ".join(statement.split())[:500])
+            self.slow_queries[key] = seconds
+            self.slow_queries.move_to_end(key)
+            while len(self.slow_queries) > self.slow_query_log_size:
+                self.slow_queries.popitem(last=False)
+
+
+registry = MetricsRegistry()
+
+
+# --------------------------------------------------------------------------
+# SQL instrumentation
+# --------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+
+    if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        route = _route_template(stats.scope) if stats is not None else None
+        registry.observe_slow_query(route, statement, elapsed)
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s",
+            elapsed * 1000,
+            route or "<no request>",
+            " ".join(statement.split()),
+        )
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Attach the cursor-execute timers to an engine (idempotent).
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --------------------------------------------------------------------------
+# ASGI middleware
+# --------------------------------------------------------------------------
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    # unmatched paths are collapsed so 404 scans can't blow up label cardinality
+    return path or "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (so it also works around streaming responses).
+
+    The Server-Timing header is added when the response starts, which for
+    regular JSON endpoints is after the handler and all of its SQL finished.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                app_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f"app;dur={app_ms:.1f}, "
+                    f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.sql_count} queries"'
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            registry.observe_request(
+                scope.get("method", ""),
+                _route_template(scope),
+                status_holder["status"],
+                time.perf_counter() - started,
+                stats,
+            )
+
+
+# --------------------------------------------------------------------------
+# Prometheus exposition
+# --------------------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", " ").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+
+
+def _histogram_lines(name: str, series: dict, out: list[str]) -> None:
+    for (method, route), hist in sorted(series.items()):
+        base = _labels(method=method, route=route)
+        for upper, count in zip(hist.buckets, hist.counts):
+            out.append(f'{name}_bucket{{{base},le="{upper}"}} {count}')
+        out.append(f'{name}_bucket{{{base},le="+Inf"}} {hist.total}')
+        out.append(f"{name}_sum{{{base}}} {hist.sum}")
+        out.append(f"{name}_count{{{base}}} {hist.total}")
+
+
+def render_prometheus() -> str:
+    out: list[str] = []
+    with registry._lock:
+        out.append("# HELP http_request_duration_seconds Request latency by route.")
+        out.append("# TYPE http_request_duration_seconds histogram")
+        _histogram_lines("http_request_duration_seconds", registry.latency, out)
+
+        out.append("# HELP http_requests_total Responses by route and status code.")
+        out.append("# TYPE http_requests_total counter")
+        for (method, route, status), count in sorted(registry.responses.items()):
+            out.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+        out.append("# HELP http_request_sql_queries SQL statements executed per request.")
+        out.append("# TYPE http_request_sql_queries histogram")
+        _histogram_lines("http_request_sql_queries", registry.sql_count, out)
+
+        out.append("# HELP http_request_sql_seconds_total Time spent in SQL by route.")
+        out.append("# TYPE http_request_sql_seconds_total counter")
+        for (method, route), seconds in sorted(registry.sql_seconds.items()):
+            out.append(f"http_request_sql_seconds_total{{{_labels(method=method, route=route)}}} {seconds}")
+
+        out.append(f"# HELP db_slow_queries_total Statements slower than {settings.SLOW_QUERY_MS} ms.")
+        out.append("# TYPE db_slow_queries_total counter")
+        out.append(f"db_slow_queries_total {registry.slow_queries_total}")
+
+        out.append("# HELP db_slow_query_seconds Most recent slow statements (last duration).")
+        out.append("# TYPE db_slow_query_seconds gauge")
+        for (route, statement), seconds in registry.slow_queries.items():
+            out.append(f"db_slow_query_seconds{{{_labels(route=route, statement=statement)}}} {seconds}")
+
+    return "\n".join(out) + "\n"
@@ -0,0 +1,462 @@
+"""
+Financial-year partitioning / archiving of the orders table.
+
+PostgreSQL: `orders` becomes a declaratively partitioned table,
+PARTITION BY RANGE (delivery_date), one partition per financial year
+(1 April -> 1 April) plus a DEFAULT partition for NULL or out-of-range
+dates. The analytics endpoints filter on a delivery_date FY range, so they
+prune to a single partition; natural-key lookups during ingest carry
+delivery_date too. The financial_year filter of /orders/search and
+/orders/summary is not the partition key (financial_year follows the order
+date first), so financial_year_filter() adds the delivery_date span that
+year's rows actually have, which prunes to the partitions holding them. A partitioned table can't have a primary key that leaves
+out delivery_date (which is nullable), so each partition carries its own
+PRIMARY KEY (id); ids still come from the one orders_id_seq sequence.
+
+Old years are taken out of the hot table with DETACH PARTITION: the table
+stays in the database under the same name (pg_dump it and drop it, or leave
+it) and `restore` attaches it again, after adding any columns orders gained
+while it was detached.
+
+SQLite has no partitioning, so old years are moved into a separate archive
+database (ORDERS_ARCHIVE_PATH) instead, and back again on `restore`. The
+archive file holds no indexes and can be compressed/shipped off the box.
+
+Archived rows leave tombstones, so /orders/changes clients drop them too;
+restored rows get a fresh change_seq, and dimension keys if they predate them.
+
+    python -m app.db.partitioning status
+    python -m app.db.partitioning partition          # PostgreSQL only
+    python -m app.db.partitioning archive --keep-years 3
+    python -m app.db.partitioning archive 2021-2022
+    python -m app.db.partitioning restore 2021-2022
+"""
+
+import argparse
+import logging
+from datetime import date
+
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+from app.core.events import record_bulk_change
+from app.db.schema import add_missing_columns
+from app.db.session import SessionLocal
+from app.models.order import Order
+from app.services.change_feed import next_change_seq
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = "orders_default"
+
+
+def financial_year_of(value: date) -> str:
+    year = value.year if value.month >= 4 else value.year - 1
+    return f"{year}-{year + 1}"
+
+
+def financial_year_range(fy: str) -> tuple[date, date]:
+    """
+    '2024-2025' -> (2024-04-01, 2025-04-01), end exclusive. Raises ValueError.
+    """
+    start_str, _, end_str = fy.partition("-")
+    start_year, end_year = int(start_str), int(end_str)
+    if end_year != start_year + 1:
+        raise ValueError(f"Invalid financial year {fy!r}, use 'YYYY-YYYY'")
+    return date(start_year, 4, 1), date(end_year, 4, 1)
+
+
+def financial_year_filter(db, fy: str):
+    """
+    Order.financial_year == fy, narrowed to the delivery_date span of that
+    year's rows (found with two probes of ix_orders_financial_year_delivery)
+    so a table partitioned on delivery_date only scans the partitions that
+    can hold them. NULL delivery dates live in the DEFAULT partition.
+    """
+    low, high = db.execute(
+        select(func.min(Order.delivery_date), func.max(Order.delivery_date)).where(Order.financial_year == fy)
+    ).one()
+    if low is None:
+        return and_(Order.financial_year == fy, Order.delivery_date.is_(None))
+    return and_(
+        Order.financial_year == fy,
+        or_(Order.delivery_date.between(low, high), Order.delivery_date.is_(None)),
+    )
+
+
+def partition_name(fy: str) -> str:
+    start, end = financial_year_range(fy)
+    return f"orders_fy{start.year}_{end.year}"
+
+
+def _fy_filter(fy: str) -> tuple[str, dict]:
+    start, end = financial_year_range(fy)
+    return "delivery_date >= :start AND delivery_date < :end", {"start": start, "end": end}
+
+
+def _is_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if not _is_postgres(conn):
+        return False
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('orders')")
+    ).scalar()
+    return relkind == "p"
+
+
+def _table_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def _attached_partitions(conn: Connection) -> set[str]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'orders'::regclass"
+        )
+    )
+    return {name for (name,) in rows}
+
+
+def _financial_years_with_data(conn: Connection) -> list[str]:
+    low, high = conn.execute(select(func.min(Order.delivery_date), func.max(Order.delivery_date))).one()
+    if low is None:
+        return []
+    first = int(financial_year_of(low)[:4])
+    last = int(financial_year_of(high)[:4])
+    return [f"{year}-{year + 1}" for year in range(first, last + 1)]
+
+
+def _hot_financial_years(today: date | None = None) -> list[str]:
+    # the current FY and the next one, so rows never pile up in the default
+    year = int(financial_year_of(today or date.today())[:4])
+    return [f"{year}-{year + 1}", f"{year + 1}-{year + 2}"]
+
+
+def _notice_scope(conn: Connection, table: str, where: str, params: dict) -> tuple[set, set]:
+    rows = conn.execute(
+        text(f"SELECT DISTINCT source_type, financial_year FROM {table} WHERE {where}"), params
+    ).all()
+    return {r.source_type for r in rows}, {r.financial_year for r in rows}
+
+
+# --------------------------------------------------------------------------
+# PostgreSQL
+# --------------------------------------------------------------------------
+
+def _attach_partition(conn: Connection, fy: str) -> None:
+    """
+    Attach (creating if needed) the partition for `fy`. Rows of that year
+    sitting in the default partition are moved into it first, otherwise
+    ATTACH would fail on them.
+    """
+    name = partition_name(fy)
+    start, end = financial_year_range(fy)
+    where, params = _fy_filter(fy)
+
+    if not _table_exists(conn, name):
+        conn.exec_driver_sql(f"CREATE TABLE {name} (LIKE orders INCLUDING DEFAULTS INCLUDING STORAGE)")
+        conn.exec_driver_sql(f"ALTER TABLE {name} ADD PRIMARY KEY (id)")
+
+    if _table_exists(conn, DEFAULT_PARTITION):
+        conn.execute(text(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {where}"), params)
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {where}"), params)
+
+    conn.exec_driver_sql(
+        f"ALTER TABLE orders ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def convert_to_partitioned(conn: Connection) -> None:
+    """
+    Rebuild a plain orders table as a partitioned one (copies every row;
+    takes an exclusive lock for the duration).
+    """
+    years = sorted(set(_financial_years_with_data(conn)) | set(_hot_financial_years()))
+    logger.info("Partitioning orders into %d financial years", len(years))
+
+    conn.exec_driver_sql("LOCK TABLE orders IN ACCESS EXCLUSIVE MODE")
+    conn.exec_driver_sql(
+        "CREATE TABLE orders_partitioned (LIKE orders INCLUDING DEFAULTS INCLUDING STORAGE) "
+        "PARTITION BY RANGE (delivery_date)"
+    )
+    for fy in years:
+        start, end = financial_year_range(fy)
+        conn.exec_driver_sql(
+            f"CREATE TABLE {partition_name(fy)} PARTITION OF orders_partitioned "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    conn.exec_driver_sql(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF orders_partitioned DEFAULT")
+    conn.exec_driver_sql("INSERT INTO orders_partitioned SELECT * FROM orders")
+
+    # keep the id sequence alive across the DROP
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('orders', 'id')")).scalar()
+    if sequence:
+        conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    conn.exec_driver_sql("DROP TABLE orders")
+    conn.exec_driver_sql("ALTER TABLE orders_partitioned RENAME TO orders")
+    if sequence:
+        conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY orders.id")
+
+    for name in _attached_partitions(conn):
+        conn.exec_driver_sql(f"ALTER TABLE {name} ADD PRIMARY KEY (id)")
+    # indexes on the parent cascade to every partition, present and future
+    for index in Order.__table__.indexes:
+        index.create(conn)
+
+
+def ensure_partitions(engine: Engine, today: date | None = None) -> None:
+    """
+    Make sure the current and next financial years have their own partition.
+    No-op unless orders is already partitioned. Called on startup.
+    """
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+        attached = _attached_partitions(conn)
+        for fy in _hot_financial_years(today):
+            if partition_name(fy) not in attached:
+                logger.info("Creating orders partition for %s", fy)
+                _attach_partition(conn, fy)
+
+
+def _detach_year_postgres(db, conn: Connection, fy: str) -> int:
+    name = partition_name(fy)
+    if name not in _attached_partitions(conn):
+        return 0
+    source_types, financial_years = _notice_scope(conn, name, "TRUE", {})
+    seq = next_change_seq(db)
+    moved = conn.execute(
+        text(
+            "INSERT INTO order_tombstones (order_id, plant_id, change_seq) "
+            f"SELECT id, plant_id, :seq FROM {name}"
+        ),
+        {"seq": seq},
+    ).rowcount
+    conn.exec_driver_sql(f"ALTER TABLE orders DETACH PARTITION {name}")
+    record_bulk_change(db, moved, source_types, financial_years)
+    return moved
+
+
+def _restore_year_postgres(db, conn: Connection, fy: str) -> int:
+    name = partition_name(fy)
+    if name in _attached_partitions(conn):
+        return 0
+    if not _table_exists(conn, name):
+        raise ValueError(f"No detached partition {name}")
+    # ATTACH needs the partition's columns to match orders exactly
+    add_missing_columns(conn, Order.__table__, name)
+    _attach_partition(conn, fy)
+    seq = next_change_seq(db)
+    restored = conn.execute(text(f"UPDATE {name} SET change_seq = :seq"), {"seq": seq}).rowcount
+    source_types, financial_years = _notice_scope(conn, name, "TRUE", {})
+    record_bulk_change(db, restored, source_types, financial_years)
+    return restored
+
+
+# --------------------------------------------------------------------------
+# SQLite archive database
+# --------------------------------------------------------------------------
+
+def _sync_archive_table(conn: Connection) -> list[str]:
+    """
+    Create archive.orders if missing and add columns added to orders since.
+    Returns the column list to copy.
+    """
+    conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS archive.orders AS SELECT * FROM main.orders WHERE 0")
+    archived = {row[1] for row in conn.exec_driver_sql("PRAGMA archive.table_info(orders)")}
+    columns = [column.name for column in Order.__table__.columns]
+    for name in columns:
+        if name not in archived:
+            conn.exec_driver_sql(f"ALTER TABLE archive.orders ADD COLUMN {name}")
+    return columns
+
+
+def _archive_year_sqlite(db, conn: Connection, fy: str) -> int:
+    columns = ", ".join(_sync_archive_table(conn))
+    where, params = _fy_filter(fy)
+    source_types, financial_years = _notice_scope(conn, "main.orders", where, params)
+    if not source_types:
+        return 0
+
+    conn.execute(
+        text(f"INSERT INTO archive.orders ({columns}) SELECT {columns} FROM main.orders WHERE {where}"),
+        params,
+    )
+    seq = next_change_seq(db)
+    conn.execute(
+        text(
+            "INSERT INTO order_tombstones (order_id, plant_id, change_seq) "
+            f"SELECT id, plant_id, :seq FROM main.orders WHERE {where}"
+        ),
+        {**params, "seq": seq},
+    )
+    moved = conn.execute(text(f"DELETE FROM main.orders WHERE {where}"), params).rowcount
+    record_bulk_change(db, moved, source_types, financial_years)
+    return moved
+
+
+def _restore_year_sqlite(db, conn: Connection, fy: str) -> int:
+    columns = ", ".join(_sync_archive_table(conn))
+    where, params = _fy_filter(fy)
+    seq = next_change_seq(db)
+
+    # SQLite may have handed an archived id to a newer row; those stay archived
+    conn.exec_driver_sql("DROP TABLE IF EXISTS temp.restored_ids")
+    conn.execute(
+        text(
+            "CREATE TEMP TABLE restored_ids AS SELECT id FROM archive.orders "
+            f"WHERE {where} AND id NOT IN (SELECT id FROM main.orders)"
+        ),
+        params,
+    )
+    restored_filter = "id IN (SELECT id FROM temp.restored_ids)"
+    restored = conn.exec_driver_sql(
+        f"INSERT INTO main.orders ({columns}) SELECT {columns} FROM archive.orders WHERE {restored_filter}"
+    ).rowcount
+    conn.execute(text(f"UPDATE main.orders SET change_seq = :seq WHERE {restored_filter}"), {"seq": seq})
+    conn.exec_driver_sql(f"DELETE FROM archive.orders WHERE {restored_filter}")
+    source_types, financial_years = _notice_scope(conn, "main.orders", restored_filter, {})
+    conn.exec_driver_sql("DROP TABLE temp.restored_ids")
+    record_bulk_change(db, restored, source_types, financial_years)
+    return restored
+
+
+# --------------------------------------------------------------------------
+# Entry points
+# --------------------------------------------------------------------------
+
+def _move_years(engine: Engine, years: list[str], postgres_step, sqlite_step, archive_path: str | None) -> dict:
+    moved = {}
+    with engine.connect() as conn:
+        if not _is_postgres(conn):
+            conn.exec_driver_sql("ATTACH DATABASE ? AS archive", (archive_path or settings.ORDERS_ARCHIVE_PATH,))
+            conn.commit()
+        try:
+            db = SessionLocal(bind=conn)
+            # the session owns the transaction; raw statements below join it
+            db.connection()
+            try:
+                for fy in years:
+                    step = postgres_step if _is_postgres(conn) else sqlite_step
+                    moved[fy] = step(db, conn, fy)
+                # one commit: one ingest notice, one consistent change_seq range
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        finally:
+            if not _is_postgres(conn):
+                conn.exec_driver_sql("DETACH DATABASE archive")
+                conn.commit()
+    return moved
+
+
+def archive_years(engine: Engine, years: list[str], archive_path: str | None = None) -> dict:
+    """
+    Take whole financial years (by delivery_date) out of the orders table.
+    Returns {fy: rows}.
+    """
+    return _move_years(engine, years, _detach_year_postgres, _archive_year_sqlite, archive_path)
+
+
+def restore_years(engine: Engine, years: list[str], archive_path: str | None = None) -> dict:
+    """
+    Bring archived financial years back into orders. Returns {fy: rows}.
+    """
+    restored = _move_years(engine, years, _restore_year_postgres, _restore_year_sqlite, archive_path)
+    if any(restored.values()):
+        # rows archived before the dimension tables existed come back unkeyed
+        from app.services.dimensions import backfill_dimension_keys
+
+        backfill_dimension_keys(engine)
+    return restored
+
+
+def cold_financial_years(engine: Engine, keep_years: int, today: date | None = None) -> list[str]:
+    """
+    Financial years with data that are older than the last `keep_years`
+    (the current FY counts as one).
+    """
+    current = int(financial_year_of(today or date.today())[:4])
+    with engine.connect() as conn:
+        years = _financial_years_with_data(conn)
+    return [fy for fy in years if int(fy[:4]) <= current - keep_years]
+
+
+def partition_status(engine: Engine) -> list[dict]:
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            return [
+                {"table": name, "rows": conn.exec_driver_sql(f"SELECT COUNT(*) FROM {name}").scalar()}
+                for name in sorted(_attached_partitions(conn))
+            ]
+        rows = conn.execute(
+            select(Order.delivery_date, func.count())
+            .where(Order.delivery_date.is_not(None))
+            .group_by(Order.delivery_date)
+        )
+        counts: dict[str, int] = {}
+        for value, n in rows:
+            fy = financial_year_of(value)
+            counts[fy] = counts.get(fy, 0) + n
+        return [{"financial_year": fy, "rows": n} for fy, n in sorted(counts.items())]
+
+
+def main() -> None:
+    from app.db.schema import ensure_schema
+    from app.db.session import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="rows per partition (PostgreSQL) or per financial year")
+    sub.add_parser("partition", help="convert orders to a partitioned table (PostgreSQL)")
+    for command in ("archive", "restore"):
+        p = sub.add_parser(command)
+        p.add_argument("financial_years", nargs="*", metavar="YYYY-YYYY")
+        p.add_argument("--archive-path", help="SQLite archive database (default ORDERS_ARCHIVE_PATH)")
+        if command == "archive":
+            p.add_argument("--keep-years", type=int, help="archive everything older than the last N FYs")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for entry in partition_status(engine):
+            print(entry)
+        return
+
+    if args.command == "partition":
+        if engine.dialect.name != "postgresql":
+            parser.error("declarative partitioning needs PostgreSQL; on SQLite use `archive`")
+        ensure_schema(engine)
+        with engine.begin() as conn:
+            if is_partitioned(conn):
+                print("orders is already partitioned")
+            else:
+                convert_to_partitioned(conn)
+        return
+
+    years = list(args.financial_years)
+    if getattr(args, "keep_years", None):
+        years += [fy for fy in cold_financial_years(engine, args.keep_years) if fy not in years]
+    if not years:
+        parser.error("give financial years or --keep-years")
+    for fy in years:
+        financial_year_range(fy)
+
+    step = archive_years if args.command == "archive" else restore_years
+    for fy, rows in step(engine, years, args.archive_path).items():
+        print(f"{args.command} {fy}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
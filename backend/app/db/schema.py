@@ -0,0 +1,116 @@
+"""
+Startup schema sync.
+
+The project has no migration history, so tables are created with
+create_all. create_all never alters existing tables, which would leave
+deployed databases without columns/indexes added later; ensure_schema adds
+those (new columns must be nullable or carry a server default) and fills
+columns derived from existing data. Fills that scan the orders table run
+once per database: a row in sync_counters records that they are done.
+"""
+
+import logging
+
+from typing import Callable
+
+from sqlalchemy import Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+from app.core.config import settings
+from app.db.session import Base
+
+logger = logging.getLogger(__name__)
+
+
+def register_models() -> None:
+    # importing the modules registers their tables on Base.metadata
+    import app.models.dimension  # noqa: F401
+    import app.models.ingest_event  # noqa: F401
+    import app.models.order  # noqa: F401
+    import app.models.plant  # noqa: F401
+    import app.models.quarantine  # noqa: F401
+    import app.models.sync  # noqa: F401
+    import app.models.user  # noqa: F401
+
+
+def ensure_schema(engine: Engine) -> None:
+    register_models()
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            add_missing_columns(conn, table)
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    logger.info("Creating index %s", index.name)
+                    index.create(conn)
+
+    ensure_plants(engine)
+
+    # key orders that predate the dimension tables
+    from app.services.dimensions import backfill_dimension_keys
+
+    run_once(engine, "backfill:dimension_keys", backfill_dimension_keys)
+
+    if engine.dialect.name == "postgresql":
+        from app.db.partitioning import ensure_partitions
+
+        ensure_partitions(engine)
+
+
+def add_missing_columns(conn: Connection, table: Table, name: str | None = None) -> None:
+    """
+    Add the columns of `table` that the database table `name` (default
+    table.name) lacks - e.g. a detached orders partition that predates them.
+    """
+    name = name or table.name
+    existing_columns = {c["name"] for c in inspect(conn).get_columns(name)}
+    for column in table.columns:
+        if column.name in existing_columns or column.primary_key:
+            continue
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        logger.info("Adding column %s.%s", name, column.name)
+        conn.exec_driver_sql(f"ALTER TABLE {name} ADD COLUMN {ddl}")
+
+
+def ensure_plants(engine: Engine) -> None:
+    """
+    Rows that predate plants default to MAIN_PLANT_ID, and ingests without
+    an explicit plant go to DEFAULT_PLANT_ID; both must exist.
+    """
+    from app.models.plant import MAIN_PLANT_ID, Plant
+
+    with engine.begin() as conn:
+        existing = set(conn.execute(select(Plant.id)).scalars())
+        for plant_id in sorted({MAIN_PLANT_ID, settings.DEFAULT_PLANT_ID} - existing):
+            code = "MAIN" if plant_id == MAIN_PLANT_ID else f"PLANT{plant_id}"
+            logger.info("Creating plant %s (%s)", plant_id, code)
+            conn.execute(Plant.__table__.insert().values(id=plant_id, code=code))
+
+
+def run_once(engine: Engine, marker: str, step: Callable[[Engine], None]) -> None:
+    """
+    Run a one-off data step unless sync_counters already holds `marker`,
+    then record it. Steps must be idempotent: workers starting together
+    may both run one before either records it.
+    """
+    from app.models.sync import SyncCounter
+
+    with engine.connect() as conn:
+        done = conn.execute(select(SyncCounter.name).where(SyncCounter.name == marker)).first()
+    if done is not None:
+        return
+
+    step(engine)
+    try:
+        with engine.begin() as conn:
+            conn.execute(SyncCounter.__table__.insert().values(name=marker, value=1))
+    except IntegrityError:
+        # another worker finished it first
+        pass
+    logger.info("Ran one-off step %s", marker)
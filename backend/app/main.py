@@ -1,23 +1,24 @@
-from app.api.v1.auth import router as auth_router
-from app.api.v1.analytics import router as analytics_router
-from app.api.v1.ingestion import router as ingestion_router
-from app.api.v1.orders import router as orders_router
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi import HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import func
-from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.api.v1.debug import router as debug_router
-
 
+from app.api.v1.analytics import router as analytics_router
+from app.api.v1.auth import router as auth_router
+from app.api.v1.debug import router as debug_router
+from app.api.v1.events import router as events_router
+from app.api.v1.metrics import router as metrics_router
+from app.api.v1.orders import router as orders_router
+from app.api.v1.plants import router as plants_router
+from app.core.compression import CompressionMiddleware, ETagMiddleware
 from app.core.config import settings
-from app.db.session import Base, engine
+from app.core.metrics import MetricsMiddleware, instrument_engine
+from app.db.schema import ensure_schema
+from app.db.session import engine
 from app.db.deps import get_db
 from app.models.order import Order
-from app.api.v1.ingestion import router as ingestion_router
+from app.services.suggest import suggest_index
 
 
 def create_app() -> FastAPI:
@@ -32,23 +33,55 @@ def create_app() -> FastAPI:
     "https://factorydashboard.netlify.app/",  
     ]
 
+    # added first = innermost: the ETag is taken from the uncompressed body
+    if settings.ETAGS_ENABLED:
+        prefixes = tuple(p.strip() for p in settings.ETAG_PATH_PREFIXES.split(",") if p.strip())
+        app.add_middleware(ETagMiddleware, path_prefixes=prefixes)
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[
+            "Server-Timing", "ETag",
+            # ?approximate=true analytics breakdowns
+            "X-Approximate", "X-Approximate-Confidence", "X-Sample-Rows", "X-Population-Rows",
+            "X-Sample-Refreshed-At", "X-Distinct-Parts", "X-Distinct-Customers",
+        ],
     )
 
+    if settings.METRICS_ENABLED:
+        instrument_engine(engine)
+        app.add_middleware(MetricsMiddleware)
+
+    if settings.CREATE_TABLES_ON_STARTUP:
+        @app.on_event("startup")
+        def on_startup():
+            ensure_schema(engine)
+
     @app.on_event("startup")
-    def on_startup():
-        Base.metadata.create_all(bind=engine)
+    def start_suggest_index():
+        # built in the background; /orders/suggest has no answers until then
+        suggest_index.start()
+
+    if settings.INGESTION_ENABLED:
+        # the router itself is light; pandas & co. load on the first ingest
+        from app.api.v1.ingestion import router as ingestion_router
+
+        app.include_router(ingestion_router)
 
-    app.include_router(ingestion_router)
     app.include_router(orders_router)
     app.include_router(analytics_router)
     app.include_router(auth_router)
+    app.include_router(plants_router)
     app.include_router(debug_router)
+    app.include_router(events_router)
+    if settings.METRICS_ENABLED:
+        app.include_router(metrics_router)
 
 
 
@@ -67,9 +100,12 @@ def create_app() -> FastAPI:
 
     @app.get("/debug/orders/summary")
     def orders_summary(db: Session = Depends(get_db)):
-        total = db.query(func.count(Order.id)).scalar()
-        pending = db.query(func.count(Order.id)).filter(Order.status == "PENDING").scalar()
-        dispatched = db.query(func.count(Order.id)).filter(Order.status == "DISPATCHED").scalar()
+        # one round trip: FILTER-clause aggregates instead of three COUNTs
+        total, pending, dispatched = db.query(
+            func.count(Order.id),
+            func.count(Order.id).filter(Order.status == "PENDING"),
+            func.count(Order.id).filter(Order.status == "DISPATCHED"),
+        ).one()
 
         return {
             "total_orders": total,
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String
+
+from app.db.session import Base
+
+
+class DimensionMixin:
+    """
+    One row per distinct spelling-insensitive value. `key` is the lookup
+    form (see app.services.dimensions.dimension_key); `name` is the
+    canonical spelling shown in reports (the first one seen).
+    """
+    id = Column(Integer, primary_key=True)
+    key = Column(String, unique=True, nullable=False)
+    name = Column(String, nullable=False)
+
+
+class Customer(DimensionMixin, Base):
+    __tablename__ = "customers"
+
+
+class Part(DimensionMixin, Base):
+    __tablename__ = "parts"
+
+
+class Department(DimensionMixin, Base):
+    __tablename__ = "departments"
+
+
+class Transporter(DimensionMixin, Base):
+    __tablename__ = "transporters"
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, Text
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+
+class IngestEvent(Base):
+    """
+    Outbox of ingest notices, used by the "database" event broker so every
+    API process sees ingests committed by other processes.
+    """
+    __tablename__ = "ingest_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, server_default=func.now(), index=True)
+    payload = Column(Text, nullable=False)  # JSON notice
@@ -5,10 +5,14 @@ from sqlalchemy import (
     Date,
     DateTime,
     Float,
+    ForeignKey,
+    Index,
 )
 from sqlalchemy.sql import func
 
+import app.models.dimension  # noqa: F401  (tables referenced by the *_id keys below)
 from app.db.session import Base
+from app.models.plant import MAIN_PLANT_ID
 
 
 class Order(Base):
@@ -16,9 +20,18 @@ class Order(Base):
 
     id = Column(Integer, primary_key=True, index=True)
 
+    # Owning plant; part of the natural key and of every query scope
+    plant_id = Column(
+        Integer,
+        ForeignKey("plants.id"),
+        nullable=False,
+        default=MAIN_PLANT_ID,
+        server_default=str(MAIN_PLANT_ID),
+    )
+
     # Source and status
     source_type = Column(String, index=True, nullable=False)  # "OUTSTANDING" or "DELIVERY"
-    status = Column(String, index=True, nullable=True)        # "PENDING" or "DISPATCHED"
+    status = Column(String, index=True, nullable=True)        # "PENDING", "DISPATCHED" or "CLOSED"
 
     # Common identifiers
     so_number = Column(String, index=True, nullable=True)     # S/O No
@@ -101,6 +114,13 @@ class Order(Base):
     # Descriptions
     item_description = Column(String, nullable=True)          # Item Description / Description
 
+    # Dimension keys, resolved from the strings above at ingest
+    # (app.services.dimensions); analytics groups on these.
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True, nullable=True)
+    part_id = Column(Integer, ForeignKey("parts.id"), index=True, nullable=True)
+    department_id = Column(Integer, ForeignKey("departments.id"), index=True, nullable=True)
+    transporter_id = Column(Integer, ForeignKey("transporters.id"), index=True, nullable=True)
+
     # Calculated / meta
     financial_year = Column(String, index=True, nullable=True) # e.g. "2024-2025"
 
@@ -109,3 +129,25 @@ class Order(Base):
         server_default=func.now(),
         onupdate=func.now(),
     )
+
+    # Bumped on every insert/update (see app.services.change_feed); drives
+    # /orders/changes. Rows that predate it start at 0.
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Composite indexes lead with plant_id so plant-scoped queries never
+        # scan other plants' rows.
+        # natural-key lookups during ingest
+        Index("ix_orders_plant_natural_key", "plant_id", "source_type", "so_number", "order_no"),
+        # /orders/open and /orders/summary
+        Index("ix_orders_plant_status_delivery", "plant_id", "status", "delivery_date"),
+        # analytics: DELIVERY rows in a delivery_date range
+        Index("ix_orders_plant_source_delivery", "plant_id", "source_type", "delivery_date"),
+        # delivery_date span of a financial_year, for partition pruning on FY
+        # filters (all plants: their span still bounds any one plant's rows)
+        Index("ix_orders_financial_year_delivery", "financial_year", "delivery_date"),
+        # plant-scoped delta sync pages through (change_seq, id)
+        Index("ix_orders_plant_change_seq_id", "plant_id", "change_seq", "id"),
+        # the unscoped (all plants) delta sync
+        Index("ix_orders_change_seq_id", "change_seq", "id"),
+    )
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String
+
+from app.db.session import Base
+
+# Orders and users that predate plants belong to this plant (created by
+# ensure_schema).
+MAIN_PLANT_ID = 1
+
+
+class Plant(Base):
+    __tablename__ = "plants"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True, nullable=False)  # e.g. "PUNE"
+    name = Column(String, nullable=True)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+
+class QuarantinedRow(Base):
+    """
+    Report rows rejected by ingest validation, kept with their reasons so
+    they can be fixed at the source and sent again. Re-ingesting a file
+    replaces that file's quarantined rows.
+    """
+    __tablename__ = "quarantined_rows"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    plant_id = Column(Integer, ForeignKey("plants.id"), nullable=False)
+    source_type = Column(String, nullable=False)  # "OUTSTANDING" or "DELIVERY"
+    source_file = Column(String, nullable=True)   # base name of the report file
+    row_number = Column(Integer, nullable=False)  # line in the report, header = 1
+
+    reasons = Column(Text, nullable=False)  # JSON list of messages
+    payload = Column(Text, nullable=False)  # JSON {report column: raw value}
+
+    __table_args__ = (
+        Index("ix_quarantined_rows_plant_source", "plant_id", "source_type", "source_file"),
+    )
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+
+class SyncCounter(Base):
+    """
+    Named monotonically increasing counters. "orders" hands out the
+    change_seq stamped on every inserted/updated/deleted Order; writers bump
+    it inside their own transaction, so commit order follows sequence order.
+    Rows named "backfill:<step>" mark one-off schema steps as done (see
+    app.db.schema.run_once).
+    """
+    __tablename__ = "sync_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class OrderTombstone(Base):
+    """
+    Deleted orders, so delta-sync clients can drop them from their cache.
+    """
+    __tablename__ = "order_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, nullable=False)
+    # plant of the deleted order, so /orders/changes can scope deletes too
+    plant_id = Column(Integer, index=True)
+    change_seq = Column(Integer, index=True, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,5 +1,6 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
 
+import app.models.plant  # noqa: F401  (table referenced by plant_id)
 from app.db.session import Base
 
 
@@ -12,3 +13,6 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     role = Column(String, default="user")  # future: admin/user
+    # orders/analytics are scoped to it; None: every plant for admins,
+    # DEFAULT_PLANT_ID for everyone else (see app.core.deps.user_plant_id)
+    plant_id = Column(Integer, ForeignKey("plants.id"), nullable=True)
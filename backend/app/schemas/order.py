@@ -1,11 +1,13 @@
 from datetime import date, datetime
-from pydantic import BaseModel
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
 
 
 class OrderSummary(BaseModel):
     id: int
     source_type: str      # OUTSTANDING / DELIVERY
-    status: str | None    # PENDING / DISPATCHED
+    status: str | None    # PENDING / DISPATCHED / CLOSED
 
     so_number: str | None = None
     order_no: str | None = None
@@ -30,3 +32,34 @@ class OrderSummary(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class OrderChanges(BaseModel):
+    changes: List[OrderSummary]
+    deleted: List[int]          # ids of orders removed since the token
+    next_token: str             # pass back as ?since= on the next sync
+    has_more: bool              # true: call again right away with next_token
+
+
+class Suggestion(BaseModel):
+    value: str
+    count: int              # orders carrying this value
+
+
+class OrderLookup(BaseModel):
+    # exact values, e.g. pasted from a spreadsheet column
+    order_no: List[str] = []
+    so_number: List[str] = []
+    po_serial: List[str] = []
+    part_number: List[str] = []   # case/whitespace-insensitive
+
+    status: str | None = None         # PENDING / DISPATCHED / CLOSED
+    source_type: str | None = None    # OUTSTANDING / DELIVERY
+    limit_per_key: int = Field(100, ge=1, le=1000)
+
+
+class OrderLookupResult(BaseModel):
+    # field -> input value -> matching orders, newest first
+    results: Dict[str, Dict[str, List[OrderSummary]]]
+    not_found: Dict[str, List[str]]   # field -> input values without orders
+    truncated: Dict[str, List[str]]   # field -> values with more than limit_per_key orders
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+
+
+class PlantCreate(BaseModel):
+    code: str
+    name: str | None = None
+
+
+class PlantOut(BaseModel):
+    id: int
+    code: str
+    name: str | None = None
+
+    class Config:
+        orm_mode = True
+
+
+class UserPlant(BaseModel):
+    plant_id: int | None = None   # None: the user sees every plant
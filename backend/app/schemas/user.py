@@ -17,6 +17,7 @@ class UserOut(BaseModel):
     email: EmailStr
     full_name: str | None = None
     role: str
+    plant_id: int | None = None   # None: all plants (admins only)
 
     class Config:
         orm_mode = True
@@ -0,0 +1,597 @@
+"""
+Approximate sales analytics behind /analytics/*?approximate=true.
+
+DELIVERY rows are stratified by plant and financial year (of the delivery
+date, the same window the exact queries filter on). Each stratum keeps its
+exact row count, a uniform reservoir of at most ANALYTICS_SAMPLE_SIZE rows
+(amount, quantity, customer, part) and HyperLogLog sketches of its customer
+and part ids. A question about any FY range and plant then only touches the
+matching strata: totals are the scaled sample sums, with a normal-theory
+error bound (finite population correction included), and distinct counts
+come from the merged sketches. The cost depends on the sample size, not on
+how many years of deliveries there are.
+
+A stratum no larger than the reservoir is held whole, so its figures are
+exact (error bound 0). Parts or customers that didn't make it into any
+sample are missing from the approximate breakdowns; the exact endpoints
+remain the reference for finance sign-off.
+
+The sample is maintained rather than rebuilt. A background thread, started
+by the first approximate request, follows the "orders" change sequence (it
+wakes on local ingest notices and polls the counter every
+CHANGE_CHECK_SECONDS otherwise, so ingests by other processes count too,
+whatever EVENT_BROKER is) and applies only the rows stamped since its last
+look. Which stratum every counted order belongs to is kept in flat arrays
+indexed by order id, so membership never depends on id order: a row that
+becomes a delivery (or is restored from the archive) joins its stratum, one
+that moves to another plant / FY or stops being a delivery changes strata
+or leaves, and a tombstone takes its row out. Deletes keep the reservoir
+uniform by random pairing (the next inserts into that stratum fill the
+freed slots with the right probability). Only sketches can't forget a
+value, so the whole sample is rebuilt every ANALYTICS_SAMPLE_REBUILD_HOURS.
+
+Requests never wait on that work: after each refresh the changed strata are
+copied into a new read-only view that replaces the old one in a single
+assignment. Only the very first approximate request waits for the first
+build.
+"""
+
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from array import array
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.events import on_ingest
+from app.db.session import SessionLocal
+from app.models.dimension import Customer, Part
+from app.models.order import Order
+from app.services.change_feed import current_change_seq, deleted_between
+
+logger = logging.getLogger(__name__)
+
+# two-sided 95% normal quantile
+CONFIDENCE = 0.95
+Z_SCORE = 1.96
+# fixed so rebuilding unchanged data gives the same sample (and ETag)
+SAMPLE_SEED = 20240401
+SCAN_BATCH = 10_000
+NAME_CHUNK = 500
+# how often the refresher looks at the change sequence without a notice
+CHANGE_CHECK_SECONDS = 1.0
+# after a failed build / refresh
+RETRY_SECONDS = 30.0
+
+_COLUMNS = (
+    Order.id, Order.plant_id, Order.delivery_date, Order.amount,
+    Order.quantity, Order.customer_id, Order.part_id, Order.source_type,
+)
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch with 2**precision one-byte registers; relative
+    standard error 1.04 / sqrt(2**precision) (1.6% at the default 12).
+    """
+
+    def __init__(self, precision: int = 12) -> None:
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value) -> None:
+        h = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+        rest_bits = 64 - self.precision
+        index = h >> rest_bits
+        rest = h & ((1 << rest_bits) - 1)
+        # position of the leftmost 1 bit in the remaining bits
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def copy(self) -> "HyperLogLog":
+        clone = HyperLogLog(self.precision)
+        clone.registers = bytearray(self.registers)
+        return clone
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # small range: linear counting is far more accurate
+            return m * math.log(m / zeros)
+        return raw
+
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class Stratum:
+    """
+    One (plant, financial year): population size, reservoir and sketches.
+    """
+
+    __slots__ = ("population", "rows", "ids", "customers", "parts", "deleted_in", "deleted_out")
+
+    def __init__(self) -> None:
+        self.population = 0
+        # (amount, quantity, customer_id, part_id), and the order id of each
+        self.rows: list[tuple] = []
+        self.ids: list[int] = []
+        self.customers = HyperLogLog()
+        self.parts = HyperLogLog()
+        # deletes of sampled / unsampled rows not yet paired with an insert
+        self.deleted_in = 0
+        self.deleted_out = 0
+
+    def sketch(self, row: tuple) -> None:
+        if row[2] is not None:
+            self.customers.add(row[2])
+        if row[3] is not None:
+            self.parts.add(row[3])
+
+    def offer(self, order_id: int, row: tuple, capacity: int, rng: random.Random) -> tuple[int | None, int | None]:
+        """
+        Count a new row and maybe keep it. Without pending deletes this is
+        Algorithm R (every row seen so far is kept with equal probability);
+        after deletes, random pairing: the row takes a freed slot with
+        probability deleted_in / (deleted_in + deleted_out). Returns (slot it
+        went to or None, id of the row it evicted or None).
+        """
+        self.population += 1
+        self.sketch(row)
+        pending = self.deleted_in + self.deleted_out
+        if pending:
+            if rng.randrange(pending) >= self.deleted_in:
+                self.deleted_out -= 1
+                return None, None
+            self.deleted_in -= 1
+        elif len(self.rows) >= capacity:
+            slot = rng.randrange(self.population)
+            if slot >= capacity:
+                return None, None
+            evicted = self.ids[slot]
+            self.rows[slot] = row
+            self.ids[slot] = order_id
+            return slot, evicted
+        self.rows.append(row)
+        self.ids.append(order_id)
+        return len(self.rows) - 1, None
+
+    def discard(self, slot: int | None) -> int | None:
+        """
+        Take a member out (slot: where it is sampled, or None). The last
+        sampled row fills the hole; returns its order id if it moved.
+        """
+        self.population -= 1
+        if slot is None:
+            self.deleted_out += 1
+            return None
+        self.deleted_in += 1
+        row, order_id = self.rows.pop(), self.ids.pop()
+        if slot == len(self.rows):
+            return None
+        self.rows[slot] = row
+        self.ids[slot] = order_id
+        return order_id
+
+    def frozen(self) -> "Stratum":
+        """
+        Copy for readers: the rows and sketches as they are now.
+        """
+        clone = Stratum()
+        clone.population = self.population
+        clone.rows = list(self.rows)
+        clone.customers = self.customers.copy()
+        clone.parts = self.parts.copy()
+        return clone
+
+    def scale(self) -> tuple[float, float]:
+        """
+        (N / n, variance factor N^2 (1 - n/N) / n) for a sample total.
+        """
+        n, big_n = len(self.rows), self.population
+        return big_n / n, big_n * big_n * (1 - n / big_n) / n
+
+
+def _fy_start(d: date) -> int:
+    return d.year if d.month >= 4 else d.year - 1
+
+
+def _variance(total: float, total_sq: float, n: int) -> float:
+    """
+    Sample variance from the sum and sum of squares of n values.
+    """
+    if n < 2:
+        return 0.0
+    return max(total_sq - total * total / n, 0.0) / (n - 1)
+
+
+def _bound(variance: float) -> float:
+    return Z_SCORE * math.sqrt(variance)
+
+
+def _names(db, model, ids) -> dict:
+    names = {}
+    ids = sorted(ids)
+    for start in range(0, len(ids), NAME_CHUNK):
+        chunk = ids[start:start + NAME_CHUNK]
+        names.update(db.execute(select(model.id, model.name).where(model.id.in_(chunk))).all())
+    return names
+
+
+class SampleView:
+    """
+    What requests read: frozen strata and the names of the sampled ids.
+    """
+
+    __slots__ = ("strata", "customer_names", "part_names", "refreshed_at")
+
+    def __init__(self, strata: dict, customer_names: dict, part_names: dict, refreshed_at: datetime) -> None:
+        self.strata = strata
+        self.customer_names = customer_names
+        self.part_names = part_names
+        self.refreshed_at = refreshed_at
+
+
+class SampleState:
+    """
+    Strata plus what incremental maintenance needs: where each sampled
+    order sits, which stratum every counted order belongs to (plant 0: not
+    counted) and the change sequence applied so far. Only the refresher
+    thread touches it.
+    """
+
+    def __init__(self, seq: int) -> None:
+        self.seq = seq
+        self.strata: dict[tuple[int, int], Stratum] = {}
+        # order id -> (stratum key, slot) for sampled rows
+        self.slots: dict[int, tuple] = {}
+        # order id -> stratum key of every counted row
+        self.member_plant = array("i")
+        self.member_fy = array("i")
+        self.rng = random.Random(SAMPLE_SEED)
+        # only ever added to, so views can share them
+        self.customer_names: dict = {}
+        self.part_names: dict = {}
+        self.built_at = time.monotonic()
+        self.refreshed_at = datetime.utcnow()
+        # strata changed since the last view
+        self.touched: set = set()
+        self.view: SampleView | None = None
+
+    def _stratum(self, key: tuple) -> Stratum:
+        stratum = self.strata.get(key)
+        if stratum is None:
+            stratum = self.strata[key] = Stratum()
+        return stratum
+
+    def _member(self, order_id: int) -> tuple | None:
+        if order_id < len(self.member_plant) and self.member_plant[order_id]:
+            return self.member_plant[order_id], self.member_fy[order_id]
+        return None
+
+    def _set_member(self, order_id: int, key: tuple | None) -> None:
+        if order_id >= len(self.member_plant):
+            # at least double, so growing to the highest id stays linear
+            grow = max(order_id + 1 - len(self.member_plant), len(self.member_plant))
+            zeros = bytes(self.member_plant.itemsize * grow)
+            self.member_plant.frombytes(zeros)
+            self.member_fy.frombytes(zeros)
+        self.member_plant[order_id], self.member_fy[order_id] = key or (0, 0)
+
+    def add(self, order_id: int, key: tuple, row: tuple) -> None:
+        slot, evicted = self._stratum(key).offer(order_id, row, settings.ANALYTICS_SAMPLE_SIZE, self.rng)
+        if evicted is not None:
+            del self.slots[evicted]
+        if slot is not None:
+            self.slots[order_id] = (key, slot)
+        self._set_member(order_id, key)
+        self.touched.add(key)
+
+    def remove(self, order_id: int, key: tuple) -> None:
+        stratum = self.strata[key]
+        placed = self.slots.pop(order_id, None)
+        moved = stratum.discard(placed[1] if placed else None)
+        if moved is not None:
+            self.slots[moved] = (key, placed[1])
+        if stratum.population == 0:
+            del self.strata[key]
+        self._set_member(order_id, None)
+        self.touched.add(key)
+
+    def apply(self, order_id, plant_id, delivery_date, amount, quantity, customer_id, part_id, source_type) -> None:
+        """
+        Bring one written order's membership and sampled copy up to date.
+        """
+        old = self._member(order_id)
+        new = None
+        if source_type == "DELIVERY" and delivery_date is not None:
+            new = (plant_id, _fy_start(delivery_date))
+        row = (amount or 0, quantity or 0, customer_id, part_id)
+
+        if old is not None and old == new:
+            stratum = self.strata[new]
+            stratum.sketch(row)
+            placed = self.slots.get(order_id)
+            if placed is not None:
+                stratum.rows[placed[1]] = row
+            self.touched.add(new)
+            return
+        if old is not None:
+            self.remove(order_id, old)
+        if new is not None:
+            self.add(order_id, new, row)
+
+    def delete(self, order_id: int) -> None:
+        old = self._member(order_id)
+        if old is not None:
+            self.remove(order_id, old)
+
+    def load_names(self, db) -> None:
+        sampled = [s.rows for s in self.strata.values()]
+        customers = {r[2] for rows in sampled for r in rows if r[2] is not None} - self.customer_names.keys()
+        parts = {r[3] for rows in sampled for r in rows if r[3] is not None} - self.part_names.keys()
+        self.customer_names.update(_names(db, Customer, customers))
+        self.part_names.update(_names(db, Part, parts))
+
+    def publish(self) -> SampleView:
+        """
+        A new view sharing the unchanged strata with the previous one.
+        """
+        strata = dict(self.view.strata) if self.view is not None else {}
+        for key in self.touched:
+            stratum = self.strata.get(key)
+            if stratum is None:
+                strata.pop(key, None)
+            else:
+                strata[key] = stratum.frozen()
+        self.touched = set()
+        self.view = SampleView(strata, self.customer_names, self.part_names, self.refreshed_at)
+        return self.view
+
+
+def _delivery_rows():
+    return select(*_COLUMNS).where(Order.source_type == "DELIVERY", Order.delivery_date.is_not(None))
+
+
+class AnalyticsSample:
+    def __init__(self) -> None:
+        self._view: SampleView | None = None
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        on_ingest(self._notify)
+        threading.Thread(target=self._refresh_loop, name="analytics-sample", daemon=True).start()
+
+    def _notify(self, notice: dict) -> None:
+        self._wake.set()
+
+    def _build(self) -> SampleState:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            # read the high-water mark first: everything stamped <= it is in the scan
+            state = SampleState(current_change_seq(db))
+            for row in db.execute(_delivery_rows().order_by(Order.id).execution_options(yield_per=SCAN_BATCH)):
+                state.apply(*row)
+            state.load_names(db)
+        finally:
+            db.close()
+
+        logger.info(
+            "Analytics sample built in %.0f ms (%d strata, %d of %d delivery rows)",
+            (time.perf_counter() - started) * 1000,
+            len(state.strata),
+            len(state.slots),
+            sum(s.population for s in state.strata.values()),
+        )
+        return state
+
+    def _catch_up(self, state: SampleState) -> bool:
+        """
+        Apply the orders stamped since state.seq (whatever their source
+        type: a row may have stopped being a delivery) and the deletes in
+        that range. Returns whether anything was applied.
+        """
+        db = SessionLocal()
+        try:
+            high = current_change_seq(db)
+            if high == state.seq:
+                return False
+            started = time.perf_counter()
+            rows = db.execute(
+                select(*_COLUMNS).where(Order.change_seq > state.seq, Order.change_seq <= high)
+            ).all()
+            deleted = deleted_between(db, state.seq, high)
+            for row in rows:
+                state.apply(*row)
+            for order_id in deleted:
+                state.delete(order_id)
+            state.load_names(db)
+        finally:
+            db.close()
+
+        state.seq = high
+        state.refreshed_at = datetime.utcnow()
+        logger.info(
+            "Analytics sample caught up to change %d (%d written, %d deleted) in %.0f ms",
+            high, len(rows), len(deleted), (time.perf_counter() - started) * 1000,
+        )
+        return True
+
+    def _refresh_loop(self) -> None:
+        state = None
+        while True:
+            try:
+                if state is None or time.monotonic() - state.built_at > settings.ANALYTICS_SAMPLE_REBUILD_HOURS * 3600:
+                    # first build, or the periodic one that resets the sketches
+                    state = self._build()
+                    self._view = state.publish()
+                    self._ready.set()
+                elif self._catch_up(state):
+                    self._view = state.publish()
+            except Exception:
+                logger.exception("Refreshing analytics sample failed")
+                # don't leave the first requests waiting for the retry
+                self._ready.set()
+                time.sleep(RETRY_SECONDS)
+                continue
+            # an ingest notice, or the next look at the counter
+            self._wake.wait(timeout=CHANGE_CHECK_SECONDS)
+            self._wake.clear()
+
+    def _current(self) -> SampleView:
+        """
+        The latest view; the first call waits for the first build.
+        """
+        view = self._view
+        if view is None:
+            self._start()
+            self._ready.wait()
+            view = self._view
+            if view is None:
+                raise RuntimeError("Analytics sample could not be built (see the log); retrying in the background")
+        return view
+
+    @staticmethod
+    def _strata(state: SampleView, start: date, end: date, plant_id: int | None) -> tuple[list[Stratum], dict]:
+        """
+        Strata for FY windows [start, end] (as parse_financial_year gives),
+        plus the metadata every estimate reports.
+        """
+        first, last = start.year, end.year - 1
+        chosen = [
+            stratum
+            for (stratum_plant, fy), stratum in state.strata.items()
+            if first <= fy <= last and (plant_id is None or stratum_plant == plant_id)
+        ]
+        meta = {
+            "confidence": CONFIDENCE,
+            "sample_rows": sum(len(s.rows) for s in chosen),
+            "population_rows": sum(s.population for s in chosen),
+            "sample_refreshed_at": state.refreshed_at.isoformat(timespec="seconds"),
+        }
+        return chosen, meta
+
+    @staticmethod
+    def _distinct(chosen: list[Stratum], attribute: str) -> dict:
+        merged = HyperLogLog()
+        for stratum in chosen:
+            merged.merge(getattr(stratum, attribute))
+        estimate = merged.estimate()
+        return {
+            "estimate": round(estimate),
+            "error_bound": round(Z_SCORE * merged.relative_error() * estimate),
+        }
+
+    def totals(self, start: date, end: date, plant_id: int | None = None) -> dict:
+        """
+        Estimated sales amount and quantity with 95% error bounds, plus
+        distinct customer / part estimates and the sample metadata.
+        """
+        chosen, meta = self._strata(self._current(), start, end, plant_id)
+        estimates = [0.0, 0.0]
+        variances = [0.0, 0.0]
+        for stratum in chosen:
+            n = len(stratum.rows)
+            scale, variance_factor = stratum.scale()
+            for i in (0, 1):
+                values = [row[i] for row in stratum.rows]
+                total = sum(values)
+                estimates[i] += scale * total
+                variances[i] += variance_factor * _variance(total, sum(v * v for v in values), n)
+
+        return {
+            "total_sales_amount": round(estimates[0], 2),
+            "total_quantity": round(estimates[1]),
+            "error_bounds": {
+                "total_sales_amount": round(_bound(variances[0]), 2),
+                "total_quantity": round(_bound(variances[1])),
+            },
+            "distinct_customers": self._distinct(chosen, "customers"),
+            "distinct_parts": self._distinct(chosen, "parts"),
+            **meta,
+        }
+
+    def breakdown(self, by: str, start: date, end: date, plant_id: int | None = None) -> tuple[list[dict], dict]:
+        """
+        (items, metadata). Items have the exact endpoint's shape - part
+        ("part") or customer ("customer") and total_amount, largest first -
+        plus a 95% error_bound and the number of sampled rows behind the
+        estimate (bounds resting on a handful of rows are optimistic).
+        Metadata includes the distinct part / customer estimate.
+        """
+        # (row position of the id, sketch, label field)
+        position, sketch, label = (3, "parts", "part_number") if by == "part" else (2, "customers", "customer_name")
+        state = self._current()
+        chosen, meta = self._strata(state, start, end, plant_id)
+        labels = state.part_names if by == "part" else state.customer_names
+
+        estimates: dict = {}
+        variances: dict = {}
+        counts: dict = {}
+        for stratum in chosen:
+            n = len(stratum.rows)
+            scale, variance_factor = stratum.scale()
+            # per key: sum and sum of squares of amount-if-this-key-else-0
+            sums: dict = {}
+            squares: dict = {}
+            for row in stratum.rows:
+                key, amount = row[position], row[0]
+                sums[key] = sums.get(key, 0) + amount
+                squares[key] = squares.get(key, 0) + amount * amount
+                counts[key] = counts.get(key, 0) + 1
+            for key, total in sums.items():
+                estimates[key] = estimates.get(key, 0.0) + scale * total
+                variances[key] = variances.get(key, 0.0) + variance_factor * _variance(total, squares[key], n)
+
+        items = [
+            {
+                label: labels.get(key),
+                "total_amount": round(estimate, 2),
+                "error_bound": round(_bound(variances[key]), 2),
+                "sample_rows": counts[key],
+            }
+            for key, estimate in sorted(estimates.items(), key=lambda e: e[1], reverse=True)
+        ]
+        return items, {f"distinct_{sketch}": self._distinct(chosen, sketch), **meta}
+
+
+def approximation_headers(meta: dict) -> dict[str, str]:
+    """
+    Response headers describing an approximate breakdown, so the body keeps
+    the exact endpoint's list shape.
+    """
+    headers = {
+        "X-Approximate": "true",
+        "X-Approximate-Confidence": str(meta["confidence"]),
+        "X-Sample-Rows": str(meta["sample_rows"]),
+        "X-Population-Rows": str(meta["population_rows"]),
+        "X-Sample-Refreshed-At": meta["sample_refreshed_at"],
+    }
+    for sketch in ("parts", "customers"):
+        distinct = meta.get(f"distinct_{sketch}")
+        if distinct is not None:
+            headers[f"X-Distinct-{sketch.title()}"] = f"{distinct['estimate']};error_bound={distinct['error_bound']}"
+    return headers
+
+
+analytics_sample = AnalyticsSample()
@@ -0,0 +1,150 @@
+"""
+Change sequence for Order rows and the delta-sync query behind
+/orders/changes.
+
+Every flush that inserts, updates or deletes Orders takes the next value of
+the "orders" sync counter and stamps it on those rows (deletes leave an
+OrderTombstone with that value). The counter row is updated inside the
+writer's transaction, so concurrent writers serialize on it and a reader that
+sees counter value N also sees every row stamped <= N.
+
+Sync tokens (omit for a full sync):
+  "<seq>"       everything up to and including seq has been delivered
+  "<seq>.<id>"  partway through seq: rows of seq with id <= <id> delivered
+"""
+
+from sqlalchemy import and_, event, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.order import Order
+from app.models.sync import OrderTombstone, SyncCounter
+
+ORDERS_COUNTER = "orders"
+
+
+def next_change_seq(db: Session) -> int:
+    """
+    Allocate the next change sequence value (locks the counter row until
+    the transaction ends).
+    """
+    result = db.execute(
+        update(SyncCounter)
+        .where(SyncCounter.name == ORDERS_COUNTER)
+        .values(value=SyncCounter.value + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(SyncCounter.__table__.insert().values(name=ORDERS_COUNTER, value=1))
+        return 1
+    return db.execute(
+        select(SyncCounter.value).where(SyncCounter.name == ORDERS_COUNTER)
+    ).scalar_one()
+
+
+def current_change_seq(db: Session) -> int:
+    return db.execute(
+        select(SyncCounter.value).where(SyncCounter.name == ORDERS_COUNTER)
+    ).scalar() or 0
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _stamp_change_seq(session, flush_context, instances):
+    written = [o for o in (*session.new, *session.dirty) if isinstance(o, Order)]
+    deleted = [o for o in session.deleted if isinstance(o, Order)]
+    if not written and not deleted:
+        return
+
+    seq = next_change_seq(session)
+    for obj in written:
+        obj.change_seq = seq
+    for obj in deleted:
+        session.add(OrderTombstone(order_id=obj.id, plant_id=obj.plant_id, change_seq=seq))
+
+
+def deleted_between(db: Session, after: int, through: int, limit: int | None = None) -> list[int]:
+    """
+    Ids of the orders deleted with a change_seq in (after, through].
+    """
+    query = (
+        select(OrderTombstone.order_id)
+        .where(OrderTombstone.change_seq > after, OrderTombstone.change_seq <= through)
+        .order_by(OrderTombstone.change_seq, OrderTombstone.id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return list(db.execute(query).scalars())
+
+
+def parse_token(token: str | None) -> tuple[int, int | None]:
+    """
+    "<seq>" -> (seq, None); "<seq>.<id>" -> (seq, id). Raises ValueError.
+    No token means a full sync: (-1, None), since untouched rows sit at 0.
+    """
+    if not token:
+        return -1, None
+    seq_text, _, id_text = token.partition(".")
+    seq = int(seq_text)
+    last_id = int(id_text) if id_text else None
+    if seq < 0 or (last_id is not None and last_id < 0):
+        raise ValueError("negative token")
+    return seq, last_id
+
+
+def changes_since(db: Session, token: str | None, limit: int, plant_id: int | None = None) -> dict:
+    """
+    Orders written after `token` (ordered by change_seq, id), ids deleted in
+    the same range, and the token to send next time. With a plant_id only
+    that plant's orders and deletes are returned.
+    """
+    seq, last_id = parse_token(token)
+
+    # read the high-water mark first: everything stamped <= it is committed
+    high = current_change_seq(db)
+
+    query = db.query(Order).filter(Order.change_seq <= high)
+    if plant_id is not None:
+        query = query.filter(Order.plant_id == plant_id)
+    if last_id is None:
+        query = query.filter(Order.change_seq > seq)
+        tombstones_after = seq
+    else:
+        query = query.filter(
+            or_(
+                Order.change_seq > seq,
+                and_(Order.change_seq == seq, Order.id > last_id),
+            )
+        )
+        tombstones_after = seq - 1
+
+    rows = query.order_by(Order.change_seq, Order.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if has_more:
+        end = rows[-1]
+        next_token = f"{end.change_seq}.{end.id}"
+        tombstones_through = end.change_seq - 1
+    else:
+        next_token = str(max(high, seq))
+        tombstones_through = high
+
+    deleted = []
+    if tombstones_through > tombstones_after:
+        tombstones = (
+            db.query(OrderTombstone.order_id)
+            .filter(OrderTombstone.change_seq > tombstones_after)
+            .filter(OrderTombstone.change_seq <= tombstones_through)
+        )
+        if plant_id is not None:
+            tombstones = tombstones.filter(OrderTombstone.plant_id == plant_id)
+        deleted = [
+            order_id
+            for (order_id,) in tombstones.order_by(OrderTombstone.change_seq, OrderTombstone.id)
+        ]
+
+    return {
+        "changes": rows,
+        "deleted": deleted,
+        "next_token": next_token,
+        "has_more": has_more,
+    }
@@ -0,0 +1,174 @@
+"""
+Dimension keys for the repeated free-text columns on orders.
+
+customer_name, part_number, department and transporter each map to a row in
+a small dimension table (customers, parts, departments, transporters) and
+orders carry the integer key next to the original string. Values are matched
+case- and whitespace-insensitively, so "ACME  Forgings" and "Acme Forgings"
+share one key and one canonical spelling.
+
+The string columns are kept (search, the order payloads and the ingest
+natural key read them), so the keys make order rows slightly wider, not
+smaller. What they buy is grouping and joining on integers and one spelling
+per value in reports.
+
+Ingest resolves keys through a process-wide dictionary (key -> id) loaded
+once per table; only unseen values touch the database. Ids created inside a
+transaction are kept on the session until it commits, so a rolled-back
+ingest never leaves dangling ids in the cache.
+"""
+
+import logging
+import threading
+
+from sqlalchemy import bindparam, event, exists, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.dimension import Customer, Department, Part, Transporter
+from app.models.order import Order
+
+logger = logging.getLogger(__name__)
+
+# Order string field -> (Order key field, dimension model)
+DIMENSIONS = {
+    "customer_name": ("customer_id", Customer),
+    "part_number": ("part_id", Part),
+    "department": ("department_id", Department),
+    "transporter": ("transporter_id", Transporter),
+}
+
+
+def canonical_spelling(value) -> str | None:
+    """
+    Trimmed, whitespace-collapsed text; None for empty / NaN cells.
+    """
+    if value is None or value != value:
+        return None
+    text = " ".join(str(value).split())
+    return text or None
+
+
+def dimension_key(value) -> str | None:
+    text = canonical_spelling(value)
+    return text.upper() if text else None
+
+
+def _insert_ignore(db: Session, model, key: str, name: str) -> None:
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    # concurrent ingests may add the same value; the loser just reads it back
+    db.execute(insert(model).values(key=key, name=name).on_conflict_do_nothing(index_elements=["key"]))
+
+
+class DimensionCache:
+    """
+    key -> id per dimension model, shared by every session in the process.
+    Dimension rows are never deleted, so a cached id stays valid.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids: dict[type, dict[str, int]] = {}
+
+    def _committed(self, db: Session, model) -> dict[str, int]:
+        ids = self._ids.get(model)
+        if ids is None:
+            ids = {key: id_ for key, id_ in db.execute(select(model.key, model.id))}
+            with self._lock:
+                ids = self._ids.setdefault(model, ids)
+        return ids
+
+    def resolve(self, db: Session, model, value) -> int | None:
+        key = dimension_key(value)
+        if key is None:
+            return None
+
+        id_ = self._committed(db, model).get(key)
+        if id_ is not None:
+            return id_
+
+        pending = db.info.setdefault("new_dimension_ids", {})
+        id_ = pending.get((model, key))
+        if id_ is None:
+            _insert_ignore(db, model, key, canonical_spelling(value))
+            id_ = db.execute(select(model.id).where(model.key == key)).scalar_one()
+            pending[(model, key)] = id_
+        return id_
+
+    def publish(self, pending: dict) -> None:
+        with self._lock:
+            for (model, key), id_ in pending.items():
+                ids = self._ids.get(model)
+                if ids is not None:
+                    ids[key] = id_
+
+
+cache = DimensionCache()
+
+
+def resolve_dimension_keys(db: Session, data: dict) -> None:
+    """
+    Fill the *_id fields of an Order values dict from its string fields.
+    """
+    for field, (id_field, model) in DIMENSIONS.items():
+        if field in data:
+            data[id_field] = cache.resolve(db, model, data[field])
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_new_ids(session):
+    pending = session.info.pop("new_dimension_ids", None)
+    if pending:
+        cache.publish(pending)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_new_ids(session):
+    session.info.pop("new_dimension_ids", None)
+
+
+def backfill_dimension_keys(engine: Engine) -> None:
+    """
+    Resolve keys for orders written before the dimension tables existed
+    (or by code that bypassed ingest, like the load test's seeding). Scans
+    orders for unkeyed values, so ensure_schema runs it once per database.
+    """
+    db = SessionLocal(bind=engine)
+    try:
+        unkeyed = or_(*(
+            getattr(Order, field).is_not(None) & getattr(Order, id_field).is_(None)
+            for field, (id_field, _) in DIMENSIONS.items()
+        ))
+        if not db.query(exists().where(unkeyed)).scalar():
+            return
+
+        for field, (id_field, model) in DIMENSIONS.items():
+            column = getattr(Order, field)
+            id_column = getattr(Order, id_field)
+            values = [
+                value
+                for (value,) in db.query(column)
+                .filter(column.is_not(None), id_column.is_(None))
+                .distinct()
+            ]
+            params = [
+                {"b_value": value, "b_id": cache.resolve(db, model, value)}
+                for value in values
+            ]
+            params = [p for p in params if p["b_id"] is not None]
+            if params:
+                db.execute(
+                    update(Order.__table__)
+                    .where(column == bindparam("b_value"), id_column.is_(None))
+                    .values({id_field: bindparam("b_id")}),
+                    params,
+                )
+                logger.info("Backfilled %s for %d distinct values", id_field, len(params))
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,310 @@
+"""
+Materialized dispatch board behind /orders/dispatch-board.
+
+The board lists PENDING orders in three buckets - overdue, due today and due
+in the next WEEK_AHEAD_DAYS days - grouped by customer and part, with open
+quantity / value per group and the order lines under it. One board is kept
+per plant plus one for all plants, already serialized to JSON, so the floor
+screens that poll it only cost a dict lookup.
+
+Boards are built on first use and rebuilt at midnight (the buckets depend on
+the date). In between they follow the orders change sequence: the lines
+stamped since the last look (and the deletes in that range) are applied to
+the board's rows and only the plants they touched are re-serialized. That
+happens after every local ingest notice and, at most once per
+CHANGE_CHECK_SECONDS, when a request finds the counter has moved - so
+ingests done by `python -m app.worker` show up even with EVENT_BROKER=memory.
+A request that arrives after midnight before the rebuild finished builds the
+new day's boards itself rather than serve yesterday's.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.core.events import on_ingest
+from app.db.session import SessionLocal
+from app.models.dimension import Customer, Part
+from app.models.order import Order
+from app.services.change_feed import current_change_seq, deleted_between
+
+logger = logging.getLogger(__name__)
+
+WEEK_AHEAD_DAYS = 7
+BUCKETS = ("overdue", "today", "this_week")
+# how stale a board may be before a request checks the change sequence
+CHANGE_CHECK_SECONDS = 1.0
+
+
+def _seconds_until_midnight() -> float:
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    # wake just after midnight, not just before
+    return (midnight - now).total_seconds() + 1
+
+
+def _board_rows():
+    # canonical customer / part spellings where the dimension key is set
+    return (
+        select(
+            Order.id,
+            Order.plant_id,
+            Order.status,
+            Order.delivery_date,
+            func.coalesce(Customer.name, Order.customer_name).label("customer_name"),
+            func.coalesce(Part.name, Order.part_number).label("part_number"),
+            Order.so_number,
+            Order.order_no,
+            Order.po_serial,
+            Order.os_order_qty,
+            Order.rate,
+        )
+        .outerjoin(Customer, Customer.id == Order.customer_id)
+        .outerjoin(Part, Part.id == Order.part_id)
+    )
+
+
+def _load(db, today: date) -> list:
+    return db.execute(
+        _board_rows().where(
+            Order.status == "PENDING",
+            Order.delivery_date.is_not(None),
+            Order.delivery_date <= today + timedelta(days=WEEK_AHEAD_DAYS),
+        )
+    ).all()
+
+
+def _on_board(row, today: date) -> bool:
+    return (
+        row.status == "PENDING"
+        and row.delivery_date is not None
+        and row.delivery_date <= today + timedelta(days=WEEK_AHEAD_DAYS)
+    )
+
+
+def _bucket(delivery_date: date, today: date) -> str:
+    if delivery_date < today:
+        return "overdue"
+    if delivery_date == today:
+        return "today"
+    return "this_week"
+
+
+def build_board(rows, today: date, plant_id: int | None) -> dict:
+    """
+    Board dict for rows already ordered by (delivery_date, id).
+    """
+    groups: dict[str, dict[tuple, dict]] = {bucket: {} for bucket in BUCKETS}
+    for row in rows:
+        bucket = groups[_bucket(row.delivery_date, today)]
+        key = (row.customer_name, row.part_number)
+        group = bucket.get(key)
+        if group is None:
+            # rows come earliest first, so the first line sets earliest_delivery
+            group = bucket[key] = {
+                "customer_name": row.customer_name,
+                "part_number": row.part_number,
+                "earliest_delivery": row.delivery_date,
+                "orders": 0,
+                "open_qty": 0,
+                "open_value": 0.0,
+                "lines": [],
+            }
+        open_qty = row.os_order_qty or 0
+        group["orders"] += 1
+        group["open_qty"] += open_qty
+        group["open_value"] += open_qty * (row.rate or 0)
+        group["lines"].append({
+            "id": row.id,
+            "so_number": row.so_number,
+            "order_no": row.order_no,
+            "po_serial": row.po_serial,
+            "delivery_date": row.delivery_date,
+            "os_order_qty": row.os_order_qty,
+        })
+
+    buckets = {}
+    for name in BUCKETS:
+        bucket_groups = list(groups[name].values())
+        buckets[name] = {
+            "orders": sum(g["orders"] for g in bucket_groups),
+            "open_qty": sum(g["open_qty"] for g in bucket_groups),
+            "open_value": round(sum(g["open_value"] for g in bucket_groups), 2),
+            "groups": bucket_groups,
+        }
+        for group in bucket_groups:
+            group["open_value"] = round(group["open_value"], 2)
+
+    return {
+        "date": today,
+        "week_ends": today + timedelta(days=WEEK_AHEAD_DAYS),
+        "built_at": datetime.utcnow(),
+        "plant_id": plant_id,
+        "buckets": buckets,
+    }
+
+
+def _serialize(board: dict) -> bytes:
+    return json.dumps(board, default=str, separators=(",", ":")).encode()
+
+
+class BoardState:
+    """
+    The rows on one day's boards (order id -> row) and their serialized
+    boards, as of change sequence `seq`.
+    """
+
+    def __init__(self, today: date, seq: int, rows: list) -> None:
+        self.today = today
+        self.seq = seq
+        self.rows = {row.id: row for row in rows}
+        self.boards: dict[int | None, bytes] = {}
+        self.checked_at = time.monotonic()
+
+    def render(self, plant_ids: set) -> None:
+        """
+        Re-serialize the boards of `plant_ids` (None: all plants). Plants
+        left without rows drop out and are served an empty board.
+        """
+        rows = sorted(self.rows.values(), key=lambda row: (row.delivery_date, row.id))
+        by_plant: dict[int | None, list] = {None: rows}
+        for row in rows:
+            if row.plant_id in plant_ids:
+                by_plant.setdefault(row.plant_id, []).append(row)
+        # readers hold on to the previous dict, so swap in a copy
+        boards = {plant_id: board for plant_id, board in self.boards.items() if plant_id not in plant_ids}
+        for plant_id in plant_ids:
+            if plant_id in by_plant:
+                boards[plant_id] = _serialize(build_board(by_plant[plant_id], self.today, plant_id))
+        self.boards = boards
+
+
+class DispatchBoard:
+    def __init__(self) -> None:
+        self._state: BoardState | None = None
+        self._build_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._listening = False
+
+    def _build(self) -> BoardState:
+        started = time.perf_counter()
+        today = date.today()
+        db = SessionLocal()
+        try:
+            # read the high-water mark first: the rows loaded are at least as new
+            seq = current_change_seq(db)
+            rows = _load(db, today)
+        finally:
+            db.close()
+
+        state = BoardState(today, seq, rows)
+        state.render({None, *(row.plant_id for row in rows)})
+        logger.info(
+            "Dispatch board for %s built in %.0f ms (%d orders, %d plants)",
+            today, (time.perf_counter() - started) * 1000, len(rows), len(state.boards) - 1,
+        )
+        return state
+
+    def _catch_up(self, state: BoardState) -> None:
+        """
+        Apply the orders stamped since state.seq: lines written in that
+        range replace (or leave) the board, deleted ones leave it.
+        """
+        state.checked_at = time.monotonic()
+        db = SessionLocal()
+        try:
+            high = current_change_seq(db)
+            if high == state.seq:
+                return
+            started = time.perf_counter()
+            written = db.execute(
+                _board_rows().where(Order.change_seq > state.seq, Order.change_seq <= high)
+            ).all()
+            deleted = deleted_between(db, state.seq, high)
+        finally:
+            db.close()
+
+        touched = set()
+        for order_id in deleted:
+            old = state.rows.pop(order_id, None)
+            if old is not None:
+                touched.add(old.plant_id)
+        for row in written:
+            old = state.rows.pop(row.id, None)
+            if old is not None:
+                touched.add(old.plant_id)
+            if _on_board(row, state.today):
+                state.rows[row.id] = row
+                touched.add(row.plant_id)
+        if touched:
+            state.render({None, *touched})
+        state.seq = high
+        logger.info(
+            "Dispatch board caught up to change %d (%d written, %d deleted, %d plants) in %.0f ms",
+            high, len(written), len(deleted), len(touched), (time.perf_counter() - started) * 1000,
+        )
+
+    def _refresh(self) -> None:
+        with self._build_lock:
+            state = self._state
+            if state is not None and state.today == date.today():
+                self._catch_up(state)
+                return
+        # a new day: build outside the lock, requests keep yesterday's
+        # boards only until they notice the date themselves
+        state = self._build()
+        with self._build_lock:
+            self._state = state
+
+    def _rebuild_loop(self) -> None:
+        while True:
+            # an ingest notice or midnight, whichever comes first
+            self._dirty.wait(timeout=_seconds_until_midnight())
+            self._dirty.clear()
+            try:
+                self._refresh()
+            except Exception:
+                logger.exception("Refreshing dispatch board failed")
+
+    def _invalidate(self, notice: dict) -> None:
+        self._dirty.set()
+
+    def current(self) -> BoardState:
+        state = self._state
+        if (
+            state is not None
+            and state.today == date.today()
+            and time.monotonic() - state.checked_at < CHANGE_CHECK_SECONDS
+        ):
+            return state
+        with self._build_lock:
+            if not self._listening:
+                self._listening = True
+                threading.Thread(target=self._rebuild_loop, name="dispatch-board", daemon=True).start()
+                on_ingest(self._invalidate)
+            if self._state is None or self._state.today != date.today():
+                self._state = self._build()
+            elif time.monotonic() - self._state.checked_at >= CHANGE_CHECK_SECONDS:
+                self._catch_up(self._state)
+            return self._state
+
+    def boards(self) -> dict[int | None, bytes]:
+        return self.current().boards
+
+    def board(self, plant_id: int | None = None) -> bytes:
+        """
+        Serialized board for one plant (None: all plants).
+        """
+        state = self.current()
+        board = state.boards.get(plant_id)
+        if board is None:
+            # plant without anything due
+            board = _serialize(build_board([], state.today, plant_id))
+        return board
+
+
+dispatch_board = DispatchBoard()
@@ -0,0 +1,134 @@
+"""
+Streaming reader for .xlsx reports.
+
+pd.read_excel builds the whole workbook in memory before returning a single
+DataFrame. Here openpyxl's read-only mode parses the sheet XML as it goes and
+rows are handed out as DataFrames of at most `chunk_rows` rows, so memory
+stays flat however large the workbook is.
+
+ERP exports often put a title, the report parameters and blank lines above
+the real header; the header is taken to be the first row (within the first
+HEADER_SCAN_ROWS) naming at least MIN_HEADER_MATCHES known report columns.
+"""
+
+from itertools import chain
+from typing import Iterator
+
+import pandas as pd
+
+from app.services.ingest_profiler import IngestProfiler, NULL_PROFILER
+
+HEADER_SCAN_ROWS = 30
+MIN_HEADER_MATCHES = 3
+
+
+def _cell_text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _has_value(value) -> bool:
+    return value is not None and (not isinstance(value, str) or bool(value.strip()))
+
+
+def _header_names(cells) -> list[str]:
+    # same naming as pandas: blanks become "Unnamed: i", repeats get ".1", ".2"
+    names: list[str] = []
+    seen: dict[str, int] = {}
+    for i, value in enumerate(cells):
+        name = _cell_text(value) or f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _find_header(rows: list, known_columns: set[str]) -> int | None:
+    """
+    Position in `rows` of the header row; falls back to the first non-empty
+    row when nothing looks like a report header.
+    """
+    first = None
+    for position, (_, cells) in enumerate(rows):
+        texts = [_cell_text(value) for value in cells]
+        if not any(texts):
+            continue
+        if first is None:
+            first = position
+        if len(known_columns.intersection(texts)) >= MIN_HEADER_MATCHES:
+            return position
+    return first
+
+
+class ExcelReport:
+    """
+    One worksheet of an .xlsx report, opened read-only. Use as a context
+    manager; `columns` is available right after opening.
+    """
+
+    def __init__(self, path: str, known_columns: set[str], sheet: str | None = None) -> None:
+        from openpyxl import load_workbook
+
+        self._workbook = load_workbook(path, read_only=True, data_only=True)
+        worksheet = self._workbook[sheet] if sheet else self._workbook.worksheets[0]
+        # the stored sheet dimensions are often wrong in generated files
+        worksheet.reset_dimensions()
+        rows = enumerate(worksheet.iter_rows(values_only=True), start=1)
+
+        scanned = [row for _, row in zip(range(HEADER_SCAN_ROWS), rows)]
+        position = _find_header(scanned, known_columns)
+        if position is None:
+            self.header_row, self.columns = 0, []
+            self._rows = iter(())
+            return
+
+        self.header_row, cells = scanned[position]
+        # trailing blank header cells are just formatting
+        cells = list(cells)
+        while cells and _cell_text(cells[-1]) == "":
+            cells.pop()
+        self.columns = _header_names(cells)
+        self._rows = chain(scanned[position + 1:], rows)
+
+    def chunks(self, chunk_rows: int, profiler: IngestProfiler = NULL_PROFILER) -> Iterator[pd.DataFrame]:
+        """
+        DataFrames of up to chunk_rows data rows, every column of dtype
+        object. Each frame's index is the sheet row number - 2, matching a
+        CSV read with its header on line 1. Blank rows are skipped.
+        """
+        width = len(self.columns)
+        if not width:
+            return
+
+        while True:
+            with profiler.stage("read"):
+                numbers, rows = [], []
+                for number, cells in self._rows:
+                    cells = cells[:width]
+                    if not any(_has_value(value) for value in cells):
+                        continue
+                    if len(cells) < width:
+                        cells = cells + (None,) * (width - len(cells))
+                    numbers.append(number - 2)
+                    rows.append(cells)
+                    if len(rows) >= chunk_rows:
+                        break
+                if not rows:
+                    return
+                # object columns: cells pass through as openpyxl read them, so
+                # a blank cell can't turn one chunk's ints into floats
+                frame = pd.DataFrame(rows, columns=self.columns, index=numbers, dtype=object)
+            yield frame
+            if len(rows) < chunk_rows:
+                return
+
+    def close(self) -> None:
+        self._workbook.close()
+
+    def __enter__(self) -> "ExcelReport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,73 +1,460 @@
-import email
+"""
+Incremental IMAP attachment fetcher.
+
+Instead of downloading every UNSEEN message as a full RFC822 body, this:
+
+1. remembers the mailbox UIDVALIDITY and the last UID it handled
+   (a small JSON state file), so each run only looks at new messages;
+2. fetches BODYSTRUCTURE first and picks out the CSV / Excel attachment
+   parts by filename;
+3. downloads just those parts (BODY.PEEK[<part>], so nothing is marked
+   seen) with several parts in flight, one IMAP connection per worker;
+4. hands the saved files to the ingestion pipeline in UID order (oldest
+   export first), each as soon as it and the ones before it have landed,
+   committing per file.
+
+`connect` is injectable everywhere, so the whole flow can run against a
+local IMAP stand-in (set IMAP_SSL=false for a plaintext test server).
+"""
+
+import base64
+import binascii
 import imaplib
+import json
+import logging
 import os
-from typing import List
+import quopri
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.header import decode_header, make_header
+from typing import Callable, List
 
 from app.core.config import settings
 from app.db.session import SessionLocal
 
+logger = logging.getLogger(__name__)
+
+# same as ingestion.REPORT_FORMATS (not imported: that module pulls in pandas)
+ATTACHMENT_EXTENSIONS = (".csv", ".csv.gz", ".csv.zst", ".xlsx", ".xlsm", ".xls", ".parquet", ".arrow", ".feather")
+FETCH_BATCH_SIZE = 200
+# under DATA_FOLDER; attachments that are neither report type
+UNRECOGNISED_FOLDER = "unrecognised"
+# under DATA_FOLDER; where run_imap_ingestion files what it ingested itself,
+# outside the <report type>/ folders the worker and the folder sweep ingest
+IMAP_INGESTED_FOLDER = "imap"
+
 
-def download_attachments_to_folder() -> List[str]:
+# --------------------------------------------------------------------------
+# Connection / state
+# --------------------------------------------------------------------------
+
+def connect_imap() -> imaplib.IMAP4:
     """
-    Connects to IMAP and downloads CSV attachments into DATA_FOLDER.
-    This is generic; you configure IMAP_* in .env.
+    Open and authenticate an IMAP connection from IMAP_* settings.
     """
-
     if not settings.IMAP_HOST or not settings.IMAP_USERNAME or not settings.IMAP_PASSWORD:
         raise RuntimeError("IMAP settings are not configured")
 
-    mail = imaplib.IMAP4_SSL(settings.IMAP_HOST, settings.IMAP_PORT)
+    if settings.IMAP_SSL:
+        mail = imaplib.IMAP4_SSL(settings.IMAP_HOST, settings.IMAP_PORT)
+    else:
+        mail = imaplib.IMAP4(settings.IMAP_HOST, settings.IMAP_PORT)
     mail.login(settings.IMAP_USERNAME, settings.IMAP_PASSWORD)
-    mail.select(settings.IMAP_FOLDER)
+    return mail
 
-    # Search all unseen messages with attachments (simple version)
-    typ, msg_nums = mail.search(None, "UNSEEN")
-    if typ != "OK":
+
+def default_state_path() -> str:
+    return settings.IMAP_STATE_FILE or os.path.join(settings.DATA_FOLDER, ".imap_state.json")
+
+
+def load_state(path: str) -> dict:
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        return {"uidvalidity": state.get("uidvalidity"), "last_uid": int(state.get("last_uid", 0))}
+    except (FileNotFoundError, ValueError):
+        return {"uidvalidity": None, "last_uid": 0}
+
+
+def save_state(path: str, state: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# --------------------------------------------------------------------------
+# BODYSTRUCTURE parsing
+# --------------------------------------------------------------------------
+
+_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}(?:\r\n)?|([^\s()"]+))', re.S)
+
+
+def _flatten_response(data: list) -> bytes:
+    """
+    imaplib splits responses containing literals into (prefix, literal)
+    tuples; glue them back into one byte string the tokenizer understands.
+    """
+    chunks = []
+    for item in data:
+        if isinstance(item, tuple):
+            chunks.append(item[0] + b"\r\n")
+            chunks.append(item[1])
+        elif item is not None:
+            chunks.append(item + b" ")
+    return b"".join(chunks)
+
+
+def parse_sexp(raw: bytes) -> list:
+    """
+    Parse an IMAP response into nested lists of bytes / None (for NIL).
+    """
+    stack: list[list] = [[]]
+    pos = 0
+    while pos < len(raw):
+        match = _TOKEN.match(raw, pos)
+        if not match:
+            break
+        pos = match.end()
+        open_paren, close_paren, quoted, literal_len, atom = match.groups()
+        if open_paren:
+            stack.append([])
+        elif close_paren:
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", quoted))
+        elif literal_len is not None:
+            n = int(literal_len)
+            stack[-1].append(raw[pos:pos + n])
+            pos += n
+        elif atom is not None:
+            stack[-1].append(None if atom.upper() == b"NIL" else atom)
+    while len(stack) > 1:
+        done = stack.pop()
+        stack[-1].append(done)
+    return stack[0]
+
+
+def _text(value) -> str | None:
+    if value is None:
+        return None
+    text = value.decode("utf-8", errors="replace") if isinstance(value, bytes) else str(value)
+    try:
+        return str(make_header(decode_header(text)))
+    except Exception:
+        return text
+
+
+def _params(value) -> dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    out = {}
+    for key, val in zip(value[0::2], value[1::2]):
+        if isinstance(key, bytes) and not isinstance(val, list):
+            out[key.decode(errors="replace").lower()] = _text(val)
+    return out
+
+
+def _part_filename(part: list) -> str | None:
+    # disposition lives in the extension data; its position depends on the
+    # part type, so look for the first ("attachment"|"inline" (params)) list
+    for ext in part[7:]:
+        if (
+            isinstance(ext, list)
+            and len(ext) == 2
+            and isinstance(ext[0], bytes)
+            and ext[0].lower() in (b"attachment", b"inline")
+        ):
+            filename = _params(ext[1]).get("filename")
+            if filename:
+                return filename
+    return _params(part[2]).get("name")
+
+
+def find_attachment_parts(body: list, prefix: str = "") -> list[dict]:
+    """
+    Walk a parsed BODYSTRUCTURE and return the CSV/Excel parts as
+    {"part": "2.1", "filename": ..., "encoding": ..., "size": ...}.
+    """
+    if not body:
         return []
 
-    saved_files: List[str] = []
-    data_folder = settings.DATA_FOLDER
-    os.makedirs(data_folder, exist_ok=True)
+    if isinstance(body[0], list):
+        found = []
+        for i, child in enumerate(body, start=1):
+            if not isinstance(child, list):
+                break  # multipart subtype and extension data follow the children
+            found.extend(find_attachment_parts(child, f"{prefix}{i}."))
+        return found
 
-    for num in msg_nums[0].split():
-        typ, msg_data = mail.fetch(num, "(RFC822)")
-        if typ != "OK":
+    section = prefix.rstrip(".") or "1"
+    filename = _part_filename(body) if len(body) > 2 else None
+    if not filename or not filename.lower().endswith(ATTACHMENT_EXTENSIONS):
+        return []
+
+    encoding = body[5].decode().lower() if len(body) > 5 and isinstance(body[5], bytes) else "7bit"
+    size = int(body[6]) if len(body) > 6 and isinstance(body[6], bytes) and body[6].isdigit() else None
+    return [{"part": section, "filename": os.path.basename(filename), "encoding": encoding, "size": size}]
+
+
+def parse_bodystructures(data: list) -> dict[int, list[dict]]:
+    """
+    Parse a `UID FETCH ... (UID BODYSTRUCTURE)` response into
+    {uid: [attachment part, ...]}.
+    """
+    items = parse_sexp(_flatten_response(data))
+    result: dict[int, list[dict]] = {}
+    for item in items:
+        if not isinstance(item, list):
+            continue  # message sequence number
+        fields = dict(zip(
+            (k.upper() if isinstance(k, bytes) else k for k in item[0::2]),
+            item[1::2],
+        ))
+        uid = fields.get(b"UID")
+        body = fields.get(b"BODYSTRUCTURE")
+        if uid is None or not isinstance(body, list):
             continue
+        result[int(uid)] = find_attachment_parts(body)
+    return result
+
+
+def decode_part(payload: bytes, encoding: str) -> bytes:
+    if encoding == "base64":
+        try:
+            return base64.b64decode(payload)
+        except binascii.Error:
+            return base64.b64decode(payload + b"===")
+    if encoding == "quoted-printable":
+        return quopri.decodestring(payload)
+    return payload
+
+
+# --------------------------------------------------------------------------
+# Fetching
+# --------------------------------------------------------------------------
+
+def _uid_set(uids: list[int]) -> str:
+    return ",".join(str(u) for u in uids)
+
+
+def list_new_attachments(mail, state: dict) -> tuple[int, list[int], dict[int, list[dict]]]:
+    """
+    Select the mailbox, reconcile UIDVALIDITY and return
+    (uidvalidity, new uids, {uid: attachment parts}) using BODYSTRUCTURE only.
+    """
+    typ, _ = mail.select(settings.IMAP_FOLDER, readonly=True)
+    if typ != "OK":
+        raise RuntimeError(f"Could not select IMAP folder {settings.IMAP_FOLDER}")
+
+    _, validity = mail.response("UIDVALIDITY")
+    uidvalidity = int(validity[0]) if validity and validity[0] else None
+    last_uid = state["last_uid"] if state.get("uidvalidity") == uidvalidity else 0
+
+    typ, data = mail.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+    if typ != "OK":
+        return uidvalidity, [], {}
+    # "N:*" always matches the highest UID, even when it is <= last_uid
+    uids = sorted(u for u in (int(x) for x in (data[0] or b"").split()) if u > last_uid)
+
+    parts: dict[int, list[dict]] = {}
+    for i in range(0, len(uids), FETCH_BATCH_SIZE):
+        batch = uids[i:i + FETCH_BATCH_SIZE]
+        typ, data = mail.uid("FETCH", _uid_set(batch), "(UID BODYSTRUCTURE)")
+        if typ == "OK":
+            parts.update(parse_bodystructures(data))
+    return uidvalidity, uids, parts
+
+
+def _fetch_part(mail, uid: int, part: str) -> bytes:
+    typ, data = mail.uid("FETCH", str(uid), f"(BODY.PEEK[{part}])")
+    if typ != "OK":
+        raise RuntimeError(f"FETCH of UID {uid} part {part} failed")
+    for item in data:
+        if isinstance(item, tuple):
+            return item[1]
+    raise RuntimeError(f"No body returned for UID {uid} part {part}")
+
+
+def _save_attachment(folder: str, uid: int, filename: str, payload: bytes) -> str:
+    incoming = os.path.join(folder, "incoming")
+    os.makedirs(incoming, exist_ok=True)
+    # prefix with the UID so same-named daily reports don't overwrite each other
+    path = os.path.join(incoming, f"{uid}_{filename}")
+    with open(path, "wb") as f:
+        f.write(payload)
+    return path
+
 
-        msg = email.message_from_bytes(msg_data[0][1])
+def fetch_new_attachments(
+    on_saved: Callable[[str], None] | None = None,
+    connect: Callable[[], imaplib.IMAP4] = connect_imap,
+    state_path: str | None = None,
+    max_workers: int | None = None,
+) -> List[str]:
+    """
+    Download CSV/Excel attachments of messages newer than the saved UID.
+
+    `on_saved(path)` runs in the calling thread for each file in UID order,
+    as soon as it and every earlier file have finished, so the caller can
+    ingest files while later parts are still downloading. The last UID only
+    advances past messages whose files were all downloaded; a failed
+    download is retried on the next run, and so is everything after it. A
+    file that `on_saved` fails on is logged and counted as handled, so one
+    bad attachment can't hold the mailbox back.
+    """
+    state_path = state_path or default_state_path()
+    state = load_state(state_path)
+    max_workers = max_workers or settings.IMAP_FETCH_WORKERS
+
+    mail = connect()
+    try:
+        uidvalidity, uids, parts = list_new_attachments(mail, state)
+    finally:
+        mail.logout()
 
-        for part in msg.walk():
-            if part.get_content_disposition() == "attachment":
-                filename = part.get_filename()
-                if not filename:
+    jobs = [(uid, part) for uid in uids for part in parts.get(uid, [])]
+    saved: List[str] = []
+    failed_uids: set[int] = set()
+
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+
+    def download(uid: int, part: dict) -> str:
+        conn = getattr(local, "mail", None)
+        if conn is None:
+            conn = local.mail = connect()
+            conn.select(settings.IMAP_FOLDER, readonly=True)
+            with connections_lock:
+                connections.append(conn)
+        payload = decode_part(_fetch_part(conn, uid, part["part"]), part["encoding"])
+        return _save_attachment(settings.DATA_FOLDER, uid, part["filename"], payload)
+
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+            futures = [pool.submit(download, uid, part) for uid, part in jobs]
+            # hand files over in UID order, whatever order they finish in: an
+            # older export applied after a newer one would undo its snapshot
+            for (uid, _), future in zip(jobs, futures):
+                if failed_uids:
+                    # retried next run, after the message that failed
+                    future.cancel()
                     continue
-                if not filename.lower().endswith(".csv"):
+                try:
+                    path = future.result()
+                except Exception:
+                    logger.exception("IMAP attachment of UID %s failed; will retry next run", uid)
+                    failed_uids.add(uid)
                     continue
+                if on_saved is not None:
+                    try:
+                        on_saved(path)
+                    except Exception:
+                        # the file is on disk; retrying the download would not
+                        # fix it and would hold every later message back
+                        logger.exception("Handling %s (UID %s) failed; skipped", path, uid)
+                        continue
+                saved.append(path)
+
+        for conn in connections:
+            try:
+                conn.logout()
+            except Exception:
+                pass
+
+    previous = state["last_uid"] if state.get("uidvalidity") == uidvalidity else 0
+    handled = [u for u in uids if not failed_uids or u < min(failed_uids)]
+    new_state = {"uidvalidity": uidvalidity, "last_uid": max(handled, default=previous)}
+    if new_state != state:
+        save_state(state_path, new_state)
 
-                path = os.path.join(data_folder, filename)
-                with open(path, "wb") as f:
-                    f.write(part.get_payload(decode=True))
-                saved_files.append(path)
+    return saved
 
-    mail.logout()
-    return saved_files
 
+# Kept for callers of the old name.
+download_attachments_to_folder = fetch_new_attachments
 
-def run_imap_ingestion():
+
+# --------------------------------------------------------------------------
+# Ingestion
+# --------------------------------------------------------------------------
+
+def file_report_into_folder(path: str, base_folder: str | None = None) -> tuple[str | None, str]:
+    """
+    Move a downloaded attachment into <base_folder>/<report type>/ (default
+    DATA_FOLDER, where the worker and the folder sweep ingest it). Returns
+    (report_type, new_path); attachments that are not a known report go to
+    DATA_FOLDER/unrecognised/ with a report_type of None.
+    """
+    from app.services.ingestion import detect_report_type
+
+    try:
+        report_type = detect_report_type(path)
+    except ValueError:
+        target_dir = os.path.join(settings.DATA_FOLDER, UNRECOGNISED_FOLDER)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(path))
+        shutil.move(path, target)
+        logger.warning("IMAP attachment %s is not a known report; moved to %s", os.path.basename(path), target_dir)
+        return None, target
+    target_dir = os.path.join(base_folder or settings.DATA_FOLDER, report_type)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, os.path.basename(path))
+    shutil.move(path, target)
+    return report_type, target
+
+
+def run_imap_ingestion(connect: Callable[[], imaplib.IMAP4] = connect_imap):
     """
-    Download CSVs from IMAP and ingest them using the same folder pipeline.
+    Fetch new CSV/Excel attachments from IMAP and ingest each one as soon as
+    it is downloaded (one commit per file). Files are kept under
+    DATA_FOLDER/imap/<report type>/, so the worker's folder watcher doesn't
+    ingest them a second time.
     """
-    saved = download_attachments_to_folder()
-    if not saved:
-        return {"downloaded": 0, "processed": []}
+    from app.services.ingestion import ingest_file, ingest_snapshot_file
+
+    processed = {"outstanding": 0, "delivery": 0}
+    files = []
 
     db = SessionLocal()
     try:
-        result = ingest_from_folder(db)
+        def ingest(path: str) -> None:
+            report_type, final_path = file_report_into_folder(
+                path, os.path.join(settings.DATA_FOLDER, IMAP_INGESTED_FOLDER)
+            )
+            if report_type is None:
+                return
+            try:
+                closed = 0
+                if report_type == "outstanding" and settings.OUTSTANDING_SNAPSHOT:
+                    result, closed = ingest_snapshot_file(db, final_path)
+                else:
+                    result = ingest_file(db, final_path, report_type)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            processed[report_type] += result.rows
+            files.append({
+                "file": final_path,
+                "report_type": report_type,
+                "rows": result.rows,
+                "rows_quarantined": result.quarantined,
+                "rows_closed": closed,
+            })
+
+        saved = fetch_new_attachments(on_saved=ingest, connect=connect)
     finally:
         db.close()
 
     return {
         "downloaded": len(saved),
-        "processed": result.get("processed", []),
+        "processed": processed,
+        "files": files,
     }
@@ -0,0 +1,90 @@
+import cProfile
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Order matters: this is how the breakdown is reported.
+STAGES = ("read", "normalize", "validate", "map", "lookup", "write", "commit")
+
+
+class IngestProfiler:
+    """
+    Collects per-stage wall time and per-column parse cost for one ingest.
+
+    A disabled profiler (the default everywhere) is a cheap no-op, so the
+    pipeline can call it unconditionally.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stages: dict[str, float] = {}
+        self.columns: dict[str, dict] = {}
+        self.rows = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def column(self, name: str, seconds: float, values: int, failures: int) -> None:
+        stats = self.columns.get(name)
+        if stats is None:
+            stats = self.columns[name] = {"seconds": 0.0, "values": 0, "failures": 0}
+        stats["seconds"] += seconds
+        stats["values"] += values
+        stats["failures"] += failures
+
+    def report(self) -> dict:
+        ordered = [s for s in STAGES if s in self.stages] + sorted(set(self.stages) - set(STAGES))
+        total = sum(self.stages.values())
+        columns = sorted(self.columns.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        return {
+            "rows": self.rows,
+            "total_ms": round(total * 1000, 2),
+            "stages_ms": {name: round(self.stages[name] * 1000, 2) for name in ordered},
+            "columns": [
+                {
+                    "column": name,
+                    "parse_ms": round(stats["seconds"] * 1000, 2),
+                    "values": stats["values"],
+                    "parse_failures": stats["failures"],
+                }
+                for name, stats in columns
+            ],
+        }
+
+
+NULL_PROFILER = IngestProfiler(enabled=False)
+
+
+@contextmanager
+def cprofile_to_disk(folder: str | None, label: str):
+    """
+    Run the block under cProfile and dump stats to <folder>/<label>-<ts>.prof
+    (open with `python -m pstats` or snakeviz). Yields the dump path, or None
+    when no folder is configured.
+    """
+    if not folder:
+        yield None
+        return
+
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{label}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.prof")
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield path
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
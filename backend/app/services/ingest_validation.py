@@ -0,0 +1,318 @@
+"""
+Validation stage of report ingestion.
+
+validate_frame converts each column of a report DataFrame in one vectorized
+pass and records, per row, why it can't be stored: numbers that don't parse,
+dates that don't parse or aren't plausible, and missing natural-key values.
+ingest_dataframe upserts the rows that pass and hands the rest to
+quarantine(), so one bad line no longer aborts a whole file.
+"""
+
+import json
+import time
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from app.models.quarantine import QuarantinedRow
+from app.services.ingest_profiler import IngestProfiler, NULL_PROFILER
+
+# Tried in order, one vectorized pass each; whatever is left goes through
+# parse_date_safe.
+DATE_FORMATS = ("%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%d-%m-%y", "%d/%m/%y", "%d-%b-%y", "%d-%b-%Y")
+
+# Dates outside [MIN_DATE, today + MAX_YEARS_AHEAD years] are typos.
+MIN_DATE = date(2000, 1, 1)
+MAX_YEARS_AHEAD = 5
+# So is a delivery date this long before the order date.
+MAX_DELIVERY_BEFORE_ORDER = timedelta(days=366)
+
+# Natural-key fields a row can't be stored without; each tuple means "any of".
+REQUIRED_FIELDS = (("so_number", "order_no"), ("part_number",))
+
+QUARANTINE_CHUNK = 1000
+
+
+def parse_date_safe(value):
+    """
+    Try to parse a date from various formats.
+    Return datetime.date or None if failed.
+    """
+    if value is None or pd.isna(value) or str(value).strip() == "":
+        return None
+
+    # If it's already a Timestamp or datetime
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+
+    # Last try: pandas to_datetime
+    try:
+        return pd.to_datetime(text).date()
+    except Exception:
+        return None
+
+
+def _is_text(series: pd.Series) -> bool:
+    return not (
+        pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)
+    )
+
+
+def _blank(series: pd.Series) -> np.ndarray:
+    blank = series.isna().to_numpy()
+    if _is_text(series):
+        blank = blank | (series.astype(str).str.strip() == "").to_numpy()
+    return blank
+
+
+def _as_objects(series: pd.Series) -> pd.Series:
+    """
+    Object Series with None for missing values (what the ORM expects).
+    """
+    return series.astype(object).where(series.notna(), None)
+
+
+def _cell_str(value) -> str:
+    # 30.0 -> "30": a whole number reads the same whether pandas typed its
+    # column as int or (because of a blank) as float
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def convert_str(series: pd.Series) -> pd.Series:
+    return _as_objects(series.map(_cell_str, na_action="ignore"))
+
+
+def convert_number(series: pd.Series, kind: str, blank: np.ndarray) -> tuple[pd.Series, np.ndarray]:
+    """
+    "int" / "float" column -> (values, mask of cells that aren't numbers).
+    Ints are truncated, like int() did; "1,200" is read as 1200.
+    """
+    if _is_text(series):
+        text = series.astype(str).str.replace(",", "", regex=False).str.strip()
+        numbers = pd.to_numeric(text, errors="coerce")
+    else:
+        numbers = pd.to_numeric(series, errors="coerce")
+    numbers = numbers.where(~np.isinf(numbers))
+    bad = numbers.isna().to_numpy() & ~blank
+
+    if kind == "int":
+        return _as_objects(np.trunc(numbers).astype("Int64")), bad
+    return _as_objects(numbers), bad
+
+
+def convert_date(series: pd.Series, blank: np.ndarray) -> tuple[pd.Series, np.ndarray]:
+    """
+    Date column -> (datetime64 values, mask of cells that aren't dates).
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        parsed = series.dt.tz_localize(None) if series.dt.tz is not None else series
+        return parsed, parsed.isna().to_numpy() & ~blank
+
+    parsed = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+    if series.dtype == object:
+        # date / datetime cells (object columns from the Excel reader)
+        stamps = series.map(lambda v: isinstance(v, (datetime, date))).to_numpy(dtype=bool)
+        if stamps.any():
+            parsed[stamps] = pd.to_datetime(series[stamps], errors="coerce")
+    text = series.astype(str).str.strip()
+    for fmt in DATE_FORMATS:
+        pending = parsed.isna().to_numpy() & ~blank
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+
+    pending = parsed.isna().to_numpy() & ~blank
+    if pending.any():
+        # mixed / unusual spellings: one cell at a time
+        parsed[pending] = pd.to_datetime(
+            series[pending].map(parse_date_safe), errors="coerce"
+        )
+    return parsed, parsed.isna().to_numpy() & ~blank
+
+
+class FrameValidation(NamedTuple):
+    fields: pd.DataFrame           # Order field -> converted values, None when missing
+    reasons: dict[int, list[str]]  # row position -> why the row was rejected
+
+    def accepted(self) -> list[dict]:
+        """
+        Field dicts of the rows that passed, in report order.
+        """
+        if not self.reasons:
+            return self.fields.to_dict("records")
+        keep = np.ones(len(self.fields), dtype=bool)
+        keep[list(self.reasons)] = False
+        return self.fields[keep].to_dict("records")
+
+
+def validate_frame(
+    df: pd.DataFrame, columns: list, profiler: IngestProfiler = NULL_PROFILER
+) -> FrameValidation:
+    """
+    Convert a normalized report DataFrame through its column spec and check
+    every row. Raises ValueError when the report lacks a required column
+    altogether (wrong file, not bad rows).
+    """
+    report_columns = {field: column for field, column, _ in columns}
+    for any_of in REQUIRED_FIELDS:
+        if not any(report_columns[field] in df.columns for field in any_of):
+            names = " / ".join(report_columns[field] for field in any_of)
+            raise ValueError(f"Report has no {names} column")
+
+    latest = pd.Timestamp(date.today()) + pd.DateOffset(years=MAX_YEARS_AHEAD)
+    earliest = pd.Timestamp(MIN_DATE)
+
+    fields: dict[str, pd.Series] = {}
+    dates: dict[str, pd.Series] = {}
+    converted: dict[tuple, tuple] = {}
+    # (row mask, message for a row position)
+    problems: list[tuple[np.ndarray, object]] = []
+
+    for field, column, kind in columns:
+        key = (column, kind)
+        if key in converted:
+            # one report column feeding two fields is converted (and checked) once
+            fields[field], parsed = converted[key]
+            if parsed is not None:
+                dates[field] = parsed
+            continue
+
+        if column in df.columns:
+            series = df[column]
+        else:
+            series = pd.Series(None, index=df.index, dtype=object)
+
+        started = time.perf_counter()
+        blank = _blank(series)
+        parsed = bad = None
+
+        if kind == "raw":
+            values = _as_objects(series)
+        elif kind == "str":
+            values = convert_str(series)
+        elif kind == "date":
+            parsed, bad = convert_date(series, blank)
+            dates[field] = parsed
+            values = _as_objects(parsed.dt.date)
+
+            out_of_range = ((parsed < earliest) | (parsed > latest)).to_numpy()
+            if out_of_range.any():
+                problems.append((
+                    out_of_range,
+                    lambda i, c=column, p=parsed: (
+                        f"{c}: {p.iloc[i].date()} is outside {MIN_DATE}..{latest.date()}"
+                    ),
+                ))
+        else:
+            values, bad = convert_number(series, kind, blank)
+
+        if bad is not None and bad.any():
+            what = "date" if kind == "date" else "number"
+            problems.append((
+                bad,
+                lambda i, c=column, s=series, w=what: f"{c}: {s.iloc[i]!r} is not a {w}",
+            ))
+
+        if profiler.enabled:
+            profiler.column(
+                column,
+                time.perf_counter() - started,
+                values=len(series),
+                failures=int(bad.sum()) if bad is not None else 0,
+            )
+        fields[field] = values
+        converted[key] = (values, parsed)
+
+    for any_of in REQUIRED_FIELDS:
+        missing = np.logical_and.reduce([fields[field].isna().to_numpy() for field in any_of])
+        if missing.any():
+            names = " / ".join(report_columns[field] for field in any_of)
+            problems.append((missing, lambda i, n=names: f"missing {n}"))
+
+    if "delivery_date" in dates and "order_date" in dates:
+        delivery, ordered = dates["delivery_date"], dates["order_date"]
+        early = ((ordered - delivery) > MAX_DELIVERY_BEFORE_ORDER).to_numpy()
+        if early.any():
+            problems.append((
+                early,
+                lambda i: (
+                    f"{report_columns['delivery_date']} {delivery.iloc[i].date()} is more than "
+                    f"a year before {report_columns['order_date']} {ordered.iloc[i].date()}"
+                ),
+            ))
+
+    reasons: dict[int, list[str]] = {}
+    for mask, describe in problems:
+        for position in np.flatnonzero(mask):
+            reasons.setdefault(int(position), []).append(describe(position))
+
+    frame = pd.DataFrame(fields)
+    frame.index = range(len(frame))
+    return FrameValidation(frame, reasons)
+
+
+def row_number(df: pd.DataFrame, position: int) -> int:
+    """
+    Report line of a row. Frames are indexed by data row with the header on
+    line 1 (the Excel reader offsets its index to keep that true).
+    """
+    return int(df.index[position]) + 2
+
+
+def quarantine(
+    db: Session,
+    df: pd.DataFrame,
+    reasons: dict[int, list[str]],
+    source_type: str,
+    plant_id: int,
+    source_file: str | None = None,
+    replace: bool = True,
+) -> int:
+    """
+    Store rejected rows with their reasons, replacing earlier rejects of the
+    same file (unless `replace` is off, for later chunks of one file).
+    Returns the number of rows quarantined. Does not commit.
+    """
+    if source_file is not None and replace:
+        db.execute(
+            delete(QuarantinedRow).where(
+                QuarantinedRow.plant_id == plant_id,
+                QuarantinedRow.source_type == source_type,
+                QuarantinedRow.source_file == source_file,
+            )
+        )
+    if not reasons:
+        return 0
+
+    positions = sorted(reasons)
+    rejected = df.iloc[positions]
+    rejected = rejected.astype(object).where(rejected.notna(), None)
+    records = [
+        {
+            "plant_id": plant_id,
+            "source_type": source_type,
+            "source_file": source_file,
+            "row_number": row_number(df, position),
+            "reasons": json.dumps(reasons[position]),
+            "payload": json.dumps(values, default=str),
+        }
+        for position, values in zip(positions, rejected.to_dict("records"))
+    ]
+    for start in range(0, len(records), QUARANTINE_CHUNK):
+        db.execute(insert(QuarantinedRow), records[start:start + QUARANTINE_CHUNK])
+    return len(records)
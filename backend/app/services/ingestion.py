@@ -0,0 +1,619 @@
+"""
+Report ingestion pipeline: read a Sales Order Outstanding / Delivery report,
+validate it through its column spec (see ingest_validation), quarantine the
+rows that fail and upsert the rest into orders.
+
+This is the only module that needs pandas; API modules import it lazily so
+read-only workers never pay for it.
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Iterator, NamedTuple
+
+import pandas as pd
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.events import record_bulk_change
+from app.models.order import Order
+from app.services.change_feed import next_change_seq
+from app.services.dimensions import resolve_dimension_keys
+from app.services.ingest_profiler import IngestProfiler, NULL_PROFILER
+from app.services.ingest_validation import quarantine, row_number, validate_frame
+from app.services.snapshot import OutstandingSnapshot
+
+# file extension -> reader; CSV may come gzip- or zstd-compressed
+REPORT_FORMATS = {
+    ".csv": "csv",
+    ".csv.gz": "csv",
+    ".csv.zst": "csv",
+    ".xlsx": "excel",
+    ".xlsm": "excel",
+    ".xls": "excel",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+}
+TABLE_EXTENSIONS = tuple(REPORT_FORMATS)
+# read with the streaming reader (openpyxl can't open legacy .xls)
+STREAMED_EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+
+# leading bytes of a compressed stream -> pandas compression name
+_COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+
+# an Order's natural key: a re-uploaded report row updates the order it matches
+NATURAL_KEY = ("plant_id", "source_type", "so_number", "order_no", "po_serial", "part_number", "delivery_date")
+# so_numbers per natural-key lookup (well under SQLite's bound-parameter limit)
+LOOKUP_CHUNK = 500
+# rows per bulk INSERT / UPDATE statement
+WRITE_CHUNK = 5000
+
+
+def _natural_key(data: dict) -> tuple:
+    return tuple(data.get(field) for field in NATURAL_KEY)
+
+
+def existing_order_ids(db: Session, rows: list[dict]) -> dict[tuple, int]:
+    """
+    Natural key -> id of the existing orders matching a batch of Order
+    values dicts (a missing key field matches NULL). One query per
+    LOOKUP_CHUNK so_numbers, through ix_orders_plant_natural_key; the rest
+    of the key is compared here. Where several orders share a key, the
+    oldest wins.
+    """
+    scopes: dict[tuple, set] = {}
+    for data in rows:
+        scopes.setdefault((data.get("plant_id"), data.get("source_type")), set()).add(data.get("so_number"))
+
+    key_columns = [getattr(Order, field) for field in NATURAL_KEY]
+    found: dict[tuple, int] = {}
+    for (plant_id, source_type), so_numbers in scopes.items():
+        values = sorted(so_numbers - {None})
+        conditions = [Order.so_number.in_(values[i:i + LOOKUP_CHUNK]) for i in range(0, len(values), LOOKUP_CHUNK)]
+        if None in so_numbers:
+            conditions.append(Order.so_number.is_(None))
+        for condition in conditions:
+            result = db.execute(
+                select(Order.id, *key_columns)
+                .where(Order.plant_id == plant_id, Order.source_type == source_type, condition)
+                .order_by(Order.id)
+            )
+            for order_id, *key in result:
+                found.setdefault(tuple(key), order_id)
+    return found
+
+
+def upsert_orders(db: Session, rows: list[dict], profiler: IngestProfiler = NULL_PROFILER) -> int:
+    """
+    Insert or update Orders from a batch of values dicts, matched on
+    NATURAL_KEY so daily re-uploads are idempotent; a row repeating an
+    earlier row's key overwrites it. One lookup per LOOKUP_CHUNK keys, then
+    bulk INSERT / UPDATE statements. Those bypass flush events, so the batch
+    takes its change_seq and joins the ingest notice explicitly (as
+    snapshot close-out does). Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    started = time.perf_counter()
+
+    for data in rows:
+        resolve_dimension_keys(db, data)
+    ids = existing_order_ids(db, rows)
+
+    looked_up = time.perf_counter()
+    profiler.add("lookup", looked_up - started)
+
+    seq = next_change_seq(db)
+    now = datetime.utcnow()
+    inserts: dict[tuple, dict] = {}
+    updates: dict[int, dict] = {}
+    for data in rows:
+        key = _natural_key(data)
+        values = {**data, "change_seq": seq, "last_updated_at": now}
+        order_id = ids.get(key)
+        if order_id is None:
+            inserts[key] = values
+        else:
+            updates[order_id] = {**values, "id": order_id}
+
+    for batch, statement in ((list(inserts.values()), insert(Order)), (list(updates.values()), update(Order))):
+        for start in range(0, len(batch), WRITE_CHUNK):
+            db.execute(statement, batch[start:start + WRITE_CHUNK])
+
+    written = len(inserts) + len(updates)
+    record_bulk_change(
+        db,
+        written,
+        {data["source_type"] for data in rows},
+        {data["financial_year"] for data in rows} - {None},
+        {data["plant_id"] for data in rows},
+    )
+    profiler.add("write", time.perf_counter() - looked_up)
+    return written
+
+
+def resolve_plant_id(plant_id: int | None) -> int:
+    """
+    Ingests that don't name a plant go to DEFAULT_PLANT_ID.
+    """
+    return settings.DEFAULT_PLANT_ID if plant_id is None else plant_id
+
+
+def detect_financial_year(date_value: datetime | None) -> str | None:
+    """
+    Given a date, return financial year like '2024-2025'.
+    Assuming FY starts in April (month 4).
+    """
+    if not date_value:
+        return None
+    year = date_value.year
+    if date_value.month >= 4:
+        return f"{year}-{year + 1}"
+    else:
+        return f"{year - 1}-{year}"
+
+
+# Column specs: (Order field, report column, kind).
+# kind is one of "str", "int", "float", "date" or "raw" (stored as-is).
+
+OUTSTANDING_COLUMNS = [
+    ("so_number", "S/O No", "str"),
+    ("so_date", "S/O Date", "date"),
+    ("order_no", "Order No", "str"),
+    ("order_date", "Order Date", "date"),
+    ("po_serial", "PO Srl", "str"),
+
+    ("customer_name", "Buyer Name", "raw"),
+    ("customer_code", "Cust Code", "str"),
+
+    ("style_no", "Style No", "str"),
+    ("item_code", "Item Code", "str"),
+    ("drawing_no", "Drg.No", "str"),
+    ("size", "Size", "str"),
+
+    # For now, we treat Item Code as the main part number
+    ("part_number", "Item Code", "str"),
+
+    ("order_qty", "Order Qty", "int"),
+    ("pack_qty", "Pack Qty", "int"),
+    ("sale_qty", "Sale Qty", "int"),
+    ("cancel_qty", "Cncl.Qty", "int"),
+    ("os_order_qty", "O/S Ord.Qty", "int"),
+
+    ("unit", "Unit", "str"),
+
+    ("rate", "Rate", "float"),
+    ("gross_value", "Gross Value", "float"),
+    ("currency", "Currency", "str"),
+    ("currency_value", "Currency Value", "float"),
+
+    ("delivery_date", "Delivery Date", "date"),
+    ("commitment_date", "Commitment Dt", "date"),
+
+    ("packslip_no", "Pack Slip No", "str"),
+    ("packslip_date", "Pack Slip Dt", "date"),
+
+    ("department", "Department", "str"),
+    ("department_remark", "Dept.Remark", "str"),
+
+    ("payment_term", "Payment Term", "str"),
+    ("so_comment", "S.O Comment", "str"),
+    ("so_special_remark", "SO SPL.Remark", "str"),
+    ("die_indent", "DIE Indend", "str"),
+
+    ("item_description", "Item Description", "str"),
+]
+
+DELIVERY_COLUMNS = [
+    ("so_number", "S.O No", "str"),
+    ("so_date", "S.O Date", "date"),
+    ("order_no", "Order No", "str"),
+    ("order_date", "Order Dt.", "date"),
+    ("po_serial", "P Srl", "str"),
+
+    ("customer_name", "Party Name", "raw"),
+    ("customer_code", "Cust Code", "str"),
+
+    ("met_code", "Met Code", "str"),
+    ("product_code", "Produce Code", "str"),
+    ("drawing_no", "Drg.No", "str"),
+    ("size", "Size", "str"),
+
+    # For delivery, we treat Produce Code as main part number
+    ("part_number", "Produce Code", "str"),
+
+    ("quantity", "Quantity", "int"),
+    ("unit", "Unit", "str"),
+    ("net_kg", "Net (Kg)", "float"),
+    ("part_full", "Part/Full", "str"),
+
+    ("rate", "Rate", "float"),
+    ("amount", "Amount", "float"),
+    ("freight_amount", "Frt.Amount", "float"),
+
+    # you can later split by space or '/' if format is consistent
+    ("packslip_no", "Packslip No & Date", "str"),
+    ("packslip_date", "Pack Slip Dt", "date"),
+
+    ("invoice_no", "Invoice No", "str"),
+    ("invoice_date", "Date", "date"),
+
+    ("transporter", "Transporter", "str"),
+    ("docket_no", "Docket No", "str"),
+    ("docket_date", "Docket Dt", "date"),
+
+    ("freight_mode", "Frt.Mode", "str"),
+    ("from_station", "From Station", "str"),
+    ("to_station", "To Station", "str"),
+    ("package_details", "Package Details", "str"),
+    ("gross_weight", "Gross Wt", "float"),
+    ("charge_weight", "Charge Wt.", "float"),
+    ("insurance_mode", "Insurance Mode", "str"),
+
+    ("delivery_date", "Delv Date", "date"),
+    ("department", "Department", "str"),
+    ("state_code", "State Code", "str"),
+
+    ("sub_head", "Sub Head", "str"),
+    ("item_description", "Description", "str"),
+]
+
+def outstanding_order_values(fields: dict, plant_id: int) -> dict:
+    """
+    Order values for one validated 'Sales Order Outstanding' row
+    (OUTSTANDING_COLUMNS fields).
+    """
+    data = {
+        "plant_id": plant_id,
+        "source_type": "OUTSTANDING",
+        "status": "PENDING",
+        **fields,
+    }
+    data["financial_year"] = detect_financial_year(
+        data["order_date"] or data["so_date"] or data["delivery_date"]
+    )
+    return data
+
+
+def delivery_order_values(fields: dict, plant_id: int) -> dict:
+    """
+    Order values for one validated 'Delivery Report' row (DELIVERY_COLUMNS
+    fields).
+    """
+    data = {
+        "plant_id": plant_id,
+        "source_type": "DELIVERY",
+        "status": "DISPATCHED",
+        **fields,
+    }
+    data["financial_year"] = detect_financial_year(
+        data["order_date"] or data["so_date"] or data["delivery_date"] or data["invoice_date"]
+    )
+    return data
+
+
+# report type -> (column spec, row -> Order values, Order.source_type)
+REPORTS = {
+    "outstanding": (OUTSTANDING_COLUMNS, outstanding_order_values, "OUTSTANDING"),
+    "delivery": (DELIVERY_COLUMNS, delivery_order_values, "DELIVERY"),
+}
+
+
+class IngestResult(NamedTuple):
+    rows: int         # rows upserted
+    quarantined: int  # rows rejected by validation
+    rejects: list     # first MAX_REPORTED_REJECTS of them: {"row", "reasons"}
+
+
+MAX_REPORTED_REJECTS = 20
+
+
+def ingest_dataframe(
+    db: Session,
+    df: pd.DataFrame,
+    report_type: str,
+    profiler: IngestProfiler = NULL_PROFILER,
+    plant_id: int | None = None,
+    source_file: str | None = None,
+    replace_quarantine: bool = True,
+    snapshot: OutstandingSnapshot | None = None,
+) -> IngestResult:
+    """
+    Validate a normalized report DataFrame, quarantine the rows that fail and
+    upsert the rest. Raises ValueError if the report is missing a key column
+    altogether. Does not commit.
+
+    Pass replace_quarantine=False for the second and later chunks of a file,
+    so they add to its quarantined rows instead of replacing them. With an
+    Outstanding `snapshot`, every row's natural key is recorded in it.
+    """
+    columns, order_values, source_type = REPORTS[report_type]
+    plant_id = resolve_plant_id(plant_id)
+
+    with profiler.stage("validate"):
+        validation = validate_frame(df, columns, profiler)
+        quarantined = quarantine(
+            db, df, validation.reasons, source_type, plant_id, source_file, replace_quarantine
+        )
+        if snapshot is not None:
+            snapshot.add(validation.fields)
+
+    lookup_before = profiler.stages.get("lookup", 0.0)
+    write_before = profiler.stages.get("write", 0.0)
+    started = time.perf_counter()
+
+    rows = [order_values(fields, plant_id) for fields in validation.accepted()]
+    upsert_orders(db, rows, profiler)
+    rows_processed = len(rows)
+
+    if profiler.enabled:
+        # everything that wasn't the key lookup or the bulk writes is mapping
+        loop = time.perf_counter() - started
+        lookup = profiler.stages.get("lookup", 0.0) - lookup_before
+        write = profiler.stages.get("write", 0.0) - write_before
+        profiler.add("map", loop - lookup - write)
+        profiler.rows += rows_processed
+
+    rejects = [
+        {"row": row_number(df, position), "reasons": reasons}
+        for position, reasons in sorted(validation.reasons.items())[:MAX_REPORTED_REJECTS]
+    ]
+    return IngestResult(rows_processed, quarantined, rejects)
+
+
+def report_format(file_name: str) -> str | None:
+    """
+    "csv", "excel", "parquet" or "arrow" from a report's file name; None if
+    it isn't a report format we read.
+    """
+    name = file_name.lower()
+    for extension, fmt in REPORT_FORMATS.items():
+        if name.endswith(extension):
+            return fmt
+    return None
+
+
+def _normalize_columns(df: pd.DataFrame, profiler: IngestProfiler) -> pd.DataFrame:
+    with profiler.stage("normalize"):
+        # Normalize column names: strip spaces
+        df.columns = [str(col).strip() for col in df.columns]
+    return df
+
+
+def _sniff_compression(fileobj) -> str | None:
+    head = fileobj.read(4)
+    fileobj.seek(0)
+    for magic, compression in _COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def read_arrow_table(source, fmt: str):
+    """
+    Parquet / Arrow IPC (file or stream) report -> pyarrow Table. Paths are
+    memory-mapped, so uncompressed Arrow columns are never copied.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    memory_map = isinstance(source, str)
+    if fmt == "parquet":
+        return pq.read_table(source, memory_map=memory_map)
+    try:
+        return feather.read_table(source, memory_map=memory_map)
+    except pa.ArrowInvalid:
+        # not the IPC file format; try the streaming one
+        if memory_map:
+            source = pa.memory_map(source)
+        else:
+            source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+
+def arrow_to_frame(table) -> pd.DataFrame:
+    """
+    Typed pyarrow Table -> DataFrame. Dates and timestamps stay datetime64,
+    so validation never parses them from text.
+    """
+    import pyarrow as pa
+
+    for i, field in enumerate(table.schema):
+        # dictionary-encoded strings would come out as Categoricals
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table.to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
+
+
+def read_csv(fileobj, profiler: IngestProfiler = NULL_PROFILER) -> pd.DataFrame:
+    """
+    Read an uploaded CSV (plain, gzip or zstd) into a DataFrame with
+    normalized column names.
+    """
+    with profiler.stage("read"):
+        # Read CSV into DataFrame
+        df = pd.read_csv(fileobj, compression=_sniff_compression(fileobj))
+
+    return _normalize_columns(df, profiler)
+
+
+def read_upload(fileobj, file_name: str, profiler: IngestProfiler = NULL_PROFILER) -> pd.DataFrame:
+    """
+    Read an uploaded CSV / Parquet / Arrow report. Raises ValueError for
+    other file types.
+    """
+    fmt = report_format(file_name)
+    if fmt == "csv":
+        return read_csv(fileobj, profiler)
+    if fmt not in ("parquet", "arrow"):
+        raise ValueError("Please upload a CSV, Parquet or Arrow file")
+
+    with profiler.stage("read"):
+        df = arrow_to_frame(read_arrow_table(fileobj, fmt))
+    return _normalize_columns(df, profiler)
+
+
+def read_table(path: str, profiler: IngestProfiler = NULL_PROFILER) -> pd.DataFrame:
+    """
+    Read a report file from disk with normalized column names.
+    """
+    fmt = report_format(path)
+    with profiler.stage("read"):
+        if fmt in ("parquet", "arrow"):
+            df = arrow_to_frame(read_arrow_table(path, fmt))
+        elif fmt == "csv":
+            # compression inferred from .gz / .zst
+            df = pd.read_csv(path)
+        else:
+            # legacy .xls (see read_chunks for .xlsx)
+            df = pd.read_excel(path)
+    return _normalize_columns(df, profiler)
+
+
+def known_report_columns() -> set[str]:
+    return {column for _, column, _ in OUTSTANDING_COLUMNS + DELIVERY_COLUMNS}
+
+
+def read_chunks(path: str, profiler: IngestProfiler = NULL_PROFILER) -> Iterator[pd.DataFrame]:
+    """
+    A report file as normalized DataFrames: .xlsx is streamed in
+    EXCEL_CHUNK_ROWS-row chunks (junk rows above the header skipped), every
+    other format comes back as one frame.
+    """
+    if not path.lower().endswith(STREAMED_EXCEL_EXTENSIONS):
+        yield read_table(path, profiler)
+        return
+
+    from app.services.excel_reader import ExcelReport
+
+    with ExcelReport(path, known_report_columns()) as report:
+        for chunk in report.chunks(settings.EXCEL_CHUNK_ROWS, profiler):
+            yield chunk
+
+
+def read_columns(path: str) -> list[str]:
+    """
+    Header of a report file, without reading its rows.
+    """
+    fmt = report_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            try:
+                return pa.ipc.open_file(source).schema.names
+            except pa.ArrowInvalid:
+                source.seek(0)
+                return pa.ipc.open_stream(source).schema.names
+    if fmt == "csv":
+        return list(pd.read_csv(path, nrows=0).columns)
+    if path.lower().endswith(STREAMED_EXCEL_EXTENSIONS):
+        from app.services.excel_reader import ExcelReport
+
+        with ExcelReport(path, known_report_columns()) as report:
+            return report.columns
+    return list(pd.read_excel(path, nrows=0).columns)
+
+
+def ingest_snapshot_file(
+    db: Session,
+    path: str,
+    profiler: IngestProfiler = NULL_PROFILER,
+    plant_id: int | None = None,
+) -> tuple[IngestResult, int]:
+    """
+    Ingest one Outstanding export as a full snapshot: upsert its rows, then
+    close the plant's PENDING Outstanding orders it no longer lists.
+    Returns (ingest result, orders closed). Does not commit.
+    """
+    snapshot = OutstandingSnapshot(db, resolve_plant_id(plant_id))
+    result = ingest_file(db, path, "outstanding", profiler, plant_id, snapshot)
+    return result, snapshot.close_vanished()
+
+
+def ingest_file(
+    db: Session,
+    path: str,
+    report_type: str,
+    profiler: IngestProfiler = NULL_PROFILER,
+    plant_id: int | None = None,
+    snapshot: OutstandingSnapshot | None = None,
+) -> IngestResult:
+    """
+    Ingest one report file ("outstanding" or "delivery") for a plant
+    (default DEFAULT_PLANT_ID), chunk by chunk for streamed formats.
+    Keys go into `snapshot` when given; closing vanished lines is left to
+    the caller. Does not commit.
+    """
+    source_file = os.path.basename(path)
+    rows = quarantined = 0
+    rejects: list = []
+
+    for i, chunk in enumerate(read_chunks(path, profiler)):
+        ingested = ingest_dataframe(
+            db, chunk, report_type, profiler, plant_id, source_file,
+            replace_quarantine=(i == 0), snapshot=snapshot,
+        )
+        rows += ingested.rows
+        quarantined += ingested.quarantined
+        rejects += ingested.rejects[:MAX_REPORTED_REJECTS - len(rejects)]
+
+    return IngestResult(rows, quarantined, rejects)
+
+
+# Headers that only appear in one of the two reports.
+_REPORT_MARKERS = {
+    "outstanding": {"Buyer Name", "O/S Ord.Qty", "S/O No"},
+    "delivery": {"Party Name", "Delv Date", "Invoice No"},
+}
+
+
+def detect_report_type(path: str) -> str:
+    """
+    Decide whether a report file is "outstanding" or "delivery": from the
+    file name when it says so, otherwise from its header row.
+    """
+    name = os.path.basename(path).lower()
+    if "outstanding" in name:
+        return "outstanding"
+    if "deliver" in name:
+        return "delivery"
+
+    columns = {str(col).strip() for col in read_columns(path)}
+
+    for report_type, markers in _REPORT_MARKERS.items():
+        if columns & markers:
+            return report_type
+    raise ValueError(f"Cannot tell which report {os.path.basename(path)} is")
+
+
+def list_report_files(folder: str) -> list[str]:
+    """
+    Report files (see REPORT_FORMATS) directly inside `folder` (created if
+    missing), oldest first by modification time, then by name. Later
+    exports must be ingested last: the upsert keeps the last file's values,
+    and a snapshot closes whatever that file no longer lists.
+    """
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for entry in os.scandir(folder):
+        if not entry.name.lower().endswith(TABLE_EXTENSIONS):
+            continue
+        try:
+            files.append((entry.stat().st_mtime, entry.name, entry.path))
+        except FileNotFoundError:
+            # moved away by another sweep since the listing
+            continue
+    return [path for _, _, path in sorted(files)]
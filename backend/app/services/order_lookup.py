@@ -0,0 +1,116 @@
+"""
+Batched exact lookup behind POST /orders/lookup.
+
+Each requested field is resolved with indexed IN lists (chunked to stay under
+driver parameter limits) instead of one ILIKE scan per pasted value. Part
+numbers go through the parts dimension, so they match case- and
+whitespace-insensitively like everywhere else; the other fields match
+exactly after trimming.
+
+A window function keeps at most limit_per_key + 1 orders per value in the
+database, so a part with thousands of orders doesn't come back whole just
+to be cut to the limit.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.dimension import Part
+from app.models.order import Order
+from app.services.dimensions import dimension_key
+
+LOOKUP_FIELDS = ("order_no", "so_number", "po_serial", "part_number")
+MAX_LOOKUP_VALUES = 2000
+IN_CHUNK = 500
+
+
+def _chunks(values: list) -> list[list]:
+    return [values[i:i + IN_CHUNK] for i in range(0, len(values), IN_CHUNK)]
+
+
+def _scoped(query, plant_id: int | None, status: str | None, source_type: str | None):
+    if plant_id is not None:
+        query = query.filter(Order.plant_id == plant_id)
+    if status:
+        query = query.filter(Order.status == status.upper())
+    if source_type:
+        query = query.filter(Order.source_type == source_type.upper())
+    return query
+
+
+def _orders_by_match(db: Session, column, matches: list, scope: dict, limit_per_key: int) -> dict:
+    """
+    {match value: orders newest first (at most limit_per_key + 1)}.
+    """
+    found: dict = {}
+    for chunk in _chunks(matches):
+        rank = func.row_number().over(partition_by=column, order_by=Order.id.desc()).label("row_rank")
+        ranked = _scoped(
+            db.query(Order.id.label("id"), rank).filter(column.in_(chunk)), **scope
+        ).subquery()
+        rows = (
+            db.query(Order)
+            .join(ranked, ranked.c.id == Order.id)
+            .filter(ranked.c.row_rank <= limit_per_key + 1)
+            .order_by(Order.id.desc())
+        )
+        for order in rows:
+            found.setdefault(getattr(order, column.key), []).append(order)
+    return found
+
+
+def lookup_orders(
+    db: Session,
+    values: dict[str, list[str]],
+    limit_per_key: int,
+    plant_id: int | None = None,
+    status: str | None = None,
+    source_type: str | None = None,
+) -> dict:
+    """
+    Orders per input value for each field in LOOKUP_FIELDS, plus the values
+    nothing matched and those with more than limit_per_key orders.
+    Raises ValueError past MAX_LOOKUP_VALUES distinct values.
+    """
+    inputs = {
+        field: list(dict.fromkeys(v.strip() for v in values.get(field) or () if v and v.strip()))
+        for field in LOOKUP_FIELDS
+    }
+    if sum(len(v) for v in inputs.values()) > MAX_LOOKUP_VALUES:
+        raise ValueError(f"At most {MAX_LOOKUP_VALUES} values per lookup")
+
+    scope = {"plant_id": plant_id, "status": status, "source_type": source_type}
+    results: dict[str, dict[str, list]] = {}
+    not_found: dict[str, list[str]] = {}
+    truncated: dict[str, list[str]] = {}
+
+    for field, wanted in inputs.items():
+        if not wanted:
+            continue
+
+        if field == "part_number":
+            # input -> dimension key -> part id
+            keys = {value: dimension_key(value) for value in wanted}
+            part_ids = {}
+            for chunk in _chunks(sorted(set(keys.values()))):
+                part_ids.update(db.query(Part.key, Part.id).filter(Part.key.in_(chunk)).all())
+            match_of = {value: part_ids.get(key) for value, key in keys.items()}
+            column = Order.part_id
+        else:
+            match_of = {value: value for value in wanted}
+            column = getattr(Order, field)
+
+        matches = sorted({m for m in match_of.values() if m is not None})
+        found = _orders_by_match(db, column, matches, scope, limit_per_key)
+
+        results[field] = {}
+        for value in wanted:
+            orders = found.get(match_of[value], [])
+            if not orders:
+                not_found.setdefault(field, []).append(value)
+                continue
+            if len(orders) > limit_per_key:
+                truncated.setdefault(field, []).append(value)
+            results[field][value] = orders[:limit_per_key]
+
+    return {"results": results, "not_found": not_found, "truncated": truncated}
@@ -0,0 +1,132 @@
+"""
+Snapshot mode for Sales Order Outstanding ingests.
+
+An Outstanding export lists every line that is still open. In snapshot mode
+the natural keys of all rows of the export (quarantined ones included) are
+loaded into a temporary table as the file is ingested; afterwards one UPDATE
+closes the plant's PENDING Outstanding orders that have no matching key, so
+lines that were delivered or cancelled in the ERP leave /orders/open instead
+of staying PENDING forever. A closed line that shows up in a later export is
+reopened by the normal upsert.
+
+A row whose delivery date couldn't be read is matched on the rest of its key,
+so a quarantined typo never closes the order it refers to.
+
+Missing string keys are stored as '' and compared against coalesce(col, ''),
+and the key table is indexed and analyzed before the diff, so the anti-join
+is an index (or hash) lookup per open order rather than a nested loop over
+every snapshot row.
+"""
+
+import logging
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import Column, Date, MetaData, String, Table, exists, func, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from app.core.events import record_bulk_change
+from app.models.order import Order
+from app.services.change_feed import next_change_seq
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUS = "CLOSED"
+STRING_KEY_FIELDS = ("so_number", "order_no", "po_serial", "part_number")
+KEY_FIELDS = STRING_KEY_FIELDS + ("delivery_date",)
+INSERT_CHUNK = 5000
+
+snapshot_keys = Table(
+    "snapshot_keys",
+    MetaData(),
+    Column("so_number", String),
+    Column("order_no", String),
+    Column("po_serial", String),
+    Column("part_number", String),
+    Column("delivery_date", Date),
+    prefixes=["TEMPORARY"],
+)
+
+
+class OutstandingSnapshot:
+    """
+    Natural keys of one full Outstanding export for one plant. Lives in the
+    session's transaction: create, add() every chunk, then close_vanished().
+    """
+
+    def __init__(self, db: Session, plant_id: int) -> None:
+        self.db = db
+        self.plant_id = plant_id
+        self.keys = 0
+        conn = db.connection()
+        # temp tables outlive the transaction on a pooled connection
+        conn.execute(text("DROP TABLE IF EXISTS snapshot_keys"))
+        snapshot_keys.create(conn)
+
+    def add(self, fields: pd.DataFrame) -> None:
+        """
+        Record the keys of a validated chunk (FrameValidation.fields).
+        """
+        keys = fields[list(KEY_FIELDS)].drop_duplicates().to_dict("records")
+        for key in keys:
+            for field in STRING_KEY_FIELDS:
+                if key[field] is None:
+                    key[field] = ""
+        for start in range(0, len(keys), INSERT_CHUNK):
+            self.db.execute(snapshot_keys.insert(), keys[start:start + INSERT_CHUNK])
+        self.keys += len(keys)
+
+    def close_vanished(self) -> int:
+        """
+        Close PENDING Outstanding orders of the plant missing from the
+        snapshot, in one statement. Returns the number of orders closed.
+        An empty snapshot closes nothing (a truncated export is not "every
+        order was delivered").
+        """
+        db = self.db
+        try:
+            if not self.keys:
+                logger.warning("Empty Outstanding snapshot for plant %s; nothing closed", self.plant_id)
+                return 0
+
+            conn = db.connection()
+            # indexed once loaded: cheaper than maintaining it through the inserts
+            conn.execute(text(f"CREATE INDEX ix_snapshot_keys ON snapshot_keys ({', '.join(KEY_FIELDS)})"))
+            conn.execute(text("ANALYZE snapshot_keys"))
+
+            k = snapshot_keys.c
+            same_key = [
+                k[field] == func.coalesce(getattr(Order, field), "")
+                for field in STRING_KEY_FIELDS
+            ]
+            # two equality probes instead of one OR inside the subquery
+            listed = or_(
+                exists().where(*same_key, k.delivery_date == Order.delivery_date),
+                exists().where(*same_key, k.delivery_date.is_(None)),
+            )
+            vanished = (
+                (Order.plant_id == self.plant_id)
+                & (Order.source_type == "OUTSTANDING")
+                & (Order.status == "PENDING")
+                & ~listed
+            )
+
+            # pending upserts of this file must be in the table before the diff
+            db.flush()
+            financial_years = set(
+                db.execute(select(Order.financial_year).distinct().where(vanished)).scalars()
+            )
+            if not financial_years:
+                return 0
+
+            seq = next_change_seq(db)
+            closed = db.execute(
+                update(Order.__table__)
+                .where(vanished)
+                .values(status=CLOSED_STATUS, change_seq=seq, last_updated_at=datetime.utcnow())
+            ).rowcount
+            record_bulk_change(db, closed, {"OUTSTANDING"}, financial_years - {None}, {self.plant_id})
+            logger.info("Snapshot closed %d Outstanding orders of plant %s", closed, self.plant_id)
+            return closed
+        finally:
+            db.execute(text("DROP TABLE IF EXISTS snapshot_keys"))
@@ -0,0 +1,307 @@
+"""
+In-memory prefix index behind /orders/suggest.
+
+For each suggestable field (per plant, and for all plants together) the
+index holds every distinct value with its order count, sorted by a
+case/whitespace-insensitive key. A lookup is a bisect to the first key with
+the typed prefix and a top-k by count over the matching run; top-k for one-
+and two-character prefixes (the only runs that get long) is precomputed at
+build time. Queries never touch the database: they read whatever index is
+ready (none right after startup, when they answer with no suggestions).
+
+A background refresher builds the index at startup and then follows the
+orders change sequence, waking on every local ingest notice and otherwise
+polling the counter every CHANGE_CHECK_SECONDS (ingests run by
+`python -m app.worker` with EVENT_BROKER=memory). It remembers each order's
+plant and value codes in flat arrays indexed by order id, so a changed row
+moves its count from the old value to the new one and a deleted row
+(tombstone) takes its count away; only the indexes whose counts moved are
+re-sorted, then swapped in.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from sqlalchemy import select
+
+from app.core.events import on_ingest
+from app.db.session import SessionLocal
+from app.models.dimension import Customer, Part
+from app.models.order import Order
+from app.services.change_feed import current_change_seq, deleted_between
+from app.services.dimensions import dimension_key
+
+logger = logging.getLogger(__name__)
+
+# prefixes up to this length get their top-k precomputed
+PRECOMPUTED_PREFIX_LENGTH = 2
+MAX_SUGGESTIONS = 50
+# how often the refresher looks at the change sequence without a notice
+CHANGE_CHECK_SECONDS = 1.0
+# after a failed build / refresh
+RETRY_SECONDS = 30.0
+# rows per fetch when scanning orders for a build
+BUILD_BATCH_ROWS = 10_000
+
+# field -> (Order column, dimension model whose id the column holds, or None
+# for a plain string coded by the index itself)
+FIELDS = {
+    "customer_name": (Order.customer_id, Customer),
+    "part_number": (Order.part_id, Part),
+    "order_no": (Order.order_no, None),
+}
+
+
+def _order_values():
+    return select(Order.id, Order.plant_id, *(column for column, _ in FIELDS.values()))
+
+
+class PrefixIndex:
+    """
+    Immutable sorted (key, value, count) entries for one field.
+    """
+
+    def __init__(self, counts) -> None:
+        merged: dict[str, list] = {}
+        for value, count in counts:
+            key = dimension_key(value)
+            if key is None:
+                continue
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [value, count]
+            else:
+                entry[1] += count
+
+        entries = sorted((key, value, count) for key, (value, count) in merged.items())
+        self.keys = [key for key, _, _ in entries]
+        self.entries = [(value, count) for _, value, count in entries]
+
+        runs: dict[str, list] = {}
+        for key, entry in zip(self.keys, self.entries):
+            for length in range(1, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                runs.setdefault(key[:length], []).append(entry)
+        self.top = {
+            prefix: heapq.nlargest(MAX_SUGGESTIONS, run, key=lambda e: e[1])
+            for prefix, run in runs.items()
+        }
+
+    def lookup(self, prefix: str, limit: int) -> list[tuple[str, int]]:
+        key = dimension_key(prefix)
+        if key is None:
+            return []
+        if len(key) <= PRECOMPUTED_PREFIX_LENGTH:
+            return self.top.get(key, [])[:limit]
+
+        start = bisect_left(self.keys, key)
+        # everything starting with `key` sorts before key + U+FFFF
+        end = bisect_left(self.keys, key + "\uffff", lo=start)
+        return heapq.nlargest(limit, self.entries[start:end], key=lambda e: e[1])
+
+
+class SuggestState:
+    """
+    Order counts per (field, plant_id or None) by value code, the prefix
+    indexes built from them, and per order id the plant and value codes the
+    counts include (0: no order / no value), as of change sequence `seq`.
+    Only the refresher thread mutates it; queries read `indexes`, which is
+    replaced, never changed in place.
+    """
+
+    def __init__(self) -> None:
+        self.seq = 0
+        self.plants = array("i")
+        self.codes = {field: array("i") for field in FIELDS}
+        self.counts: dict[tuple, dict[int, int]] = {}
+        # field -> code -> spelling; dimension fields use the dimension id
+        # as code, order_no gets codes handed out here
+        self.names: dict[str, dict[int, str]] = {field: {} for field in FIELDS}
+        self._string_codes: dict[str, int] = {}
+        self.indexes: dict[tuple, PrefixIndex] = {}
+
+    def _code(self, field: str, value) -> int:
+        if value is None:
+            return 0
+        if FIELDS[field][1] is not None:
+            return value
+        code = self._string_codes.get(value)
+        if code is None:
+            code = self._string_codes[value] = len(self._string_codes) + 1
+            self.names[field][code] = value
+        return code
+
+    def _count(self, field: str, plant_id: int, code: int, delta: int, touched: set) -> None:
+        for key in ((field, plant_id), (field, None)):
+            counts = self.counts.setdefault(key, {})
+            count = counts.get(code, 0) + delta
+            if count > 0:
+                counts[code] = count
+            else:
+                counts.pop(code, None)
+            touched.add(key)
+
+    def apply(self, order_id: int, plant_id: int | None, values: tuple | None, touched: set) -> None:
+        """
+        Move order `order_id` to (plant_id, values) - in FIELDS order - or,
+        with values None, take it out.
+        """
+        if order_id >= len(self.plants):
+            # at least double, so growing to the highest id stays linear
+            grow = max(order_id + 1 - len(self.plants), len(self.plants))
+            zeros = bytes(self.plants.itemsize * grow)
+            self.plants.frombytes(zeros)
+            for codes in self.codes.values():
+                codes.frombytes(zeros)
+
+        old_plant = self.plants[order_id]
+        new_plant = (plant_id or 0) if values is not None else 0
+        for position, field in enumerate(FIELDS):
+            codes = self.codes[field]
+            old_code = codes[order_id]
+            new_code = self._code(field, values[position]) if values is not None else 0
+            if (old_plant, old_code) == (new_plant, new_code):
+                continue
+            if old_plant and old_code:
+                self._count(field, old_plant, old_code, -1, touched)
+            if new_plant and new_code:
+                self._count(field, new_plant, new_code, 1, touched)
+            codes[order_id] = new_code
+        self.plants[order_id] = new_plant
+
+    def load_names(self, db) -> None:
+        """
+        Spellings of dimension ids counted but not named yet.
+        """
+        for field, (_, model) in FIELDS.items():
+            if model is None:
+                continue
+            names = self.names[field]
+            missing = {
+                code
+                for (f, _), counts in self.counts.items() if f == field
+                for code in counts if code not in names
+            }
+            ids = sorted(missing)
+            for i in range(0, len(ids), 500):
+                names.update(db.execute(select(model.id, model.name).where(model.id.in_(ids[i:i + 500]))).all())
+
+    def reindex(self, keys: set) -> None:
+        indexes = dict(self.indexes)
+        for key in keys:
+            field = key[0]
+            names = self.names[field]
+            counts = self.counts.get(key, {})
+            indexes[key] = PrefixIndex(
+                (names[code], count) for code, count in counts.items() if code in names
+            )
+        # one reference swap: queries see the old or the new indexes, never a mix
+        self.indexes = indexes
+
+
+class SuggestIndex:
+    def __init__(self) -> None:
+        self._state: SuggestState | None = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._started = False
+
+    def start(self) -> None:
+        """
+        Start the background refresher (idempotent); the index is ready once
+        its first build finishes.
+        """
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        on_ingest(self._notify)
+        threading.Thread(target=self._refresh_loop, name="suggest-index", daemon=True).start()
+
+    def _notify(self, notice: dict) -> None:
+        self._wake.set()
+
+    def _build(self) -> SuggestState:
+        started = time.perf_counter()
+        state = SuggestState()
+        touched: set = set()
+        db = SessionLocal()
+        try:
+            # read the high-water mark first: the rows scanned are at least as new
+            state.seq = current_change_seq(db)
+            result = db.execute(_order_values().order_by(Order.id).execution_options(yield_per=BUILD_BATCH_ROWS))
+            for order_id, plant_id, *values in result:
+                state.apply(order_id, plant_id, values, touched)
+            state.load_names(db)
+        finally:
+            db.close()
+        state.reindex({(field, None) for field in FIELDS} | touched)
+        logger.info(
+            "Suggest index built in %.0f ms (%s)",
+            (time.perf_counter() - started) * 1000,
+            ", ".join(f"{field}={len(state.indexes[field, None].keys)}" for field in FIELDS),
+        )
+        return state
+
+    def _catch_up(self, state: SuggestState) -> None:
+        """
+        Apply the orders stamped since state.seq and the deletes in that
+        range, then re-sort the indexes whose counts moved.
+        """
+        db = SessionLocal()
+        try:
+            high = current_change_seq(db)
+            if high == state.seq:
+                return
+            started = time.perf_counter()
+            written = db.execute(
+                _order_values().where(Order.change_seq > state.seq, Order.change_seq <= high)
+            ).all()
+            deleted = deleted_between(db, state.seq, high)
+            touched: set = set()
+            for order_id, plant_id, *values in written:
+                state.apply(order_id, plant_id, values, touched)
+            for order_id in deleted:
+                state.apply(order_id, None, None, touched)
+            state.load_names(db)
+        finally:
+            db.close()
+
+        state.reindex(touched)
+        state.seq = high
+        logger.info(
+            "Suggest index caught up to change %d (%d written, %d deleted) in %.0f ms",
+            high, len(written), len(deleted), (time.perf_counter() - started) * 1000,
+        )
+
+    def _refresh_loop(self) -> None:
+        while True:
+            try:
+                if self._state is None:
+                    self._state = self._build()
+                else:
+                    self._catch_up(self._state)
+            except Exception:
+                logger.exception("Refreshing suggest index failed")
+                time.sleep(RETRY_SECONDS)
+                continue
+            # an ingest notice, or the next look at the counter
+            self._wake.wait(timeout=CHANGE_CHECK_SECONDS)
+            self._wake.clear()
+
+    def indexes(self) -> dict[tuple, PrefixIndex]:
+        state = self._state
+        if state is None:
+            self.start()
+            return {}
+        return state.indexes
+
+    def suggest(self, field: str, prefix: str, limit: int, plant_id: int | None = None) -> list[tuple[str, int]]:
+        index = self.indexes().get((field, plant_id))
+        return index.lookup(prefix, limit) if index else []
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,244 @@
+"""
+Long-running ingestion worker.
+
+Runs as its own process, next to (not inside) the API workers, so ingest CPU
+never competes with dashboard reads:
+
+    python -m app.worker
+
+- Polls IMAP every IMAP_POLL_SECONDS (when IMAP is configured) and files new
+  attachments into DATA_FOLDER/outstanding or DATA_FOLDER/delivery.
+- Watches those two folders by polling. A file is only picked up once its
+  size and mtime have been stable for WORKER_DEBOUNCE_SECONDS, so
+  half-copied uploads are never read.
+- Ready files go through a bounded queue to a single ingest thread, one file
+  and one commit at a time. When the queue is full the watcher (and with it
+  the IMAP poller, which feeds the same folders) simply waits.
+
+Files already ingested are remembered by (size, mtime) in
+DATA_FOLDER/.worker_state.json, so restarts don't re-ingest everything.
+"""
+
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+
+from app.core.config import settings
+from app.db.schema import ensure_schema
+from app.db.session import SessionLocal, engine
+
+logger = logging.getLogger("app.worker")
+
+REPORT_TYPES = ("outstanding", "delivery")
+
+
+class IngestState:
+    """
+    Which files were already ingested, keyed by path -> [size, mtime].
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.files: dict[str, list] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.files = {}
+
+    def is_done(self, path: str, signature: tuple) -> bool:
+        with self._lock:
+            return self.files.get(path) == list(signature)
+
+    def mark_done(self, path: str, signature: tuple) -> None:
+        with self._lock:
+            self.files[path] = list(signature)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.files, f)
+            os.replace(tmp, self.path)
+
+
+class FolderWatcher:
+    """
+    Polling watcher with per-file debouncing.
+    """
+
+    def __init__(self, folders: dict[str, str], state: IngestState, debounce_seconds: float) -> None:
+        self.folders = folders
+        self.state = state
+        self.debounce_seconds = debounce_seconds
+        # path -> (signature, first time we saw this signature)
+        self._candidates: dict[str, tuple[tuple, float]] = {}
+        self._queued: set[str] = set()
+
+    def scan(self) -> list[tuple[str, str, tuple]]:
+        """
+        Return (report_type, path, signature) for files that are new or
+        changed and have stopped changing.
+        """
+        from app.services.ingestion import list_report_files
+
+        now = time.monotonic()
+        ready = []
+        seen = set()
+
+        for report_type, folder in self.folders.items():
+            for path in list_report_files(folder):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime)
+                seen.add(path)
+
+                if path in self._queued or self.state.is_done(path, signature):
+                    continue
+
+                previous = self._candidates.get(path)
+                if previous is None or previous[0] != signature:
+                    # new or still being written: restart the debounce clock
+                    self._candidates[path] = (signature, now)
+                    continue
+                if now - previous[1] >= self.debounce_seconds:
+                    ready.append((report_type, path, signature))
+
+        for path in list(self._candidates):
+            if path not in seen:
+                del self._candidates[path]
+        return ready
+
+    def mark_queued(self, path: str) -> None:
+        self._queued.add(path)
+        self._candidates.pop(path, None)
+
+    def mark_finished(self, path: str) -> None:
+        self._queued.discard(path)
+
+
+class IngestWorker:
+    def __init__(self) -> None:
+        data_folder = settings.DATA_FOLDER
+        self.stop_event = threading.Event()
+        self.state = IngestState(os.path.join(data_folder, ".worker_state.json"))
+        self.watcher = FolderWatcher(
+            {t: os.path.join(data_folder, t) for t in REPORT_TYPES},
+            self.state,
+            settings.WORKER_DEBOUNCE_SECONDS,
+        )
+        # bounded: a burst of files waits on disk, not in memory
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.WORKER_QUEUE_SIZE)
+
+    # ---- producers -------------------------------------------------------
+
+    def watch_loop(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                for item in self.watcher.scan():
+                    self.watcher.mark_queued(item[1])
+                    while not self.stop_event.is_set():
+                        try:
+                            self.queue.put(item, timeout=1)
+                            break
+                        except queue.Full:
+                            continue  # backpressure: wait for the ingest thread
+            except Exception:
+                logger.exception("Folder scan failed")
+            self.stop_event.wait(settings.WORKER_POLL_SECONDS)
+
+    def imap_loop(self) -> None:
+        from app.services.imap_ingestion import fetch_new_attachments, file_report_into_folder
+
+        while not self.stop_event.is_set():
+            try:
+                # only download and file; the folder watcher does the ingest
+                saved = fetch_new_attachments(on_saved=file_report_into_folder)
+                if saved:
+                    logger.info("IMAP: %d new attachment(s)", len(saved))
+            except Exception:
+                logger.exception("IMAP poll failed")
+            self.stop_event.wait(settings.IMAP_POLL_SECONDS)
+
+    # ---- consumer --------------------------------------------------------
+
+    def ingest_loop(self) -> None:
+        from app.services.ingestion import ingest_file, ingest_snapshot_file
+
+        # on shutdown the current file finishes; queued ones are picked up again on restart
+        while not self.stop_event.is_set():
+            try:
+                report_type, path, signature = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            db = SessionLocal()
+            started = time.perf_counter()
+            try:
+                closed = 0
+                if report_type == "outstanding" and settings.OUTSTANDING_SNAPSHOT:
+                    result, closed = ingest_snapshot_file(db, path)
+                else:
+                    result = ingest_file(db, path, report_type)
+                db.commit()
+                logger.info(
+                    "Ingested %s (%s): %d rows, %d quarantined, %d closed in %.1fs",
+                    path, report_type, result.rows, result.quarantined, closed,
+                    time.perf_counter() - started,
+                )
+            except Exception:
+                db.rollback()
+                # don't retry a broken file until it changes on disk
+                logger.exception("Ingest of %s failed", path)
+            finally:
+                db.close()
+                self.state.mark_done(path, signature)
+                self.watcher.mark_finished(path)
+                self.queue.task_done()
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def run(self) -> None:
+        threads = [
+            threading.Thread(target=self.ingest_loop, name="ingest", daemon=True),
+            threading.Thread(target=self.watch_loop, name="watch", daemon=True),
+        ]
+        if settings.IMAP_HOST and settings.IMAP_POLL_SECONDS > 0:
+            threads.append(threading.Thread(target=self.imap_loop, name="imap", daemon=True))
+        else:
+            logger.info("IMAP polling disabled")
+
+        for thread in threads:
+            thread.start()
+        logger.info(
+            "Ingestion worker started (poll %ss, debounce %ss, queue %d)",
+            settings.WORKER_POLL_SECONDS,
+            settings.WORKER_DEBOUNCE_SECONDS,
+            settings.WORKER_QUEUE_SIZE,
+        )
+
+        self.stop_event.wait()
+        logger.info("Stopping; finishing the current file")
+        for thread in threads:
+            thread.join()
+
+    def stop(self, *_args) -> None:
+        self.stop_event.set()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if settings.CREATE_TABLES_ON_STARTUP:
+        ensure_schema(engine)
+
+    worker = IngestWorker()
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Bytes and latency saved by response compression and ETag revalidation.
+
+Fetches typical dashboard payloads (a 500-row search page, the open-orders
+list, the product- and customer-wise analytics lists, the dispatch board)
+with Accept-Encoding identity, gzip and br, then once more with the ETag of
+the first response in If-None-Match. Reports the body size on the wire, the
+median server-side latency of each variant and the estimated transfer time
+over a --link-mbps connection, which is where compression and 304s pay off.
+
+Usage (from the backend/ folder):
+
+    # seed 200k rows into a throwaway SQLite file, then measure in-process
+    python -m scripts.bench_compression --database-url sqlite:///./bench.db --seed 200000
+
+    # measure a running uvicorn (real network, real sockets)
+    python -m scripts.bench_compression --base-url http://127.0.0.1:8000 --link-mbps 20
+
+Seeding reuses scripts.load_test, so the two benchmarks can share a database.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+from scripts.load_test import build_vocabulary, financial_years, make_client, seed_orders
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def payloads(years: int) -> list[tuple[str, str, dict]]:
+    fy = financial_years(years)[-1]
+    return [
+        ("search (limit=500)", "/orders/search", {"limit": 500}),
+        ("open", "/orders/open", {}),
+        ("analytics/product-wise", "/analytics/product-wise", {"financial_year": fy}),
+        ("analytics/customer-wise", "/analytics/customer-wise", {"financial_year": fy}),
+        ("dispatch-board", "/orders/dispatch-board", {}),
+    ]
+
+
+async def _timed(client, path: str, params: dict, headers: dict, repeat: int):
+    """
+    (last response, median latency in ms) of `repeat` sequential requests.
+    """
+    latencies = []
+    response = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get(path, params=params, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return response, statistics.median(latencies)
+
+
+def _wire_bytes(response) -> int:
+    # httpx decodes the body; the header says what was actually sent
+    length = response.headers.get("content-length")
+    return int(length) if length is not None else response.num_bytes_downloaded
+
+
+async def measure(base_url: str | None, work: list, repeat: int) -> list[dict]:
+    rows = []
+    async with make_client(base_url) as client:
+        for label, path, params in work:
+            results = {}
+            etag = None
+            for coding in ENCODINGS:
+                response, ms = await _timed(client, path, params, {"Accept-Encoding": coding}, repeat)
+                if response.status_code != 200:
+                    print(f"WARNING: {label} returned {response.status_code}")
+                    break
+                sent = response.headers.get("content-encoding", "identity")
+                if sent != coding:
+                    # e.g. brotli not installed on the server
+                    continue
+                results[coding] = {"bytes": _wire_bytes(response), "ms": ms}
+                etag = etag or response.headers.get("etag")
+
+            if etag:
+                response, ms = await _timed(
+                    client, path, params,
+                    {"Accept-Encoding": "br, gzip", "If-None-Match": etag}, repeat,
+                )
+                if response.status_code == 304:
+                    results["304"] = {"bytes": 0, "ms": ms}
+            rows.append({"endpoint": label, "results": results})
+    return rows
+
+
+def print_report(rows: list[dict], link_mbps: float) -> None:
+    bytes_per_ms = link_mbps * 1_000_000 / 8 / 1000
+    header = f"{'endpoint':<26}{'variant':>10}{'bytes':>12}{'ratio':>8}{'server ms':>12}{'+ link ms':>12}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        identity = row["results"].get("identity")
+        for variant, r in row["results"].items():
+            ratio = f"{r['bytes'] / identity['bytes']:.2f}" if identity and identity["bytes"] else "-"
+            total = r["ms"] + r["bytes"] / bytes_per_ms
+            print(
+                f"{row['endpoint']:<26}{variant:>10}{r['bytes']:>12,}{ratio:>8}"
+                f"{r['ms']:>12.2f}{total:>12.2f}"
+            )
+    print(f"\n'+ link ms' adds the transfer time of the body at {link_mbps:g} Mbit/s.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure compression and ETag savings on typical payloads.")
+    parser.add_argument("--database-url", help="Overrides DATABASE_URL for seeding and in-process runs")
+    parser.add_argument("--seed", type=int, default=0, help="Insert this many synthetic rows first")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--customers", type=int, default=2_000)
+    parser.add_argument("--parts", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=15, help="Requests per variant (median is reported)")
+    parser.add_argument("--link-mbps", type=float, default=10.0, help="Link speed for the transfer estimate")
+    parser.add_argument("--base-url", help="Hit a running server instead of the in-process app")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        # must be set before app.core.config is imported
+        os.environ["DATABASE_URL"] = args.database_url
+
+    if args.seed:
+        from app.db.session import engine
+
+        vocab = build_vocabulary(random.Random(args.random_seed), args.customers, args.parts)
+        seed_orders(engine, args.seed, vocab, args.random_seed, args.years)
+
+    rows = asyncio.run(measure(args.base_url, payloads(args.years), args.repeat))
+    print_report(rows, args.link_mbps)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"link_mbps": args.link_mbps, "endpoints": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
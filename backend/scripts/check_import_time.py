@@ -0,0 +1,106 @@
+"""
+Import-time regression check for API worker cold start.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter and
+fails (exit code 1) when
+  - any heavy ingestion dependency (pandas, openpyxl, numpy, imaplib) gets
+    imported at startup, or
+  - the total import time exceeds --budget-ms.
+
+tests/test_import_time.py runs the same check under pytest; this script is
+for a look at where the time goes.
+
+Usage (from the backend/ folder):
+
+    python -m scripts.check_import_time --budget-ms 1500
+    python -m scripts.check_import_time --read-replica   # INGESTION_ENABLED=false
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+FORBIDDEN_AT_STARTUP = ("pandas", "numpy", "openpyxl", "imaplib", "pyarrow")
+DEFAULT_BUDGET_MS = 1500.0
+
+
+def measure(module: str, env: dict, runs: int) -> tuple[float, dict[str, int], set[str]]:
+    """
+    Returns (best total ms, self us per top-level package of the best run,
+    every module imported).
+    """
+    best_total = None
+    best_packages: dict[str, int] = {}
+    imported: set[str] = set()
+
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"importing {module} failed")
+
+        total_us = 0
+        packages: dict[str, int] = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, _cumulative_us, raw_name = line[len("import time:"):].split("|")
+            module_name = raw_name.strip()
+            imported.add(module_name)
+            total_us += int(self_us)
+            # attribute self time to the top-level package
+            top = module_name.split(".")[0]
+            packages[top] = packages.get(top, 0) + int(self_us)
+
+        total_ms = total_us / 1000
+        if best_total is None or total_ms < best_total:
+            best_total = total_ms
+            best_packages = packages
+
+    return best_total or 0.0, best_packages, imported
+
+
+def startup_failures(total_ms: float, imported: set[str], budget_ms: float) -> list[str]:
+    failures = []
+    heavy = sorted(m for m in imported if m in FORBIDDEN_AT_STARTUP)
+    if heavy:
+        failures.append(f"heavy ingestion dependencies imported at startup: {', '.join(heavy)}")
+    if total_ms > budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms exceeds budget {budget_ms:.0f} ms")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fail if API startup imports got slower or heavier.")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3, help="Best-of-N to reduce noise")
+    parser.add_argument("--read-replica", action="store_true", help="Measure with INGESTION_ENABLED=false")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    if args.read_replica:
+        env["INGESTION_ENABLED"] = "false"
+
+    total_ms, packages, imported = measure(args.module, env, args.runs)
+
+    print(f"import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+    for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+        print(f"  {us / 1000:9.1f} ms  {name}")
+
+    failures = startup_failures(total_ms, imported, args.budget_ms)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
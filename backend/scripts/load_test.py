@@ -0,0 +1,428 @@
+"""
+Query benchmark and load-test harness for the read endpoints.
+
+Seeds a database with synthetic Order rows, then drives /orders/search
+(with debounced-typing patterns like the dashboard's global search box),
+/orders/open and every /analytics/* endpoint at a configurable concurrency.
+Reports p50/p95/p99 latency, throughput and the EXPLAIN plan of the SQL each
+endpoint runs.
+
+Usage (from the backend/ folder):
+
+    # seed 2M rows into a throwaway SQLite file, then benchmark in-process
+    python -m scripts.load_test --database-url sqlite:///./bench.db --seed 2000000
+
+    # benchmark a running uvicorn (plans are still captured in-process)
+    python -m scripts.load_test --base-url http://127.0.0.1:8000 --concurrency 32
+
+Run it against the same DATABASE_URL before and after an index, cache or
+pagination change and compare the reports.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+
+# --------------------------------------------------------------------------
+# Synthetic data
+# --------------------------------------------------------------------------
+
+CUSTOMER_WORDS = [
+    "Ashok", "Bharat", "Crompton", "Delta", "Eicher", "Force", "Greaves",
+    "Hero", "Indo", "Jindal", "Kirloskar", "Lucas", "Mahindra", "Nippon",
+    "Omega", "Precision", "Quality", "Rane", "Sundaram", "Tata", "Usha",
+    "Varroc", "Wheels", "Xpert", "Yamaha", "Zenith",
+]
+CUSTOMER_SUFFIXES = ["Motors", "Industries", "Auto Parts", "Engineering", "Castings", "Ltd"]
+DEPARTMENTS = ["FORGING", "MACHINING", "ASSEMBLY", "EXPORT", "SPARES"]
+TRANSPORTERS = ["VRL Logistics", "Gati", "Safexpress", "TCI Express", "Own Vehicle"]
+
+
+def _fy_for(d: date) -> str:
+    return f"{d.year}-{d.year + 1}" if d.month >= 4 else f"{d.year - 1}-{d.year}"
+
+
+def build_vocabulary(rng: random.Random, customers: int, parts: int) -> dict:
+    """
+    Build the pools of customer names and part numbers that seeded rows and
+    typing sessions draw from, so searches actually hit data.
+    """
+    customer_names = sorted({
+        f"{rng.choice(CUSTOMER_WORDS)} {rng.choice(CUSTOMER_WORDS)} {rng.choice(CUSTOMER_SUFFIXES)}"
+        for _ in range(customers * 2)
+    })[:customers]
+    part_numbers = [f"{rng.randint(100, 999)}-{rng.randint(1000, 9999)}" for _ in range(parts)]
+    return {"customer_name": customer_names, "part_number": part_numbers}
+
+
+def synthetic_order(rng: random.Random, vocab: dict, seq: int, years: int) -> dict:
+    """
+    One realistic-looking Order row. Roughly a third are OUTSTANDING/PENDING
+    and the rest DELIVERY/DISPATCHED, spread across `years` financial years.
+    """
+    today = date.today()
+    order_date = today - timedelta(days=rng.randint(0, 365 * years))
+    delivery_date = order_date + timedelta(days=rng.randint(-10, 90))
+    customer_idx = min(int(rng.paretovariate(1.2)) - 1, len(vocab["customer_name"]) - 1)
+    part_idx = min(int(rng.paretovariate(1.1)) - 1, len(vocab["part_number"]) - 1)
+    customer = vocab["customer_name"][customer_idx]
+    part = vocab["part_number"][part_idx]
+    qty = rng.randint(1, 5000)
+    rate = round(rng.uniform(5, 2500), 2)
+    outstanding = rng.random() < 0.33
+
+    row = {
+        "source_type": "OUTSTANDING" if outstanding else "DELIVERY",
+        "status": "PENDING" if outstanding else "DISPATCHED",
+        "so_number": f"SO{seq // 4:08d}",
+        "so_date": order_date,
+        "order_no": f"PO-{seq // 3:07d}",
+        "order_date": order_date,
+        "po_serial": str(seq % 40 + 1),
+        "customer_name": customer,
+        "customer_code": f"C{customer_idx:05d}",
+        "part_number": part,
+        "item_code": part if outstanding else None,
+        "product_code": None if outstanding else part,
+        "unit": "NOS",
+        "rate": rate,
+        "delivery_date": delivery_date,
+        "department": rng.choice(DEPARTMENTS),
+        "financial_year": _fy_for(order_date),
+        "item_description": f"Component {part}",
+    }
+    # every row carries the same keys so batches go through one executemany
+    row.update({
+        "order_qty": qty if outstanding else None,
+        "os_order_qty": rng.randint(0, qty) if outstanding else None,
+        "gross_value": round(qty * rate, 2) if outstanding else None,
+        "currency": "INR" if outstanding else None,
+        "quantity": None if outstanding else qty,
+        "amount": None if outstanding else round(qty * rate, 2),
+        "invoice_no": None if outstanding else f"INV{seq:09d}",
+        "invoice_date": None if outstanding else delivery_date,
+        "transporter": None if outstanding else rng.choice(TRANSPORTERS),
+    })
+    return row
+
+
+def seed_orders(engine, total: int, vocab: dict, seed: int, years: int, batch_size: int = 10_000) -> None:
+    """
+    Bulk insert `total` synthetic rows with Core executemany batches.
+    """
+    from app.db.schema import ensure_schema
+    from app.models.order import Order
+    from app.services.dimensions import backfill_dimension_keys
+
+    ensure_schema(engine)
+    rng = random.Random(seed)
+    table = Order.__table__
+
+    started = time.perf_counter()
+    inserted = 0
+    while inserted < total:
+        n = min(batch_size, total - inserted)
+        batch = [synthetic_order(rng, vocab, inserted + i, years) for i in range(n)]
+        with engine.begin() as conn:
+            conn.execute(table.insert(), batch)
+        inserted += n
+        print(f"\rseeded {inserted:,}/{total:,}", end="", flush=True)
+
+    # raw inserts skip ingest's key resolution; analytics groups on the keys
+    backfill_dimension_keys(engine)
+    elapsed = time.perf_counter() - started
+    print(f"\nseeded {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+# --------------------------------------------------------------------------
+# Request patterns
+# --------------------------------------------------------------------------
+
+DEBOUNCE_SECONDS = 0.5  # matches the setTimeout in SearchOrders.tsx
+
+
+def typing_session(rng: random.Random, vocab: dict) -> list[dict]:
+    """
+    Simulate someone typing into the global search box.
+
+    Keystrokes arrive with human-like gaps; a request only fires when the gap
+    after a keystroke exceeds the debounce window (plus once at the end), just
+    like the dashboard. Returns the query params of the requests that fire.
+    """
+    field = rng.choice(["customer_name", "part_number", "order_no"])
+    if field == "order_no":
+        target = f"PO-{rng.randint(0, 300_000):07d}"
+    else:
+        target = rng.choice(vocab[field])
+    # people rarely type the whole thing
+    typed = target[: rng.randint(min(3, len(target)), len(target))]
+
+    fired = []
+    for i in range(1, len(typed) + 1):
+        gap = rng.expovariate(1 / 0.18)  # mean 180 ms between keys
+        if gap >= DEBOUNCE_SECONDS or i == len(typed):
+            term = typed[:i]
+            fired.append({
+                "po_number": term,
+                "serial_number": term,
+                "part_number": term,
+                "customer_name": term,
+            })
+    return fired
+
+
+def financial_years(years: int) -> list[str]:
+    today = date.today()
+    current_start = today.year if today.month >= 4 else today.year - 1
+    return [f"{y}-{y + 1}" for y in range(current_start - years + 1, current_start + 1)]
+
+
+def build_workload(rng: random.Random, vocab: dict, requests: int, years: int) -> list[tuple[str, str, dict]]:
+    """
+    A random mix of (label, path, params). Search traffic dominates, as it
+    does on the dashboard.
+    """
+    fys = financial_years(years)
+    work: list[tuple[str, str, dict]] = []
+    while len(work) < requests:
+        roll = rng.random()
+        if roll < 0.55:
+            for params in typing_session(rng, vocab):
+                work.append(("search (typing)", "/orders/search", params))
+        elif roll < 0.65:
+            work.append(("search (filters)", "/orders/search", {
+                "status": rng.choice(["PENDING", "DISPATCHED"]),
+                "financial_year": rng.choice(fys),
+            }))
+        elif roll < 0.75:
+            params = {}
+            if rng.random() < 0.5:
+                params["customer_name"] = rng.choice(vocab["customer_name"]).split()[0]
+            work.append(("open", "/orders/open", params))
+        elif roll < 0.80:
+            work.append(("open (today)", "/orders/open", {"today_only": "true"}))
+        elif roll < 0.87:
+            work.append(("analytics/financial-year", "/analytics/financial-year", {"financial_year": rng.choice(fys)}))
+        elif roll < 0.94:
+            work.append(("analytics/product-wise", "/analytics/product-wise", {"financial_year": rng.choice(fys)}))
+        else:
+            work.append(("analytics/customer-wise", "/analytics/customer-wise", {"financial_year": rng.choice(fys)}))
+    return work[:requests]
+
+
+# --------------------------------------------------------------------------
+# Driver
+# --------------------------------------------------------------------------
+
+def make_client(base_url: str | None):
+    import httpx
+
+    if base_url:
+        return httpx.AsyncClient(base_url=base_url, timeout=60)
+
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+
+async def run_load(base_url: str | None, work: list, concurrency: int) -> tuple[dict, float]:
+    """
+    Fire the workload with at most `concurrency` requests in flight.
+    Returns ({label: [latency_ms, ...]}, wall_seconds).
+    """
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in work:
+        queue.put_nowait(item)
+
+    async with make_client(base_url) as client:
+        async def worker():
+            while True:
+                try:
+                    label, path, params = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                response = await client.get(path, params=params)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if response.status_code >= 400:
+                    errors[label] = errors.get(label, 0) + 1
+                latencies.setdefault(label, []).append(elapsed_ms)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    for label, count in errors.items():
+        print(f"WARNING: {count} error responses for {label}")
+    return latencies, wall
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies: dict, wall: float) -> list[dict]:
+    report = []
+    for label in sorted(latencies):
+        values = sorted(latencies[label])
+        report.append({
+            "endpoint": label,
+            "requests": len(values),
+            "mean_ms": round(statistics.fmean(values), 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "throughput_rps": round(len(values) / wall, 1),
+        })
+    all_values = sorted(v for values in latencies.values() for v in values)
+    report.append({
+        "endpoint": "ALL",
+        "requests": len(all_values),
+        "mean_ms": round(statistics.fmean(all_values), 2) if all_values else 0.0,
+        "p50_ms": round(percentile(all_values, 50), 2),
+        "p95_ms": round(percentile(all_values, 95), 2),
+        "p99_ms": round(percentile(all_values, 99), 2),
+        "throughput_rps": round(len(all_values) / wall, 1),
+    })
+    return report
+
+
+def print_report(report: list[dict]) -> None:
+    header = f"{'endpoint':<28}{'reqs':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in report:
+        print(
+            f"{r['endpoint']:<28}{r['requests']:>8}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}"
+            f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['throughput_rps']:>10.1f}"
+        )
+
+
+# --------------------------------------------------------------------------
+# EXPLAIN plans
+# --------------------------------------------------------------------------
+
+def capture_plans(engine, samples: list[tuple[str, str, dict]]) -> dict[str, list[dict]]:
+    """
+    Run one request per endpoint in-process, record the SELECTs it issues via
+    a cursor-execute hook and EXPLAIN each one on the same engine.
+    """
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from app.main import app
+
+    captured: list[tuple[str, object]] = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    is_sqlite = engine.dialect.name == "sqlite"
+    plans: dict[str, list[dict]] = {}
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        client = TestClient(app)
+        for label, path, params in samples:
+            captured.clear()
+            client.get(path, params=params)
+            plans[label] = [{"statement": s, "parameters": p} for s, p in captured]
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+    prefix = "EXPLAIN QUERY PLAN " if is_sqlite else "EXPLAIN "
+    with engine.connect() as conn:
+        raw = conn.connection.dbapi_connection
+        for label, statements in plans.items():
+            for entry in statements:
+                cursor = raw.cursor()
+                try:
+                    cursor.execute(prefix + entry["statement"], entry["parameters"])
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+                if is_sqlite:
+                    entry["plan"] = [row[-1] for row in rows]
+                else:
+                    entry["plan"] = [row[0] for row in rows]
+                entry["parameters"] = repr(entry["parameters"])
+    return plans
+
+
+def print_plans(plans: dict[str, list[dict]]) -> None:
+    for label, statements in plans.items():
+        print(f"\n== {label}")
+        for entry in statements:
+            print("  " + " ".join(entry["statement"].split())[:160])
+            for line in entry["plan"]:
+                print(f"    {line}")
+
+
+# --------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed synthetic orders and load-test the read endpoints.")
+    parser.add_argument("--database-url", help="Overrides DATABASE_URL for seeding, in-process runs and EXPLAIN")
+    parser.add_argument("--seed", type=int, default=0, help="Insert this many synthetic rows before the run")
+    parser.add_argument("--years", type=int, default=5, help="Financial years of history to spread rows over")
+    parser.add_argument("--customers", type=int, default=2_000)
+    parser.add_argument("--parts", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=2_000, help="Total requests to fire")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--base-url", help="Hit a running server instead of the in-process app")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--no-explain", action="store_true")
+    parser.add_argument("--json", help="Also write the report (and plans) to this file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        # must be set before app.core.config is imported
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from app.db.session import engine
+
+    rng = random.Random(args.random_seed)
+    vocab = build_vocabulary(rng, args.customers, args.parts)
+
+    if args.seed:
+        seed_orders(engine, args.seed, vocab, args.random_seed, args.years)
+
+    work = build_workload(rng, vocab, args.requests, args.years)
+    print(f"running {len(work):,} requests at concurrency {args.concurrency} "
+          f"against {args.base_url or 'in-process app'} ({engine.url.render_as_string(hide_password=True)})")
+
+    latencies, wall = asyncio.run(run_load(args.base_url, work, args.concurrency))
+    report = summarize(latencies, wall)
+    print_report(report)
+
+    plans = {}
+    if not args.no_explain:
+        samples = {}
+        for label, path, params in work:
+            samples.setdefault(label, (label, path, params))
+        plans = capture_plans(engine, list(samples.values()))
+        print_plans(plans)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"report": report, "plans": plans, "wall_seconds": wall}, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+import pytest
+
+# app.core.config reads the environment on import: point it at a throwaway
+# database before any test module imports the app
+_tmp = tempfile.mkdtemp(prefix="factory-dashboard-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["DATA_FOLDER"] = _tmp
+os.environ["EVENT_BROKER"] = "memory"
+
+# emptied between tests (dimension rows stay: the process-wide key cache
+# assumes they are never deleted)
+_DATA_TABLES = ("orders", "order_tombstones", "quarantined_rows", "ingest_events", "users")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.db.schema import ensure_schema
+    from app.db.session import engine
+
+    ensure_schema(engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from sqlalchemy import text
+
+    from app.db.session import SessionLocal
+
+    with engine.begin() as conn:
+        for table in _DATA_TABLES:
+            conn.execute(text(f"DELETE FROM {table}"))
+        conn.execute(text("DELETE FROM plants WHERE id > 1"))
+        conn.execute(text("UPDATE sync_counters SET value = 0 WHERE name = 'orders'"))
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_order(db):
+    """
+    make_order(**fields): add an Order with enough defaults to satisfy the
+    schema (not committed).
+    """
+    from app.models.order import Order
+
+    def make(**fields):
+        values = {"source_type": "OUTSTANDING", "status": "PENDING", "plant_id": 1}
+        values.update(fields)
+        order = Order(**values)
+        db.add(order)
+        return order
+
+    return make
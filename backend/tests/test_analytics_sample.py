@@ -0,0 +1,78 @@
+import random
+from datetime import date
+
+from app.models.order import Order
+from app.services.analytics_sample import AnalyticsSample, Stratum
+
+FY_START, FY_END = date(2024, 4, 1), date(2025, 3, 31)
+
+
+def _exact(db) -> tuple[int, float]:
+    rows = db.query(Order).filter(
+        Order.source_type == "DELIVERY",
+        Order.delivery_date >= FY_START,
+        Order.delivery_date <= FY_END,
+    ).all()
+    return len(rows), sum(row.amount for row in rows)
+
+
+def _refresh(sample: AnalyticsSample, state) -> dict:
+    sample._catch_up(state)
+    sample._view = state.publish()
+    return sample.totals(FY_START, FY_END)
+
+
+def test_membership_follows_writes_regardless_of_id_order(db, make_order):
+    make_order(id=100, source_type="DELIVERY", delivery_date=date(2024, 5, 1), amount=10)
+    make_order(id=101, source_type="DELIVERY", delivery_date=date(2024, 6, 1), amount=20)
+    db.commit()
+
+    sample = AnalyticsSample()
+    state = sample._build()
+    sample._view = state.publish()
+    assert sample.totals(FY_START, FY_END)["total_sales_amount"] == 30
+
+    # committed after 100 and 101 with a lower id (or restored from the archive)
+    make_order(id=50, source_type="DELIVERY", delivery_date=date(2024, 7, 1), amount=5)
+    # an outstanding line that becomes a delivery
+    switching = make_order(id=60, delivery_date=date(2024, 8, 1), amount=7)
+    db.commit()
+    totals = _refresh(sample, state)
+    assert (totals["population_rows"], totals["total_sales_amount"]) == _exact(db) == (3, 35)
+
+    switching.source_type = "DELIVERY"
+    # moved out of the financial year, and one that stops being a delivery
+    db.get(Order, 101).delivery_date = date(2023, 6, 1)
+    db.get(Order, 100).source_type = "OUTSTANDING"
+    db.commit()
+    totals = _refresh(sample, state)
+    assert (totals["population_rows"], totals["total_sales_amount"]) == _exact(db) == (2, 12)
+
+    db.delete(db.get(Order, 50))
+    db.commit()
+    totals = _refresh(sample, state)
+    assert (totals["population_rows"], totals["total_sales_amount"]) == _exact(db) == (1, 7)
+
+
+def test_reservoir_refills_after_deletes_without_outgrowing_capacity():
+    rng = random.Random(1)
+    stratum = Stratum()
+    slots = {}
+    for order_id in range(1, 101):
+        slot, evicted = stratum.offer(order_id, (order_id, 1, None, None), 10, rng)
+        slots.pop(evicted, None)
+        if slot is not None:
+            slots[order_id] = slot
+
+    for order_id in list(slots)[:4] + [i for i in range(1, 30) if i not in slots][:6]:
+        moved = stratum.discard(slots.pop(order_id, None))
+        if moved is not None:
+            slots[moved] = stratum.ids.index(moved)
+    assert (stratum.population, len(stratum.rows)) == (90, 6)
+    assert sorted(stratum.ids) == sorted(slots)
+
+    # ten inserts pair off with the ten deletes: four of them refill the reservoir
+    for order_id in range(101, 111):
+        stratum.offer(order_id, (order_id, 1, None, None), 10, rng)
+    assert (stratum.population, len(stratum.rows)) == (100, 10)
+    assert stratum.deleted_in == stratum.deleted_out == 0
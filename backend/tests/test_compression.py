@@ -0,0 +1,75 @@
+import pytest
+
+from app.core import compression
+from app.core.compression import choose_encoding
+
+
+@pytest.fixture
+def orders(db, make_order):
+    # enough rows for a body over COMPRESSION_MIN_BYTES
+    for i in range(20):
+        make_order(so_number=f"SO-{i}", order_no=f"PO-{i}", customer_name="ACME ENGINEERING WORKS")
+    db.commit()
+
+
+def _search(client, **headers):
+    return client.get("/orders/search", headers=headers)
+
+
+def test_etag_answers_a_matching_if_none_match_with_304(client, db, make_order, orders):
+    first = _search(client)
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    # taken from the uncompressed body: the same whatever the encoding
+    assert _search(client, **{"Accept-Encoding": "gzip"}).headers["etag"] == etag
+    assert _search(client, **{"Accept-Encoding": "identity"}).headers["etag"] == etag
+
+    cached = _search(client, **{"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["etag"] == etag and "content-encoding" not in cached.headers
+    assert _search(client, **{"If-None-Match": f'"other", {etag.removeprefix("W/")}'}).status_code == 304
+
+    make_order(so_number="SO-NEW")
+    db.commit()
+    changed = _search(client, **{"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+
+def test_only_gets_under_the_configured_prefixes_get_etags(client, orders):
+    assert "etag" not in client.post("/orders/lookup", json={"order_no": ["PO-1"]}).headers
+    assert "etag" not in client.get("/").headers
+
+
+def test_json_is_gzipped_when_asked_and_large_enough(client, orders):
+    plain = _search(client, **{"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    packed = _search(client, **{"Accept-Encoding": "gzip"})
+    assert packed.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in packed.headers["vary"].lower()
+    assert int(packed.headers["content-length"]) < len(plain.content)
+    # httpx decodes it; the JSON is the identity body's
+    assert packed.json() == plain.json()
+
+    refused = _search(client, **{"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in refused.headers
+
+    small = client.get("/orders/search", params={"po_number": "PO-7"}, headers={"Accept-Encoding": "gzip"})
+    assert len(small.content) < 1024 and "content-encoding" not in small.headers
+
+
+def test_choose_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("br") is None
+    assert choose_encoding("*") == "gzip"
+    # an explicit q=0 wins over the wildcard
+    assert choose_encoding("*;q=0.5, gzip;q=0") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("") is None
+
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("br;q=0.5, gzip") == "gzip"
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from openpyxl import Workbook
+
+from app.services.excel_reader import ExcelReport
+from app.services.ingest_validation import validate_frame
+from app.services.ingestion import OUTSTANDING_COLUMNS, known_report_columns
+
+
+def test_key_columns_do_not_depend_on_chunk_boundaries(tmp_path):
+    # PO Srl has a blank in the second chunk only; pandas would type that
+    # chunk's column as float and turn 30 into "30.0"
+    path = tmp_path / "outstanding.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["S/O No", "Order No", "PO Srl", "Item Code", "Delivery Date"])
+    for i in range(6):
+        sheet.append([1000 + i, 2000 + i, None if i == 4 else i * 10, "P-1", datetime(2025, 5, 1 + i)])
+    workbook.save(path)
+
+    with ExcelReport(str(path), known_report_columns()) as report:
+        chunks = list(report.chunks(3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3]
+    serials = []
+    for chunk in chunks:
+        validation = validate_frame(chunk, OUTSTANDING_COLUMNS)
+        assert not validation.reasons
+        serials += list(validation.fields["po_serial"])
+    assert serials == ["0", "10", "20", "30", None, "50"]
+    assert list(chunks[1].index) == [3, 4, 5]
@@ -0,0 +1,171 @@
+import base64
+import os
+import re
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.imap_ingestion import fetch_new_attachments, file_report_into_folder, load_state
+
+TEXT_PART = b'("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 5 1 NIL NIL NIL NIL)'
+
+
+def _attachment_part(filename: str, payload: bytes) -> bytes:
+    name = filename.encode()
+    return (
+        b'("application" "octet-stream" ("name" "%s") NIL NIL "base64" %d NIL '
+        b'("attachment" ("filename" "%s")) NIL NIL)' % (name, len(base64.b64encode(payload)), name)
+    )
+
+
+class FakeMailbox:
+    """
+    The server side: messages by UID, each a list of (filename, payload)
+    attachments after a text body. Records every command it gets.
+    """
+
+    def __init__(self, uidvalidity: int, messages: dict[int, list[tuple[str, bytes]]]) -> None:
+        self.uidvalidity = uidvalidity
+        self.messages = messages
+        self.commands: list[tuple] = []
+        self.slow_uids: set[int] = set()
+        self.failing_uids: set[int] = set()
+
+    def connect(self) -> "FakeIMAP":
+        return FakeIMAP(self)
+
+    def bodystructure(self, uid: int) -> bytes:
+        parts = b"".join(_attachment_part(name, payload) for name, payload in self.messages[uid])
+        return b'(%s%s "mixed" ("boundary" "b") NIL NIL NIL)' % (TEXT_PART, parts)
+
+
+class FakeIMAP:
+    def __init__(self, box: FakeMailbox) -> None:
+        self.box = box
+
+    def select(self, folder, readonly=False):
+        self.box.commands.append(("SELECT", folder, readonly))
+        return "OK", [str(len(self.box.messages)).encode()]
+
+    def response(self, code):
+        return code, [str(self.box.uidvalidity).encode()]
+
+    def uid(self, command, *args):
+        self.box.commands.append((command, *args))
+        uids = sorted(self.box.messages)
+        if command == "SEARCH":
+            start = int(re.fullmatch(r"UID (\d+):\*", args[1]).group(1))
+            # like a real server, "N:*" always includes the highest UID
+            found = [u for u in uids if u >= start] or uids[-1:]
+            return "OK", [" ".join(map(str, found)).encode()]
+
+        uid_set, items = args
+        if items == "(UID BODYSTRUCTURE)":
+            wanted = [int(u) for u in uid_set.split(",")]
+            return "OK", [
+                b"%d (UID %d BODYSTRUCTURE %s)" % (i, uid, self.box.bodystructure(uid))
+                for i, uid in enumerate(wanted, start=1)
+            ]
+
+        section = re.fullmatch(r"\(BODY\.PEEK\[([\d.]+)\]\)", items).group(1)
+        uid = int(uid_set)
+        if uid in self.box.failing_uids:
+            return "NO", [b"server busy"]
+        if uid in self.box.slow_uids:
+            time.sleep(0.2)
+        # part 1 is the text body, attachments follow
+        _, payload = self.box.messages[uid][int(section) - 2]
+        encoded = base64.b64encode(payload)
+        return "OK", [(b"1 (UID %d BODY[%s] {%d}" % (uid, section.encode(), len(encoded)), encoded), b")"]
+
+    def logout(self):
+        return "BYE", []
+
+
+@pytest.fixture
+def data_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_FOLDER", str(tmp_path))
+    return tmp_path
+
+
+def _body_fetches(box: FakeMailbox) -> list[tuple]:
+    return [c for c in box.commands if c[0] == "FETCH" and c[2] != "(UID BODYSTRUCTURE)"]
+
+
+def test_fetch_peeks_in_uid_order_and_advances_last_uid(data_folder):
+    box = FakeMailbox(7, {
+        3: [("outstanding_1.csv", b"first")],
+        4: [],
+        5: [("outstanding_2.csv", b"second")],
+    })
+    # the older export finishes downloading last
+    box.slow_uids = {3}
+    state_path = str(data_folder / "state.json")
+    handled = []
+
+    saved = fetch_new_attachments(on_saved=handled.append, connect=box.connect, state_path=state_path, max_workers=2)
+
+    assert [os.path.basename(p) for p in handled] == ["3_outstanding_1.csv", "5_outstanding_2.csv"]
+    assert saved == handled
+    with open(handled[1], "rb") as f:
+        assert f.read() == b"second"
+    assert all(c[2].startswith("(BODY.PEEK[") for c in _body_fetches(box))
+    assert all(c[2] is True for c in box.commands if c[0] == "SELECT")
+    assert load_state(state_path) == {"uidvalidity": 7, "last_uid": 5}
+
+    # nothing new: only UIDs after 5 are asked for, nothing is downloaded
+    box.commands.clear()
+    assert fetch_new_attachments(on_saved=handled.append, connect=box.connect, state_path=state_path) == []
+    assert ("SEARCH", None, "UID 6:*") in box.commands
+    assert _body_fetches(box) == []
+
+    # the mailbox was rebuilt: UIDs start over and everything is fetched again
+    box.uidvalidity = 8
+    box.commands.clear()
+    saved = fetch_new_attachments(connect=box.connect, state_path=state_path)
+    assert ("SEARCH", None, "UID 1:*") in box.commands
+    assert len(saved) == 2
+    assert load_state(state_path) == {"uidvalidity": 8, "last_uid": 5}
+
+
+def test_failed_download_holds_back_only_that_message_and_later(data_folder):
+    box = FakeMailbox(7, {
+        2: [("outstanding_0.csv", b"zero")],
+        3: [("outstanding_1.csv", b"first")],
+        5: [("outstanding_2.csv", b"second")],
+    })
+    box.failing_uids = {3}
+    state_path = str(data_folder / "state.json")
+    handled = []
+
+    fetch_new_attachments(on_saved=handled.append, connect=box.connect, state_path=state_path)
+
+    assert [os.path.basename(p) for p in handled] == ["2_outstanding_0.csv"]
+    assert load_state(state_path)["last_uid"] == 2
+
+    box.failing_uids = set()
+    fetch_new_attachments(on_saved=handled.append, connect=box.connect, state_path=state_path)
+    assert [os.path.basename(p) for p in handled[1:]] == ["3_outstanding_1.csv", "5_outstanding_2.csv"]
+    assert load_state(state_path)["last_uid"] == 5
+
+
+def test_unrecognised_attachment_is_quarantined_and_counted_as_handled(data_folder):
+    box = FakeMailbox(7, {
+        3: [("notes.csv", b"Colour,Size\nred,1\n")],
+        4: [("outstanding_2.csv", b"second")],
+    })
+    state_path = str(data_folder / "state.json")
+    filed = []
+
+    def on_saved(path):
+        report_type, target = file_report_into_folder(path)
+        filed.append((report_type, os.path.relpath(target, data_folder)))
+
+    fetch_new_attachments(on_saved=on_saved, connect=box.connect, state_path=state_path)
+
+    assert filed == [
+        (None, os.path.join("unrecognised", "3_notes.csv")),
+        ("outstanding", os.path.join("outstanding", "4_outstanding_2.csv")),
+    ]
+    assert load_state(state_path)["last_uid"] == 4
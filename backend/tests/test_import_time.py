@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+from scripts.check_import_time import DEFAULT_BUDGET_MS, measure, startup_failures
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("ingestion_enabled", ["true", "false"])
+def test_api_startup_imports_stay_light(ingestion_enabled):
+    env = {
+        **os.environ,
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "PYTHONPATH": BACKEND,
+        "INGESTION_ENABLED": ingestion_enabled,
+    }
+    total_ms, _, imported = measure("app.main", env, runs=3)
+
+    assert {"pandas", "numpy", "openpyxl"}.isdisjoint(imported)
+    assert startup_failures(total_ms, imported, DEFAULT_BUDGET_MS) == []
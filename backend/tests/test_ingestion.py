@@ -0,0 +1,92 @@
+import warnings
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy.exc import SAWarning
+
+from app.models.order import Order
+from app.models.plant import Plant
+from app.services.change_feed import current_change_seq
+from app.services.ingestion import ingest_dataframe
+from app.services.snapshot import OutstandingSnapshot
+
+
+def _report(*rows) -> pd.DataFrame:
+    columns = ["S/O No", "Order No", "PO Srl", "Item Code", "Delivery Date", "Buyer Name", "O/S Ord.Qty"]
+    return pd.DataFrame([dict(zip(columns, row)) for row in rows])
+
+
+def test_reupload_updates_orders_matched_on_the_natural_key(db):
+    first = _report(
+        ("SO-1", "PO-1", "10", "P-1", "29-Aug-25", "ACME", 5),
+        ("SO-1", "PO-1", None, "P-2", "29-Aug-25", "ACME", 3),
+    )
+    assert ingest_dataframe(db, first, "outstanding").rows == 2
+    db.commit()
+    ids = {o.part_number: o.id for o in db.query(Order)}
+    seq = current_change_seq(db)
+
+    again = _report(
+        # a blank PO Srl still matches the stored NULL
+        ("SO-1", "PO-1", None, "P-2", "29-Aug-25", "ACME", 1),
+        ("SO-2", "PO-2", "10", "P-1", "30-Aug-25", "ACME", 7),
+        # the same key twice in one file: the later row wins
+        ("SO-1", "PO-1", "10", "P-1", "29-Aug-25", "ACME", 4),
+        ("SO-1", "PO-1", "10", "P-1", "29-Aug-25", "ACME", 2),
+    )
+    assert ingest_dataframe(db, again, "outstanding").rows == 4
+    db.commit()
+
+    orders = {(o.so_number, o.part_number): o for o in db.query(Order)}
+    assert len(orders) == 3
+    assert orders["SO-1", "P-1"].id == ids["P-1"] and orders["SO-1", "P-1"].os_order_qty == 2
+    assert orders["SO-1", "P-2"].id == ids["P-2"] and orders["SO-1", "P-2"].os_order_qty == 1
+    assert orders["SO-1", "P-1"].customer_id is not None
+    # the bulk writes are stamped for /orders/changes
+    assert {o.change_seq for o in orders.values()} == {seq + 1}
+
+
+@pytest.fixture
+def open_orders(db, make_order):
+    def pending(so_number, **fields):
+        return make_order(so_number=so_number, order_no="PO-1", po_serial="10", part_number="P-1",
+                          delivery_date=date(2025, 8, 29), **fields)
+
+    orders = {
+        "listed": pending("SO-1"),
+        "vanished": pending("SO-2"),
+        "typo": pending("SO-3"),
+        "other_plant": pending("SO-4", plant_id=2),
+        "delivery": pending("SO-5", source_type="DELIVERY", status="DISPATCHED"),
+    }
+    db.add(Plant(id=2, code="PLANT2"))
+    db.commit()
+    return orders
+
+
+def test_snapshot_closes_only_the_plants_vanished_outstanding_lines(db, open_orders):
+    seq = current_change_seq(db)
+    snapshot = OutstandingSnapshot(db, plant_id=1)
+    report = _report(
+        ("SO-1", "PO-1", "10", "P-1", "29-Aug-25", "ACME", 5),
+        # quarantined, but still keeps its order open
+        ("SO-3", "PO-1", "10", "P-1", "31-Feb-25", "ACME", 5),
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", SAWarning)
+        ingest_dataframe(db, report, "outstanding", snapshot=snapshot)
+        assert snapshot.close_vanished() == 1
+    db.commit()
+
+    status = {name: (order.status, order.change_seq) for name, order in open_orders.items()}
+    assert status["vanished"] == ("CLOSED", seq + 2)
+    assert {status[name][0] for name in ("listed", "typo", "other_plant")} == {"PENDING"}
+    assert status["delivery"][0] == "DISPATCHED"
+
+
+def test_empty_snapshot_closes_nothing(db, open_orders):
+    snapshot = OutstandingSnapshot(db, plant_id=1)
+    assert snapshot.close_vanished() == 0
+    db.commit()
+    assert db.query(Order).filter(Order.status == "CLOSED").count() == 0
@@ -0,0 +1,34 @@
+from app.core.config import settings
+
+
+def _token(client, email: str) -> str:
+    client.post("/auth/register", json={"email": email, "password": "secret"})
+    return client.post("/auth/login", json={"email": email, "password": "secret"}).json()["access_token"]
+
+
+def _get_metrics(client, token: str | None = None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return client.get("/metrics", headers=headers)
+
+
+def test_metrics_need_the_scrape_token_or_an_admin(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    admin = _token(client, "admin@example.com")
+    user = _token(client, "user@example.com")
+
+    anonymous = _get_metrics(client)
+    assert anonymous.status_code == 401 and anonymous.headers["WWW-Authenticate"] == "Bearer"
+    assert _get_metrics(client, "wrong").status_code == 401
+    assert _get_metrics(client, user).status_code == 403
+
+    for token in ("scrape-secret", admin):
+        response = _get_metrics(client, token)
+        assert response.status_code == 200
+        assert "http_requests_total" in response.text
+
+
+def test_without_a_scrape_token_only_admins_get_metrics(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+    admin = _token(client, "admin@example.com")
+    assert _get_metrics(client, "").status_code == 401
+    assert _get_metrics(client, admin).status_code == 200
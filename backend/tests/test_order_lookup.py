@@ -0,0 +1,58 @@
+import pytest
+
+from app.services import order_lookup
+from app.services.dimensions import resolve_dimension_keys
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # every field's values span several IN queries
+    monkeypatch.setattr(order_lookup, "IN_CHUNK", 2)
+
+
+def _lookup(client, **body):
+    response = client.post("/orders/lookup", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_lookup_across_chunks_truncates_per_value(client, db, make_order, small_chunks):
+    for i in range(5):
+        make_order(order_no=f"PO-{i}", so_number=f"SO-{i}")
+    for _ in range(3):
+        make_order(order_no="PO-BUSY", so_number="SO-BUSY")
+    db.commit()
+
+    found = _lookup(
+        client,
+        order_no=[" PO-0 ", "PO-1", "PO-2", "PO-3", "PO-4", "PO-BUSY", "PO-NONE", "PO-1"],
+        limit_per_key=2,
+    )
+
+    results = found["results"]["order_no"]
+    assert list(results) == ["PO-0", "PO-1", "PO-2", "PO-3", "PO-4", "PO-BUSY"]
+    assert [o["so_number"] for o in results["PO-3"]] == ["SO-3"]
+    busy = [o["id"] for o in results["PO-BUSY"]]
+    assert len(busy) == 2 and busy == sorted(busy, reverse=True)
+    assert found["truncated"] == {"order_no": ["PO-BUSY"]}
+    assert found["not_found"] == {"order_no": ["PO-NONE"]}
+
+
+def test_part_numbers_match_through_the_parts_dimension(client, db, make_order, small_chunks):
+    for part in ("AB-100", "AB-200", "AB-300"):
+        fields = {"part_number": part}
+        resolve_dimension_keys(db, fields)
+        make_order(order_no=f"PO-{part}", **fields)
+    db.commit()
+
+    found = _lookup(client, part_number=["ab-100", " AB-300", "AB-999"])
+    assert {value: [o["order_no"] for o in orders] for value, orders in found["results"]["part_number"].items()} == {
+        "ab-100": ["PO-AB-100"],
+        "AB-300": ["PO-AB-300"],
+    }
+    assert found["not_found"] == {"part_number": ["AB-999"]}
+
+
+def test_lookup_rejects_too_many_values(client):
+    values = [f"PO-{i}" for i in range(order_lookup.MAX_LOOKUP_VALUES + 1)]
+    assert client.post("/orders/lookup", json={"order_no": values}).status_code == 400
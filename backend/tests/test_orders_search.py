@@ -0,0 +1,17 @@
+from datetime import date
+
+
+def test_financial_year_filter_keeps_rows_delivered_in_other_years(client, db, make_order):
+    # financial_year follows the order date; deliveries can fall in the next year or be unknown
+    make_order(so_number="SO-1", financial_year="2024-2025", delivery_date=date(2024, 9, 1))
+    make_order(so_number="SO-2", financial_year="2024-2025", delivery_date=date(2025, 6, 1))
+    make_order(so_number="SO-3", financial_year="2024-2025")
+    make_order(so_number="SO-4", financial_year="2025-2026", delivery_date=date(2025, 6, 1))
+    db.commit()
+
+    found = client.get("/orders/search", params={"financial_year": "2024-2025"}).json()
+    assert sorted(o["so_number"] for o in found) == ["SO-1", "SO-2", "SO-3"]
+
+    summary = client.get("/orders/summary", params={"financial_year": "2024-2025"}).json()
+    assert summary["total_orders"] == 3
+    assert client.get("/orders/search", params={"financial_year": "2019-2020"}).json() == []
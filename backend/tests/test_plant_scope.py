@@ -0,0 +1,60 @@
+import pytest
+
+from app.models.plant import Plant
+
+
+def _register(client, email: str) -> dict:
+    response = client.post("/auth/register", json={"email": email, "password": "secret"})
+    assert response.status_code == 200, response.text
+    token = client.post("/auth/login", json={"email": email, "password": "secret"}).json()["access_token"]
+    return {"user": response.json(), "headers": {"Authorization": f"Bearer {token}"}}
+
+
+def _order_count(client, headers=None, **params) -> int | None:
+    response = client.get("/orders/summary", params=params, headers=headers or {})
+    return response.json()["total_orders"] if response.status_code == 200 else response.status_code
+
+
+@pytest.fixture
+def two_plants(db, make_order):
+    db.add(Plant(id=2, code="PLANT2"))
+    make_order(plant_id=1, so_number="SO-1")
+    make_order(plant_id=2, so_number="SO-2")
+    make_order(plant_id=2, so_number="SO-3")
+    db.commit()
+
+
+def test_self_registered_users_are_confined_to_the_default_plant(client, two_plants):
+    admin = _register(client, "admin@example.com")
+    user = _register(client, "user@example.com")
+    assert admin["user"]["role"] == "admin" and admin["user"]["plant_id"] is None
+    assert user["user"]["role"] == "user" and user["user"]["plant_id"] == 1
+
+    assert _order_count(client, user["headers"]) == 1
+    assert _order_count(client, user["headers"], plant_id=2) == 403
+
+    assert _order_count(client, admin["headers"]) == 3
+    assert _order_count(client, admin["headers"], plant_id=2) == 2
+
+
+def test_anonymous_callers_only_see_the_default_plant(client, two_plants):
+    assert _order_count(client) == 1
+    assert _order_count(client, plant_id=1) == 1
+    response = client.get("/orders/summary", params={"plant_id": 2})
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+
+def test_users_without_a_plant_only_get_every_plant_as_admins(client, db, two_plants):
+    admin = _register(client, "admin@example.com")
+    user = _register(client, "user@example.com")
+
+    # unbinding a plain user falls back to the default plant, not all plants
+    response = client.put(f"/plants/users/{user['user']['id']}", json={"plant_id": None}, headers=admin["headers"])
+    assert response.status_code == 200
+    assert _order_count(client, user["headers"]) == 1
+    assert [p["id"] for p in client.get("/plants", headers=user["headers"]).json()] == [1]
+
+    client.put(f"/plants/users/{user['user']['id']}", json={"plant_id": 2}, headers=admin["headers"])
+    assert _order_count(client, user["headers"]) == 2
+    assert _order_count(client, user["headers"], plant_id=1) == 403
@@ -0,0 +1,28 @@
+import apiClient from "./client";
+
+export interface IngestNotice {
+  type: "ingest";
+  rows: number;
+  source_types: string[];
+  financial_years: string[];
+  at: string;
+}
+
+// Listen to the backend's /events stream. Returns an unsubscribe function.
+// EventSource reconnects on its own if the connection drops.
+export const subscribeToIngests = (
+  onNotice: (notice: IngestNotice) => void
+): (() => void) => {
+  const source = new EventSource(`${apiClient.defaults.baseURL}/events`);
+
+  const handler = (e: MessageEvent) => {
+    try {
+      onNotice(JSON.parse(e.data));
+    } catch (err) {
+      console.error("Bad ingest notice:", err);
+    }
+  };
+
+  source.addEventListener("ingest", handler as EventListener);
+  return () => source.close();
+};
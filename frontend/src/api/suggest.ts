@@ -0,0 +1,20 @@
+import apiClient from "./client";
+
+export type SuggestField = "customer_name" | "part_number" | "order_no";
+
+export interface Suggestion {
+  value: string;
+  count: number;
+}
+
+// Prefix matches from the backend's in-memory index, most frequent first.
+export const fetchSuggestions = async (
+  field: SuggestField,
+  q: string,
+  limit = 8
+): Promise<Suggestion[]> => {
+  const res = await apiClient.get<Suggestion[]>("/orders/suggest", {
+    params: { field, q, limit },
+  });
+  return res.data;
+};
@@ -1,5 +1,6 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import apiClient from "../api/client";
+import { subscribeToIngests } from "../api/events";
 
 interface Order {
   id: number;
@@ -42,6 +43,17 @@ const OpenOrders: React.FC = () => {
     fetchOpenOrders();
   }, []);
 
+  // Refetch only when an ingest actually touched outstanding orders
+  const fetchRef = useRef(fetchOpenOrders);
+  fetchRef.current = fetchOpenOrders;
+  useEffect(
+    () =>
+      subscribeToIngests((notice) => {
+        if (notice.source_types.includes("OUTSTANDING")) fetchRef.current();
+      }),
+    []
+  );
+
   const totalPendingOrders = orders.length;
   const totalOpenQty = orders.reduce(
     (sum, o) => sum + (o.os_order_qty ?? 0),
@@ -1,5 +1,43 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import apiClient from "../api/client";
+import { subscribeToIngests } from "../api/events";
+import { fetchSuggestions, type SuggestField } from "../api/suggest";
+
+// Typeahead values for an input: cheap prefix lookups, so a short debounce
+const useSuggestions = (fields: SuggestField[], q: string): string[] => {
+  const [values, setValues] = useState<string[]>([]);
+  const key = fields.join(",");
+
+  useEffect(() => {
+    const prefix = q.trim();
+    if (!prefix) {
+      setValues([]);
+      return;
+    }
+    let cancelled = false;
+    const handle = setTimeout(async () => {
+      try {
+        const lists = await Promise.all(
+          fields.map((field) => fetchSuggestions(field, prefix))
+        );
+        const merged = lists
+          .flat()
+          .sort((a, b) => b.count - a.count)
+          .map((s) => s.value);
+        if (!cancelled) setValues(Array.from(new Set(merged)));
+      } catch (err) {
+        console.error(err);
+      }
+    }, 150);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(handle);
+    };
+  }, [key, q]);
+
+  return values;
+};
 
 
 const SearchOrders: React.FC = () => {
@@ -16,6 +54,16 @@ const SearchOrders: React.FC = () => {
 
   const [results, setResults] = useState<any[]>([]);
   const [loading, setLoading] = useState(false);
+
+  const globalSuggestions = useSuggestions(
+    ["customer_name", "part_number", "order_no"],
+    filters.global
+  );
+  const partSuggestions = useSuggestions(["part_number"], filters.part_number);
+  const customerSuggestions = useSuggestions(
+    ["customer_name"],
+    filters.customer_name
+  );
   useEffect(() => {
     if (!filters.global.trim()) return;
     const handle = setTimeout(() => {
@@ -52,6 +100,19 @@ const SearchOrders: React.FC = () => {
     }
   };
 
+  // Re-run the current search when new data lands (only if there is one)
+  const searchRef = useRef(handleSearch);
+  searchRef.current = handleSearch;
+  const hasResults = useRef(false);
+  hasResults.current = results.length > 0;
+  useEffect(
+    () =>
+      subscribeToIngests(() => {
+        if (hasResults.current) searchRef.current();
+      }),
+    []
+  );
+
   const resetFilters = () => {
     setFilters({
       global: "",
@@ -82,6 +143,8 @@ const SearchOrders: React.FC = () => {
           onKeyDown={(e) => e.key === "Enter" && handleSearch()}
           placeholder="Global search (PO / Serial / Part / Customer)"
           className="input w-full"
+          list="global-suggestions"
+          autoComplete="off"
         />
         <input
           name="po_number"
@@ -106,6 +169,8 @@ const SearchOrders: React.FC = () => {
           onKeyDown={(e) => e.key === "Enter" && handleSearch()}
           placeholder="Part Number"
           className="input w-full"
+          list="part-suggestions"
+          autoComplete="off"
         />
         <input
           name="customer_name"
@@ -114,6 +179,8 @@ const SearchOrders: React.FC = () => {
           onKeyDown={(e) => e.key === "Enter" && handleSearch()}
           placeholder="Customer Name"
           className="input w-full"
+          list="customer-suggestions"
+          autoComplete="off"
         />
         <select
           name="status"
@@ -127,6 +194,20 @@ const SearchOrders: React.FC = () => {
         </select>
       </div>
 
+      {(
+        [
+          ["global-suggestions", globalSuggestions],
+          ["part-suggestions", partSuggestions],
+          ["customer-suggestions", customerSuggestions],
+        ] as const
+      ).map(([id, values]) => (
+        <datalist key={id} id={id}>
+          {values.map((value) => (
+            <option key={value} value={value} />
+          ))}
+        </datalist>
+      ))}
+
       {/* Actions */}
       <div className="flex gap-2">
         <button onClick={handleSearch} className="btn-primary">